@@ -1,9 +1,39 @@
-import dash
-from dash import Dash, html, page_container
-import dash_bootstrap_components as dbc
+import logging
+import os
 
-app = Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.BOOTSTRAP])
+from core import ingest, jobs, metrics, profiling, registry, streaming, warmup
+from core.dataset import DATASET_CHUNK_ROWS
+from core.timing import log_startup_report, phase
+
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
+
+with phase('import dash'):
+    from dash import Dash, html, page_container
+    import dash_bootstrap_components as dbc
+
+# Page layouts are callables that build their figures on first visit, so
+# Dash must not call every layout up front to validate callbacks.
+with phase('create app and import pages'):
+    app = Dash(
+        __name__, use_pages=True,
+        external_stylesheets=[dbc.themes.BOOTSTRAP],
+        suppress_callback_exceptions=True,
+        background_callback_manager=jobs.manager
+    )
 server = app.server
+# First, so every later hook and callback sees the request's dataset
+registry.init_app(server)
+metrics.init_app(server)
+profiling.init_app(server)
+jobs.init_app(server)
+# Out-of-core mode builds the default dataset's aggregates in one chunked
+# pass up front; core.registry does the same for the others on first use
+if DATASET_CHUNK_ROWS:
+    streaming.prime(registry.registry.default)
+# With WARMUP_SECONDS set, the worker computes the common views before it serves
+warmup.run()
+# Picks up rows appended to the CSV when INGEST_INTERVAL is set
+ingest.start_watcher()
 
 navbar = dbc.NavbarSimple(
     brand="🧠 Mental Health Dashboard",
@@ -28,9 +58,8 @@ app.layout = html.Div(
     ]
 )
 
+log_startup_report()
+
 if __name__ == "__main__":
     port = 8050
     app.run(debug=True, host="0.0.0.0", port=port)
-    
-
-
@@ -0,0 +1,148 @@
+"""Time every page callback in this process against the configured dataset.
+
+Run by ``bench.run`` in a fresh interpreter per dataset, with
+``DATASET_PATH`` pointing at the synthetic CSV. Prints one JSON document.
+"""
+import argparse
+import json
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+
+from core.figures import payload_bytes
+
+
+def _top(index, column, n):
+    return list(index.value_counts(column).index[:n])
+
+
+def input_matrix():
+    """Realistic argument tuples per callback, drawn from the loaded data."""
+    from core.index import get_code_index
+    from pages import description
+
+    ix = get_code_index()
+    every = ['All']
+    country, occupation = _top(ix, 'Country', 3), _top(ix, 'Occupation', 2)
+    filters = [
+        (every,) * 6,
+        (country[:1],) + (every,) * 5,
+        (every, ['Female'], every, occupation, every, every),
+        (country, ['Male'], ['Yes'], every, ['No'], ['Yes']),
+    ]
+    columns = ['Days_Indoors', 'Country', 'Occupation', 'Mood_Swings', 'Timestamp']
+    pairs = [('Country', 'Gender'), ('Occupation', 'treatment'),
+             ('Days_Indoors', 'Mood_Swings'), ('Timestamp', 'Gender'), ('Gender', 'Country')]
+    return {
+        'update_distribution': [f + (c,) for f in filters for c in columns],
+        'update_grouped_bar':  [p + f for p in pairs for f in filters[:2]],
+        'update_home_trend':   [(None, None, f) for f in 'DWM']
+                               + [('2015-01-01', '2015-03-31', f) for f in 'DW'],
+        'update_home_corr':    [(t,) for t in (0, 0.25, 0.5, 0.75)],
+        'update_home_corr_store': [(country[:1], every, every), (every, ['Male'], every),
+                                   (country, ['Female'], occupation)],
+        'show_feature_cards':  [(f,) for f in description.all_features],
+        # sampled previews only exist above SAMPLE_MIN_ROWS
+        'approx_distribution': [f + (c,) for f in filters[1:] for c in columns],
+        'approx_grouped_bar':  [p + f for p in pairs for f in filters[1:2]],
+    }
+
+
+def callbacks():
+    from pages import description, home, visualizations
+
+    from core.sampling import get_sample
+
+    # .uncached skips the result memo, so every call does the real work
+    funcs = {
+        'update_distribution': visualizations.update_distribution.uncached,
+        'update_grouped_bar':  visualizations.update_grouped_bar.uncached,
+        'update_home_trend':   home.update_home_trend.uncached,
+        'update_home_corr':    home.update_home_corr.uncached,
+        'update_home_corr_store': home.update_home_corr_store.uncached,
+        'show_feature_cards':  description.show_feature_cards.uncached,
+    }
+    if get_sample() is not None:
+        funcs['approx_distribution'] = visualizations.approx_distribution.uncached
+        funcs['approx_grouped_bar'] = visualizations.approx_grouped_bar.uncached
+    return funcs
+
+
+def _percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return {
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean()),
+    }
+
+
+def measure(repeats=20):
+    from core.dataset import load_columns
+    from core.weighted import get_weighted_rows
+
+    start = time.perf_counter()
+    import app  # noqa: F401  (registers the pages)
+    rows = len(next(iter(load_columns().values()))['values'])
+    matrix = input_matrix()
+    setup_s = time.perf_counter() - start
+
+    results = {}
+    for name, func in callbacks().items():
+        inputs = matrix[name]
+
+        # Cold pass: first call per input, including any lazy builds
+        cold, payloads = [], []
+        for args in inputs:
+            t = time.perf_counter()
+            out = func(*args)
+            cold.append(time.perf_counter() - t)
+            payloads.append(payload_bytes(out))
+
+        warm = []
+        for _ in range(repeats):
+            for args in inputs:
+                t = time.perf_counter()
+                func(*args)
+                warm.append(time.perf_counter() - t)
+
+        # Separate pass: tracemalloc slows the calls it traces
+        tracemalloc.start()
+        for args in inputs:
+            func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[name] = {
+            'inputs': len(inputs),
+            'calls': len(warm),
+            'cold_max_ms': max(cold) * 1000,
+            **_percentiles(warm),
+            'peak_alloc_mb': peak / 2**20,
+            'payload_bytes_max': max(payloads),
+            'payload_bytes_mean': float(np.mean(payloads)),
+        }
+
+    weighted = get_weighted_rows()
+    return {
+        'rows': rows,
+        # None unless the callbacks counted on deduplicated rows
+        'weighted_rows': None if weighted is None else len(weighted.weights),
+        'setup_s': setup_s,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'callbacks': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args(argv)
+    print(json.dumps(measure(args.repeats)))
+
+
+if __name__ == '__main__':
+    main()
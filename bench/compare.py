@@ -0,0 +1,57 @@
+"""Compare two ``bench.run`` reports and flag regressions.
+
+    python -m bench.compare baseline.json candidate.json --threshold 0.2
+
+Exits with status 1 when any callback's p95 latency or max payload grew by
+more than ``threshold`` (relative) at any scale present in both reports.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ['p50_ms', 'p95_ms', 'p99_ms', 'peak_alloc_mb', 'payload_bytes_max']
+GATED = ['p95_ms', 'payload_bytes_max']
+
+
+def compare(old, new, threshold=0.2, min_ms=1.0):
+    """Yield ``(scale, callback, metric, old, new, ratio, regressed)`` rows."""
+    for scale, new_scale in new['scales'].items():
+        old_scale = old['scales'].get(scale)
+        if old_scale is None:
+            continue
+        for name, new_cb in new_scale['callbacks'].items():
+            old_cb = old_scale['callbacks'].get(name)
+            if old_cb is None:
+                continue
+            for metric in METRICS:
+                a, b = old_cb[metric], new_cb[metric]
+                ratio = b / a if a else float('inf') if b else 1.0
+                # ignore sub-millisecond noise on latency metrics
+                noise = metric.endswith('_ms') and max(a, b) < min_ms
+                regressed = metric in GATED and not noise and ratio > 1 + threshold
+                yield scale, name, metric, a, b, ratio, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as fh:
+        old = json.load(fh)
+    with open(args.candidate) as fh:
+        new = json.load(fh)
+
+    failed = False
+    for scale, name, metric, a, b, ratio, regressed in compare(old, new, args.threshold):
+        flag = '  REGRESSION' if regressed else ''
+        print(f"x{scale:<5} {name:<22} {metric:<18} {a:12.2f} -> {b:12.2f} ({ratio:5.2f}x){flag}")
+        failed |= regressed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,604 @@
+"""Replay mixed user sessions against the Dash server at a set concurrency.
+
+    python -m bench.load --users 8 --duration 30
+    python -m bench.load --users 32 --processes 4 --duration 60
+    python -m bench.load --target gunicorn --gunicorn-workers 4 --users 32
+
+Each virtual user loops over visits to the three pages: page loads, then
+``_dash-update-component`` posts for the trend date picker, correlation
+segments, distribution filters and columns, grouped-bar axes and feature
+cards, following background jobs to their result. The correlation slider
+and the tabs only run client-side, so they cost no requests.
+
+``--target client`` drives ``app.server`` through Flask test clients in
+this process (``--processes`` forks copies of it, like gunicorn with
+preload); ``--target gunicorn`` starts a local gunicorn and talks HTTP.
+Reports throughput, latency percentiles and errors per interaction, RSS
+of every server process over time and, in-process, where user threads
+were found waiting on a lock.
+"""
+import argparse
+import http.client
+import json
+import linecache
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOB_POLL_S = 0.25
+JOB_TIMEOUT_S = 60
+CONTENTION_SAMPLE_S = 0.005
+
+_fork = multiprocessing.get_context('fork')
+
+
+# Transports
+class ClientTransport:
+    """In-process requests through ``app.server.test_client()``; keeps cookies."""
+
+    def __init__(self, server):
+        self.client = server.test_client()
+
+    def request(self, method, path, body=None):
+        r = self.client.open(path, method=method, json=body)
+        return r.status_code, r.get_data()
+
+
+class HttpTransport:
+    """One keep-alive HTTP connection per user, carrying the session cookie."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = None
+        self.cookies = {}
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=JOB_TIMEOUT_S)
+            try:
+                self.conn.request(method, path, payload, headers)
+                r = self.conn.getresponse()
+                data = r.read()
+                break
+            except (OSError, http.client.HTTPException):
+                # the server closed an idle keep-alive connection; retry once
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        for value in r.headers.get_all('Set-Cookie') or []:
+            name, _, rest = value.partition('=')
+            self.cookies[name.strip()] = rest.split(';', 1)[0]
+        return r.status, data
+
+
+# Callback requests
+def _outputs(output):
+    # a list for multi-output callbacks, a single spec otherwise
+    if not output.startswith('..'):
+        return dict(zip(('id', 'property'), output.rsplit('.', 1)))
+    return [dict(zip(('id', 'property'), p.rsplit('.', 1))) for p in output[2:-2].split('...')]
+
+
+def callback_specs(dependencies):
+    """Server-side callbacks keyed by their tuple of ``id.property`` inputs."""
+    return {
+        tuple(f"{i['id']}.{i['property']}" for i in dep['inputs']): dep
+        for dep in dependencies if not dep.get('clientside_function')
+    }
+
+
+def callback_body(dep, values, changed=0):
+    inputs = [
+        {'id': i['id'], 'property': i['property'], 'value': v}
+        for i, v in zip(dep['inputs'], values)
+    ]
+    return {
+        'output': dep['output'], 'outputs': _outputs(dep['output']),
+        'inputs': inputs, 'state': [],
+        'changedPropIds': [f"{inputs[changed]['id']}.{inputs[changed]['property']}"],
+    }
+
+
+def find_prop(tree, component_id, prop):
+    """``prop`` of the component with ``component_id`` in a serialized layout."""
+    if isinstance(tree, list):
+        for item in tree:
+            found = find_prop(item, component_id, prop)
+            if found is not None:
+                return found
+    elif isinstance(tree, dict):
+        props = tree.get('props', {})
+        if props.get('id') == component_id:
+            return props.get(prop)
+        return find_prop(props.get('children'), component_id, prop)
+    return None
+
+
+# Session plan
+def load_plan():
+    """Labels and ranges the virtual users pick their inputs from."""
+    from core.dataset import load_columns
+    from core.index import FILTER_COLS, get_code_index
+    from core.timeseries import get_daily_counts
+
+    index = get_code_index()
+    daily = get_daily_counts()
+    return {
+        'labels': {c: [str(v) for v in index.codes(c)[1]] for c in FILTER_COLS},
+        'columns': list(load_columns()),
+        'first': str(daily.first_date),
+        'last': str(daily.last_date),
+    }
+
+
+FILTER_INPUTS = ['filter-country', 'filter-gender', 'filter-treatment',
+                 'filter-occupation', 'filter-self-employed', 'filter-family-history']
+FILTER_COLUMNS = ['Country', 'Gender', 'treatment', 'Occupation', 'self_employed', 'family_history']
+
+
+class User:
+    """One virtual browser: visits home, visualizations and features in turn."""
+
+    def __init__(self, transport, specs, plan, rng, record, think=0.0):
+        self.t = transport
+        self.specs = specs
+        self.plan = plan
+        self.rng = rng
+        self.record = record
+        self.think = think
+
+    def _timed(self, kind, method, path, body=None):
+        start = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            status, data = self.t.request(method, path, body)
+        except Exception:
+            status, data = 599, b''
+        self.record(kind, start, time.perf_counter() - start,
+                    time.thread_time() - cpu, status, len(data), 1)
+        return status, data
+
+    def get(self, kind, path):
+        return self._timed(kind, 'GET', path)
+
+    def call(self, kind, inputs, values, changed=0):
+        """Post a callback; returns its ``response`` dict, or None."""
+        body = callback_body(self.specs[inputs], values, changed)
+        status, data = self._timed(kind, 'POST', '/_dash-update-component', body)
+        if status != 200:
+            return None
+        out = json.loads(data)
+        if 'cacheKey' in out:
+            return self._follow_job(kind, body, out)
+        return out.get('response')
+
+    def _follow_job(self, kind, body, job):
+        # as the renderer does: re-post with the job's key until it answers
+        path = f"/_dash-update-component?cacheKey={job['cacheKey']}&job={job['job']}"
+        start = time.perf_counter()
+        polls = 0
+        status, out = 599, None
+        while time.perf_counter() - start < JOB_TIMEOUT_S:
+            time.sleep(JOB_POLL_S)
+            polls += 1
+            status, data = self.t.request('POST', path, body)
+            if status == 204:
+                break
+            if status != 200:
+                break
+            out = json.loads(data)
+            if 'response' in out:
+                break
+        self.record(f"{kind} (job)", start, time.perf_counter() - start, 0.0,
+                    status, 0, polls)
+        return out.get('response') if isinstance(out, dict) else None
+
+    def pause(self):
+        if self.think:
+            time.sleep(self.rng.expovariate(1 / self.think))
+
+    # Random inputs
+    def _filters(self):
+        values = []
+        for column in FILTER_COLUMNS:
+            labels = self.plan['labels'][column]
+            if self.rng.random() < 0.6 or not labels:
+                values.append(['All'])
+            else:
+                values.append(self.rng.sample(labels, min(len(labels), self.rng.randint(1, 2))))
+        return values
+
+    def _segment(self, column):
+        labels = self.plan['labels'][column]
+        return ['All'] if self.rng.random() < 0.5 else [self.rng.choice(labels)]
+
+    def _dates(self):
+        days = np.arange(np.datetime64(self.plan['first']), np.datetime64(self.plan['last']) + 1)
+        a, b = sorted(self.rng.sample(range(len(days)), 2))
+        return str(days[a]), str(days[b])
+
+    # Visits
+    def page(self, pathname):
+        self.get('page html', pathname)
+        self.get('page layout', '/_dash-layout')
+        self.get('page dependencies', '/_dash-dependencies')
+        response = self.call(f"page content {pathname}",
+                             ('_pages_location.pathname', '_pages_location.search'), [pathname, ''])
+        return (response or {}).get('_pages_content', {}).get('children')
+
+    def visit_home(self):
+        self.page('/')
+        trend = ('home-date-picker.start_date', 'home-date-picker.end_date', 'home-trend-agg.value')
+        self.call('trend default', trend, [self.plan['first'], self.plan['last'], 'M'])
+        self.pause()
+        self.call('trend date picker', trend, [*self._dates(), self.rng.choice('DWM')])
+        self.pause()
+        self.call('correlation segments',
+                  ('home-corr-country.value', 'home-corr-gender.value', 'home-corr-occupation.value'),
+                  [self._segment('Country'), self._segment('Gender'), self._segment('Occupation')])
+
+    def distribution(self, kind, filters, column):
+        inputs = tuple(f"{f}.value" for f in FILTER_INPUTS) + ('dist-column-dropdown.value',)
+        response = self.call(kind, inputs, filters + [column])
+        pending = (response or {}).get('dist-pending', {}).get('data')
+        if pending:
+            self.call('distribution exact', ('dist-pending.data',), [pending])
+
+    def grouped(self, kind, x, hue, filters):
+        inputs = ('group-x.value', 'group-hue.value') + tuple(f"{f}.value" for f in FILTER_INPUTS)
+        response = self.call(kind, inputs, [x, hue] + filters)
+        pending = (response or {}).get('group-pending', {}).get('data')
+        if pending:
+            self.call('grouped bar exact', ('group-pending.data',), [pending])
+
+    def visit_visualizations(self):
+        self.page('/visualizations')
+        every = [['All']] * 6
+        self.distribution('distribution default', every, 'Days_Indoors')
+        self.grouped('grouped bar default', 'Country', 'Gender', every)
+        filters = every
+        for _ in range(3):
+            self.pause()
+            filters = self._filters()
+            self.distribution('distribution filters', filters, self.rng.choice(self.plan['columns']))
+        self.pause()
+        x, hue = self.rng.sample(self.plan['columns'], 2)
+        self.grouped('grouped bar axes', x, hue, filters)
+
+    def visit_features(self):
+        # pick from the options the page offers; not every column has a card
+        options = find_prop(self.page('/features'), 'feature-dropdown', 'options')
+        features = [o['value'] for o in options or []] or self.plan['columns']
+        self.call('feature cards default', ('feature-dropdown.value',), [features[0]])
+        self.pause()
+        self.call('feature cards', ('feature-dropdown.value',), [self.rng.choice(features)])
+
+    def run(self, deadline):
+        while time.perf_counter() < deadline:
+            for visit in (self.visit_home, self.visit_visualizations, self.visit_features):
+                if time.perf_counter() >= deadline:
+                    break
+                visit()
+                self.pause()
+
+
+# Lock contention
+def _blocked_site(frame):
+    """``file:line`` of the ``with ... lock`` the frame's thread waits at, if any."""
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if path.startswith(ROOT) and not path.startswith(os.path.join(ROOT, 'bench')):
+            line = linecache.getline(path, frame.f_lineno).strip()
+            if line.startswith('with ') and 'lock' in line.lower():
+                return f"{os.path.relpath(path, ROOT)}:{frame.f_lineno} {frame.f_code.co_name}"
+            return None
+        frame = frame.f_back
+    return None
+
+
+def sample_contention(thread_ids, stop, counts):
+    """Count samples of user threads sitting on a lock acquire in repo code.
+
+    A thread blocked on a lock has no Python frame for the acquire itself,
+    so it shows up parked on its ``with ..._lock:`` line.
+    """
+    while not stop.wait(CONTENTION_SAMPLE_S):
+        frames = sys._current_frames()
+        counts['samples'] += 1
+        for tid in thread_ids:
+            site = _blocked_site(frames.get(tid))
+            if site:
+                counts['sites'][site] = counts['sites'].get(site, 0) + 1
+
+
+# Workers
+def run_users(make_transport, specs, plan, n_users, duration, seed, think, in_process):
+    """Run ``n_users`` user threads until ``duration`` elapses; returns raw results."""
+    records = []
+    deadline = time.perf_counter() + duration
+
+    def record(*row):
+        records.append(row)
+
+    threads = [
+        threading.Thread(
+            target=User(make_transport(), specs, plan, random.Random(seed + i), record, think).run,
+            args=(deadline,), name=f"user-{i}", daemon=True
+        )
+        for i in range(n_users)
+    ]
+    for th in threads:
+        th.start()
+    contention = {'samples': 0, 'sites': {}}
+    stop = threading.Event()
+    if in_process:
+        sampler = threading.Thread(
+            target=sample_contention, args=({th.ident for th in threads}, stop, contention),
+            daemon=True
+        )
+        sampler.start()
+    for th in threads:
+        th.join()
+    stop.set()
+    return {'records': records, 'contention': contention, 'pid': os.getpid()}
+
+
+def _process_main(queue, *args):
+    queue.put(run_users(*args))
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def children(pid):
+    found = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as fh:
+                ppid = int(fh.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(name))
+    return found
+
+
+def sample_rss(pids, interval, stop, series):
+    start = time.perf_counter()
+    while True:
+        t = round(time.perf_counter() - start, 2)
+        for pid in pids():
+            mb = rss_mb(pid)
+            if mb is not None:
+                series.append({'t': t, 'pid': pid, 'rss_mb': round(mb, 1)})
+        if stop.wait(interval):
+            break
+
+
+# gunicorn
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers, threads, port):
+    # run from here, so a relative DATASET_PATH means what it means to us
+    path = os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')]))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--workers', str(workers), '--threads', str(threads),
+         '--bind', f"127.0.0.1:{port}", '--log-level', 'warning', 'app:server'],
+        env=dict(os.environ, LOG_LEVEL='WARNING', PYTHONPATH=path)
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError('gunicorn did not start listening')
+
+
+# Report
+def _percentiles(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+def summarize(results, duration, warmup, rss, in_process=True):
+    rows = [r for res in results for r in res['records']]
+    t0 = min((r[1] for r in rows), default=0)
+    rows = [r for r in rows if r[1] - t0 >= warmup]
+    window = max(duration - warmup, 1e-9)
+
+    by_kind = {}
+    for kind, _, seconds, cpu, status, size, requests in rows:
+        by_kind.setdefault(kind, []).append((seconds, cpu, status, size, requests))
+    kinds = {}
+    for kind, items in sorted(by_kind.items()):
+        seconds = [i[0] for i in items]
+        errors = sum(1 for i in items if i[2] not in (200, 204))
+        wall, cpu = sum(seconds), sum(i[1] for i in items)
+        kinds[kind] = {
+            'count': len(items), 'errors': errors, **_percentiles(seconds),
+            'mean_bytes': float(np.mean([i[3] for i in items])),
+            # under the GIL, in-process threads wait when this drops well below 1
+            'cpu_per_wall': cpu / wall if in_process and wall and cpu else None,
+        }
+
+    samples = sum(res['contention']['samples'] for res in results)
+    sites = {}
+    for res in results:
+        for site, n in res['contention']['sites'].items():
+            sites[site] = sites.get(site, 0) + n
+    per_pid = {}
+    for point in rss:
+        per_pid.setdefault(point['pid'], []).append(point['rss_mb'])
+
+    total_requests = sum(r[6] for r in rows)
+    errors = sum(1 for r in rows if r[4] not in (200, 204))
+    return {
+        'requests': total_requests,
+        'interactions': len(rows),
+        'throughput_rps': total_requests / window,
+        'error_rate': errors / len(rows) if rows else 0.0,
+        'latency': _percentiles([r[2] for r in rows]) if rows else {},
+        'kinds': kinds,
+        'contention': {
+            'samples': samples,
+            # share of sampled user threads parked on each lock
+            'sites': {s: n / samples for s, n in sorted(sites.items(), key=lambda kv: -kv[1])}
+                     if samples else {},
+        },
+        'rss': {
+            str(pid): {'start_mb': v[0], 'max_mb': max(v), 'end_mb': v[-1]}
+            for pid, v in per_pid.items()
+        },
+        'rss_series': rss,
+    }
+
+
+def print_report(report, args):
+    print(f"{args.target}: {args.users} users, {args.processes or 1} process(es), "
+          f"{args.duration:g}s ({args.warmup:g}s warm-up excluded)")
+    lat = report['latency']
+    print(f"{report['requests']:,} requests, {report['throughput_rps']:.1f} req/s, "
+          f"errors {report['error_rate']:.2%}, p50 {lat.get('p50_ms', 0):.1f} ms, "
+          f"p95 {lat.get('p95_ms', 0):.1f} ms, p99 {lat.get('p99_ms', 0):.1f} ms")
+    print(f"\n{'interaction':<34}{'count':>7}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'max ms':>9}{'cpu/wall':>9}")
+    for kind, k in report['kinds'].items():
+        cpu = f"{k['cpu_per_wall']:.2f}" if k['cpu_per_wall'] is not None else '-'
+        print(f"{kind[:33]:<34}{k['count']:>7}{k['errors']:>5}{k['p50_ms']:>9.1f}"
+              f"{k['p95_ms']:>9.1f}{k['p99_ms']:>9.1f}{k['max_ms']:>9.1f}{cpu:>9}")
+    print('\nRSS per server process (MiB): start / max / end')
+    for pid, r in report['rss'].items():
+        print(f"  {pid:>8}  {r['start_mb']:8.1f} {r['max_mb']:8.1f} {r['end_mb']:8.1f}")
+    sites = report['contention']['sites']
+    if args.target != 'client':
+        print('\nlock contention: only sampled with --target client')
+    elif not sites:
+        print('\nlock contention: no user thread was sampled waiting on a lock')
+    else:
+        print('\nlock contention (share of thread samples waiting):')
+        for site, share in list(sites.items())[:10]:
+            print(f"  {share:7.2%}  {site}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=['client', 'gunicorn'], default='client')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=0,
+                        help='spread users over this many forked processes; 0 runs them as threads here')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=0,
+                        help='seconds at the start left out of the statistics')
+    parser.add_argument('--think', type=float, default=0,
+                        help='mean pause between interactions in seconds')
+    parser.add_argument('--gunicorn-workers', type=int, default=2)
+    parser.add_argument('--gunicorn-threads', type=int, default=4)
+    parser.add_argument('--rss-interval', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='also write the full report, with the RSS series, as JSON')
+    args = parser.parse_args(argv)
+
+    server_proc = None
+    if args.target == 'client':
+        from app import server
+        in_process = True
+        make_transport = lambda: ClientTransport(server)  # noqa: E731
+        status, data = ClientTransport(server).request('GET', '/_dash-dependencies')
+    else:
+        port = _free_port()
+        server_proc = start_gunicorn(args.gunicorn_workers, args.gunicorn_threads, port)
+        in_process = False
+        make_transport = lambda: HttpTransport('127.0.0.1', port)  # noqa: E731
+        status, data = HttpTransport('127.0.0.1', port).request('GET', '/_dash-dependencies')
+    if status != 200:
+        raise RuntimeError(f"/_dash-dependencies returned {status}")
+    specs = callback_specs(json.loads(data))
+    plan = load_plan()
+
+    rss, stop = [], threading.Event()
+    procs = []
+    if server_proc is not None:
+        pids = lambda: [server_proc.pid] + children(server_proc.pid)  # noqa: E731
+    elif args.processes:
+        pids = lambda: [p.pid for p in procs]  # noqa: E731
+    else:
+        pids = lambda: [os.getpid()]  # noqa: E731
+    sampler = threading.Thread(target=sample_rss, args=(pids, args.rss_interval, stop, rss), daemon=True)
+
+    try:
+        common = (make_transport, specs, plan)
+        if args.processes:
+            queue = _fork.Queue()
+            shares = [len(range(i, args.users, args.processes)) for i in range(args.processes)]
+            procs = [
+                _fork.Process(target=_process_main, args=(
+                    queue, *common, n, args.duration, args.seed + 1000 * i, args.think, in_process
+                ), daemon=True)
+                for i, n in enumerate(shares) if n
+            ]
+            for p in procs:
+                p.start()
+            sampler.start()
+            results = [queue.get() for _ in procs]
+            for p in procs:
+                p.join()
+        else:
+            sampler.start()
+            results = [run_users(*common, args.users, args.duration, args.seed,
+                                 args.think, in_process)]
+    finally:
+        stop.set()
+        sampler.join()
+        if server_proc is not None:
+            server_proc.terminate()
+            server_proc.wait()
+
+    report = summarize(results, args.duration, args.warmup, rss, in_process)
+    print_report(report, args)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            json.dump({'args': vars(args), **report}, fh, indent=1)
+
+
+if __name__ == '__main__':
+    main()
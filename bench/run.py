@@ -0,0 +1,102 @@
+"""Benchmark the page callbacks on synthetic data from 1x to 100x.
+
+    python -m bench.run --scales 1 10 100 --out bench-results.json
+    python -m bench.compare old.json new.json
+
+Each scale runs in its own interpreter with its own dataset cache, so
+module-level caches never leak between sizes. Bootstrapped copies repeat
+more rows the larger they are, so every scale runs with the same
+``WEIGHTED_MAX_RATIO`` (off by default): otherwise the deduplicated path
+(core.weighted) switches on at 10x and the scales stop being comparable.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from bench.synthetic import generate
+from core.dataset import DATA_PATH
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _git_rev():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scale(scale, work_dir, source, repeats, seed, weighted_max_ratio=0.0):
+    csv_path = os.path.join(work_dir, f"survey-x{scale:g}-s{seed}.csv")
+    if not os.path.exists(csv_path):
+        generate(csv_path, scale, source, seed)
+
+    env = dict(
+        os.environ,
+        DATASET_PATH=csv_path,
+        DATASET_CACHE_DIR=os.path.join(work_dir, 'cache'),
+        LOG_LEVEL='WARNING',
+        WEIGHTED_MAX_RATIO=str(weighted_max_ratio),
+    )
+    env.pop('MEMO_DISK_DIR', None)
+    proc = subprocess.run(
+        [sys.executable, '-m', 'bench.callbacks', '--repeats', str(repeats)],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"scale {scale:g} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--source', default=DATA_PATH)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--weighted-max-ratio', type=float, default=0.0,
+                        help='WEIGHTED_MAX_RATIO for every scale; 0 counts every row')
+    parser.add_argument('--work-dir', default='.bench')
+    parser.add_argument('--out', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    work_dir = os.path.abspath(args.work_dir)
+    source = os.path.abspath(args.source)
+
+    report = {
+        'meta': {
+            'git_rev': _git_rev(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'repeats': args.repeats,
+            'seed': args.seed,
+            'weighted_max_ratio': args.weighted_max_ratio,
+        },
+        'scales': {},
+    }
+    for scale in args.scales:
+        print(f"scale x{scale:g} ...", file=sys.stderr)
+        report['scales'][f"{scale:g}"] = run_scale(
+            scale, work_dir, source, args.repeats, args.seed, args.weighted_max_ratio
+        )
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Synthetic copies of the survey at a multiple of its size.
+
+Rows are bootstrapped from the real CSV when it is available, which keeps
+every column's distribution and the joint distribution between columns.
+Without it, columns are drawn independently from ``FALLBACK_SCHEMA``.
+Bootstrapped answers repeat: at 10x only a few percent of the rows are
+distinct, which is why ``bench.run`` pins ``WEIGHTED_MAX_RATIO``.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.dataset import DATA_PATH, load_dataset
+
+BASE_ROWS = 292_364
+CHUNK_ROWS = 500_000
+
+YES_NO = ['No', 'Yes']
+YES_NO_MAYBE = ['No', 'Maybe', 'Yes']
+FALLBACK_SCHEMA = {
+    'Gender':                  ['Female', 'Male'],
+    'Country':                 ['United States', 'United Kingdom', 'Canada', 'Australia',
+                                'Netherlands', 'Ireland', 'Germany', 'India', 'Brazil', 'France'],
+    'Occupation':              ['Business', 'Corporate', 'Housewife', 'Others', 'Student'],
+    'self_employed':           YES_NO + [None],
+    'family_history':          YES_NO,
+    'treatment':               YES_NO,
+    'Days_Indoors':            ['1-14 days', '15-30 days', '31-60 days',
+                                'Go out Every day', 'More than 2 months'],
+    'Growing_Stress':          YES_NO_MAYBE,
+    'Changes_Habits':          YES_NO_MAYBE,
+    'Mental_Health_History':   YES_NO_MAYBE,
+    'Mood_Swings':             ['High', 'Low', 'Medium'],
+    'Coping_Struggles':        YES_NO,
+    'Work_Interest':           YES_NO_MAYBE,
+    'Social_Weakness':         YES_NO_MAYBE,
+    'mental_health_interview': YES_NO_MAYBE,
+    'care_options':            ['No', 'Not sure', 'Yes'],
+}
+FALLBACK_SPAN = (pd.Timestamp('2014-08-27'), pd.Timestamp('2016-02-01'))
+
+
+def _fallback_chunk(rng, n):
+    lo, hi = (t.value // (60 * 10**9) for t in FALLBACK_SPAN)
+    minutes = np.sort(rng.integers(lo, hi, n))
+    data = {'Timestamp': pd.to_datetime(minutes, unit='m')}
+    for col, values in FALLBACK_SCHEMA.items():
+        data[col] = rng.choice(np.array(values, dtype=object), n)
+    return pd.DataFrame(data)
+
+
+def generate(out_path, scale=1.0, source=DATA_PATH, seed=0):
+    """Write ``scale`` x the source row count to ``out_path``; returns the row count."""
+    rng = np.random.default_rng(seed)
+    base = load_dataset(source) if os.path.exists(source) else None
+    total = int(round((len(base) if base is not None else BASE_ROWS) * scale))
+
+    tmp = f"{out_path}.tmp"
+    written = 0
+    while written < total:
+        n = min(CHUNK_ROWS, total - written)
+        if base is not None:
+            chunk = base.iloc[np.sort(rng.integers(0, len(base), n))]
+        else:
+            chunk = _fallback_chunk(rng, n)
+        chunk.to_csv(tmp, mode='w' if written == 0 else 'a',
+                     header=written == 0, index=False)
+        written += n
+    os.replace(tmp, out_path)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('out', help='CSV file to write')
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--source', default=DATA_PATH)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    rows = generate(args.out, args.scale, args.source, args.seed)
+    print(f"wrote {rows:,} rows to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
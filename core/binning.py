@@ -0,0 +1,121 @@
+import os
+
+import pandas as pd
+
+# Categorical axes beyond this many values are folded to top-K plus an "Other" bin
+MAX_CATEGORIES = int(os.environ.get('BINNING_MAX_CATEGORIES', 40))
+# Hue values become one trace each, so they get a tighter cap
+MAX_TRACES = int(os.environ.get('BINNING_MAX_TRACES', 12))
+# Datetime x axes are resampled to the finest frequency with at most this
+# many bins (datetime hues keep the MAX_TRACES cap)
+MAX_TIME_BINS = int(os.environ.get('BINNING_MAX_TIME_BINS', 120))
+# Hard cap on bars per figure after folding
+MAX_POINTS = int(os.environ.get('BINNING_MAX_POINTS', 600))
+
+OTHER = 'Other'
+TIME_FREQS = ['D', 'W', 'M', 'Q', 'Y']
+
+
+def time_freq(labels, max_bins=MAX_TIME_BINS):
+    """Finest period frequency that spans ``labels`` in at most ``max_bins`` bins."""
+    lo, hi = labels.min(), labels.max()
+    for freq in TIME_FREQS:
+        if len(pd.period_range(lo, hi, freq=freq)) <= max_bins:
+            return freq
+    return TIME_FREQS[-1]
+
+
+def other_label(labels, n_folded):
+    """Label of the bin holding ``n_folded`` folded values; never one of ``labels``."""
+    taken = set(labels)
+    label = f"{OTHER} ({n_folded} more)"
+    while label in taken:
+        label += '*'
+    return label
+
+
+def fold_labels(labels, counts, max_values, as_text=False, max_time_bins=None):
+    """Map each label to its display bin.
+
+    Datetimes are resampled to periods, at most ``max_time_bins`` of them
+    (default ``max_values``); other labels beyond ``max_values`` keep the
+    top ``max_values - 1`` by count and fold the rest into an "Other" bin.
+    Returns ``(mapping, order)``.
+    """
+    labels = pd.Index(labels)
+    if isinstance(labels, pd.DatetimeIndex):
+        periods = labels.to_period(time_freq(labels, max_time_bins or max_values))
+        binned = periods.astype(str) if as_text else periods.start_time
+        order = pd.Index(binned).unique().sort_values()
+        return pd.Series(binned, index=labels), list(order)
+    if labels.nunique() <= max_values:
+        return pd.Series(labels, index=labels), list(labels.unique())
+    totals = pd.Series(counts, index=labels).groupby(level=0, observed=True).sum()
+    keep = set(totals.sort_values(ascending=False, kind='stable').index[:max_values - 1])
+    other = other_label(totals.index, len(totals) - len(keep))
+    mapping = pd.Series([l if l in keep else other for l in labels], index=labels)
+    return mapping, [l for l in totals.index if l in keep] + [other]
+
+
+def time_bins(n_traces=1):
+    """Bins allowed on a datetime x axis drawn with ``n_traces`` traces."""
+    return max(1, min(MAX_TIME_BINS, MAX_POINTS // max(n_traces, 1)))
+
+
+def fold_counts(column, value_counts, max_values=MAX_CATEGORIES):
+    """Bound a ``value_counts`` series to at most ``max_values`` bars.
+
+    A datetime index is resampled to at most ``MAX_TIME_BINS`` bars instead.
+    """
+    max_values = min(max_values, MAX_POINTS)
+    labels = value_counts.index
+    if not isinstance(labels, pd.DatetimeIndex) and len(labels) <= max_values:
+        return value_counts
+    mapping, order = fold_labels(labels, value_counts.values, max_values, max_time_bins=time_bins())
+    folded = value_counts.groupby(mapping.values, sort=False).sum()
+    if isinstance(labels, pd.DatetimeIndex):
+        folded = folded.sort_index()
+    else:
+        folded = folded.sort_values(ascending=False, kind='stable')
+    folded.index.name = column
+    return folded
+
+
+def crosstab_folding(x, hue, grouped, max_x=MAX_CATEGORIES, max_hue=MAX_TRACES):
+    """``(x_map, x_order, hue_map, hue_order)`` for ``fold_crosstab``, or None if no folding is needed."""
+    if grouped.empty:
+        return None
+    n_hue = min(grouped[hue].nunique(), max_hue)
+    max_x = max(1, min(max_x, MAX_POINTS // n_hue))
+    if (
+        grouped[x].nunique() <= max_x and grouped[hue].nunique() <= max_hue
+        and not pd.api.types.is_datetime64_any_dtype(grouped[x])
+        and not pd.api.types.is_datetime64_any_dtype(grouped[hue])
+    ):
+        return None
+    x_map, x_order = fold_labels(grouped[x], grouped['count'], max_x, max_time_bins=time_bins(n_hue))
+    hue_map, hue_order = fold_labels(grouped[hue], grouped['count'], max_hue, as_text=True)
+    return x_map, x_order, hue_map, hue_order
+
+
+def fold_crosstab(x, hue, grouped, max_x=MAX_CATEGORIES, max_hue=MAX_TRACES):
+    """Bound a long ``[x, hue, 'count']`` frame in bars and traces."""
+    folding = crosstab_folding(x, hue, grouped, max_x, max_hue)
+    if folding is None:
+        return grouped
+
+    x_map, x_order, hue_map, hue_order = folding
+    folded = pd.DataFrame({
+        x: pd.Categorical(x_map.values, categories=x_order),
+        hue: pd.Categorical(hue_map.values, categories=hue_order),
+        'count': grouped['count'].values,
+    })
+    folded = (
+        folded.groupby([x, hue], observed=True, sort=True)['count']
+              .sum()
+              .reset_index()
+    )
+    x_is_time = pd.api.types.is_datetime64_any_dtype(grouped[x])
+    folded[x] = folded[x].astype('datetime64[ns]' if x_is_time else object)
+    folded[hue] = folded[hue].astype(object)
+    return folded
@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from core.dataset import DATA_PATH, per_dataset
+from core.index import get_code_index, weighted_bincount
+
+CROSSTAB_MAX_PAIRS = int(os.environ.get('CROSSTAB_MAX_PAIRS', 300))
+# Above this many (x, hue) cells the counts are taken sparsely with np.unique
+MAX_DENSE_CELLS = 1 << 22
+# Rows combined per dense bincount, to bound the int64 pair codes; a
+# multiple of 8 so each pass takes whole bytes of a packed mask
+CROSSTAB_CHUNK_ROWS = 1 << 20
+
+
+def _long_frame(x, hue, lx, lh, keys, values, n_hue):
+    ix, ih = np.divmod(keys, n_hue)
+    # code 0 is missing; groupby drops those rows
+    keep = (ix > 0) & (ih > 0)
+    ix, ih, values = ix[keep] - 1, ih[keep] - 1, values[keep]
+    return pd.DataFrame({
+        x: pd.Index(lx).take(ix),
+        hue: pd.Index(lh).take(ih),
+        'count': values,
+    })
+
+
+class CrosstabEngine:
+    """Pair counts from one ``bincount`` over ``code_x * n_hue + code_hue``.
+
+    On a weighted index the rows' weights are summed instead of counted.
+
+    Unfiltered pairs are memoized with LRU eviction; filtered calls take a
+    packed mask from ``CodeIndex.mask`` and are computed on the fly.
+    """
+
+    def __init__(self, index, max_pairs=CROSSTAB_MAX_PAIRS):
+        self.index = index
+        self.max_pairs = max_pairs
+        self._pairs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def counts(self, x, hue, mask=None):
+        """Long ``[x, hue, 'count']`` frame of non-empty cells, like ``groupby().size()``."""
+        if mask is None:
+            with self._lock:
+                if (x, hue) in self._pairs:
+                    self._pairs.move_to_end((x, hue))
+                    return self._pairs[(x, hue)]
+
+        result = self._compute(x, hue, mask)
+
+        if mask is None:
+            with self._lock:
+                self._pairs[(x, hue)] = result
+                while len(self._pairs) > self.max_pairs:
+                    self._pairs.popitem(last=False)
+        return result
+
+    def _compute(self, x, hue, mask):
+        cx, lx = self.index.codes(x)
+        ch, lh = self.index.codes(hue)
+        weights = self.index.weights
+        n_hue = len(lh) + 1
+        cells = (len(lx) + 1) * n_hue
+        if cells <= MAX_DENSE_CELLS:
+            # summed a chunk at a time, so no full-length array is built
+            counts = np.zeros(cells, dtype=np.int64)
+            for start in range(0, len(cx), CROSSTAB_CHUNK_ROWS):
+                stop = min(start + CROSSTAB_CHUNK_ROWS, len(cx))
+                a, b = cx[start:stop], ch[start:stop]
+                w = None if weights is None else weights[start:stop]
+                if mask is not None:
+                    rows = np.unpackbits(mask[start // 8:(stop + 7) // 8], count=stop - start).view(bool)
+                    a, b = a[rows], b[rows]
+                    w = None if w is None else w[rows]
+                counts += weighted_bincount(a.astype(np.int64) * n_hue + b, w, cells)
+            keys = np.flatnonzero(counts)
+            return _long_frame(x, hue, lx, lh, keys, counts[keys], n_hue)
+
+        if mask is not None:
+            rows = self.index.unpack(mask)
+            cx, ch = cx[rows], ch[rows]
+            weights = None if weights is None else weights[rows]
+        combined = cx.astype(np.int64) * n_hue + ch
+        if weights is None:
+            keys, values = np.unique(combined, return_counts=True)
+        else:
+            keys, inverse = np.unique(combined, return_inverse=True)
+            values = weighted_bincount(inverse.reshape(-1), weights, len(keys))
+        return _long_frame(x, hue, lx, lh, keys, values, n_hue)
+
+    def seed(self, x, hue, grid):
+        """Cache both orientations of a dense ``(n_x + 1, n_hue + 1)`` count grid."""
+        _, lx = self.index.codes(x)
+        _, lh = self.index.codes(hue)
+        with self._lock:
+            for a, b, g, la, lb in ((x, hue, grid, lx, lh), (hue, x, grid.T, lh, lx)):
+                flat = g.ravel()
+                keys = np.flatnonzero(flat)
+                self._pairs[(a, b)] = _long_frame(a, b, la, lb, keys, flat[keys], g.shape[1])
+            while len(self._pairs) > self.max_pairs:
+                self._pairs.popitem(last=False)
+
+    def warm_up(self, columns):
+        """Fill the pair cache for every ordered pair of distinct ``columns``."""
+        for x in columns:
+            for hue in columns:
+                if x != hue:
+                    self.counts(x, hue)
+
+
+@per_dataset
+def get_crosstab_engine(path=DATA_PATH):
+    return CrosstabEngine(get_code_index(path))
@@ -0,0 +1,498 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+from core.timing import phase, timed
+
+DATA_PATH = os.environ.get('DATASET_PATH', 'Mental Health Dataset.csv')
+CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', '.dataset_cache')
+CACHE_VERSION = 3
+# Memory-map the column files read-only, so every worker on a host shares
+# one page-cache copy instead of holding its own.
+DATASET_MMAP = os.environ.get('DATASET_MMAP', '1') != '0'
+# Out-of-core mode: with a row count here the CSV is streamed into the
+# cache and the aggregates are built in one chunked pass (core.streaming)
+# instead of from whole columns.
+DATASET_CHUNK_ROWS = int(os.environ.get('DATASET_CHUNK_ROWS', 0))
+
+DATETIME_COLS = ['Timestamp']
+
+logger = logging.getLogger(__name__)
+
+# Bytes just before a source offset that must stay unchanged for a
+# growing file to count as an append rather than a rewrite
+SIGNATURE_BYTES = 4096
+
+# Bytes of each source file covered by its loaded columns, and the
+# signature of the bytes just before that offset (see core.ingest)
+source_offsets = {}
+source_signatures = {}
+
+
+# Dataset the current request or job works on (see core.registry)
+_active = contextvars.ContextVar('active_dataset', default=None)
+
+# Every per-dataset cache, so a dataset can be dropped from all of them
+_dataset_caches = []
+
+
+def active_path():
+    """Source file of the active dataset; ``DATA_PATH`` outside a request."""
+    return os.path.abspath(_active.get() or DATA_PATH)
+
+
+@contextmanager
+def use_dataset(path):
+    """Make ``path`` the active dataset inside the block."""
+    token = _active.set(os.path.abspath(path))
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def per_dataset(func):
+    """Cache ``func(path)`` once per source file, however the path is spelled.
+
+    Called without a path it uses the active dataset. ``replace(path,
+    value)`` swaps in a newer value, so readers always get either the old
+    object or the new one, never a half-updated mix.
+    """
+    cache = {}
+    lock = threading.Lock()
+
+    @wraps(func)
+    def wrapper(path=None):
+        key = os.path.abspath(path) if path else active_path()
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        with lock:
+            if key not in cache:
+                cache[key] = func(key)
+            return cache[key]
+
+    def replace(path, value):
+        cache[os.path.abspath(path)] = value
+
+    def discard(path):
+        cache.pop(os.path.abspath(path), None)
+
+    def peek(path=None):
+        """The cached value, or None without computing it."""
+        return cache.get(os.path.abspath(path) if path else active_path())
+
+    wrapper.cache_clear = cache.clear
+    wrapper.replace = replace
+    wrapper.discard = discard
+    wrapper.peek = peek
+    _dataset_caches.append(wrapper)
+    return wrapper
+
+
+def dataset_cache(func):
+    """``lru_cache(maxsize=None)`` with a separate cache per active dataset."""
+    caches = {}
+
+    @wraps(func)
+    def wrapper(*args):
+        cache = caches.setdefault(active_path(), {})
+        try:
+            return cache[args]
+        except KeyError:
+            pass
+        cache[args] = value = func(*args)
+        return value
+
+    def discard(path):
+        caches.pop(os.path.abspath(path), None)
+
+    wrapper.cache_clear = caches.clear
+    wrapper.discard = discard
+    _dataset_caches.append(wrapper)
+    return wrapper
+
+
+def forget_dataset(path):
+    """Drop everything cached for ``path``; it is reloaded on next use."""
+    for cache in _dataset_caches:
+        cache.discard(path)
+    source_offsets.pop(os.path.abspath(path), None)
+    source_signatures.pop(os.path.abspath(path), None)
+
+
+# Callbacks run after a dataset gained rows (see core.ingest)
+_change_hooks = []
+
+
+def on_data_change(func):
+    """Run ``func()`` whenever appended rows are ingested; returns ``func``."""
+    _change_hooks.append(func)
+    return func
+
+
+def notify_data_change():
+    for func in _change_hooks:
+        func()
+
+
+# Source fingerprint
+def _file_key(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _source_signature(path, offset):
+    with open(path, 'rb') as fh:
+        fh.seek(max(offset - SIGNATURE_BYTES, 0))
+        return hashlib.sha1(fh.read(offset - fh.tell())).hexdigest()
+
+
+def _cache_dir_for(path):
+    abspath = os.path.abspath(path)
+    stem = os.path.splitext(os.path.basename(abspath))[0].replace(' ', '_')
+    tag = hashlib.sha1(abspath.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(CACHE_DIR, f"{stem}-{tag}")
+
+
+def _smallest_int(n):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+# CSV -> column files
+def parse_csv(path):
+    frame = pd.read_csv(path)
+    for c in DATETIME_COLS:
+        if c in frame:
+            frame[c] = pd.to_datetime(frame[c])
+    return frame
+
+
+def _write_cache(frame, path, key, digest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix='.build-', dir=CACHE_DIR)
+
+    columns = []
+    for i, c in enumerate(frame.columns):
+        s = frame[c]
+        fname = f"col_{i:03d}.npy"
+        if pd.api.types.is_datetime64_any_dtype(s):
+            kind, cats = 'datetime', None
+            values = s.to_numpy(dtype='datetime64[ns]').view('int64')
+        elif pd.api.types.is_numeric_dtype(s):
+            kind, cats = 'numeric', None
+            values = s.to_numpy()
+        else:
+            # stored shifted by one, 0 = missing, so readers can bincount
+            # the mapped array directly
+            kind = 'category'
+            codes, uniques = pd.factorize(s, sort=True)
+            cats = [str(u) for u in uniques]
+            values = (codes + 1).astype(_smallest_int(len(cats) + 1))
+        np.save(os.path.join(tmp, fname), values, allow_pickle=False)
+        columns.append({'name': c, 'kind': kind, 'file': fname, 'categories': cats})
+
+    return _finish_cache(tmp, path, columns, len(frame), key, digest)
+
+
+def _write_cache_chunked(path, key, digest, chunk_rows):
+    """Stream the CSV into column files, holding one chunk at a time.
+
+    Category codes are written in first-seen order and renumbered to
+    sorted order at the end, so the files match ``_write_cache``'s. Numeric
+    columns are stored as float64, since a chunk cannot know whether a
+    later one has gaps. Kinds are guessed from the first chunk; a numeric
+    column with text in a later chunk restarts the stream with it as a
+    category, as a whole-file parse would have read it.
+    """
+    head = pd.read_csv(path, nrows=chunk_rows)
+    kinds = {}
+    for c in head.columns:
+        if c in DATETIME_COLS:
+            kinds[c] = 'datetime'
+        elif pd.api.types.is_numeric_dtype(head[c]):
+            kinds[c] = 'numeric'
+        else:
+            kinds[c] = 'category'
+    del head
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    names = list(kinds)
+    while True:
+        tmp = tempfile.mkdtemp(prefix='.build-', dir=CACHE_DIR)
+        raw_paths = [os.path.join(tmp, f"col_{i:03d}.raw") for i in range(len(names))]
+        raw_files = [open(p, 'wb') for p in raw_paths]
+        lookups = {c: {} for c, kind in kinds.items() if kind == 'category'}
+        n_rows = 0
+        text_in = None
+        reader = pd.read_csv(path, chunksize=chunk_rows, dtype={
+            c: str for c, kind in kinds.items() if kind != 'datetime'
+        })
+        try:
+            for chunk in reader:
+                for c, fh in zip(names, raw_files):
+                    s = chunk[c]
+                    if kinds[c] == 'datetime':
+                        values = pd.to_datetime(s).to_numpy(dtype='datetime64[ns]').view('int64')
+                    elif kinds[c] == 'numeric':
+                        values = pd.to_numeric(s, errors='coerce').to_numpy(dtype=np.float64)
+                        if (np.isnan(values) & s.notna().to_numpy()).any():
+                            text_in = c
+                            break
+                    else:
+                        lookup = lookups[c]
+                        present = s.notna().to_numpy()
+                        for label in s[present].unique():
+                            lookup.setdefault(label, len(lookup) + 1)
+                        values = np.zeros(len(s), dtype=np.int32)
+                        values[present] = s[present].map(lookup).to_numpy()
+                    values.tofile(fh)
+                if text_in is not None:
+                    break
+                n_rows += len(chunk)
+        finally:
+            reader.close()
+            for fh in raw_files:
+                fh.close()
+        if text_in is None:
+            break
+        logger.info('%s has text after its first %d rows; reading it as a category', text_in, chunk_rows)
+        kinds[text_in] = 'category'
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    columns = []
+    for i, (c, raw_path) in enumerate(zip(names, raw_paths)):
+        fname = f"col_{i:03d}.npy"
+        kind, cats = kinds[c], None
+        if kind == 'category':
+            cats = sorted(lookups[c])
+            remap = np.zeros(len(cats) + 1, dtype=_smallest_int(len(cats) + 1))
+            for rank, label in enumerate(cats):
+                remap[lookups[c][label]] = rank + 1
+            raw = np.memmap(raw_path, dtype=np.int32, mode='r', shape=(n_rows,))
+        else:
+            remap = None
+            dtype = np.int64 if kind == 'datetime' else np.float64
+            raw = np.memmap(raw_path, dtype=dtype, mode='r', shape=(n_rows,))
+        out = np.lib.format.open_memmap(
+            os.path.join(tmp, fname), mode='w+',
+            dtype=raw.dtype if remap is None else remap.dtype, shape=(n_rows,)
+        )
+        for a in range(0, n_rows, chunk_rows):
+            block = raw[a:a + chunk_rows]
+            out[a:a + chunk_rows] = block if remap is None else remap.take(block)
+        out.flush()
+        del out, raw
+        os.remove(raw_path)
+        columns.append({'name': c, 'kind': kind, 'file': fname, 'categories': cats})
+
+    return _finish_cache(tmp, path, columns, n_rows, key, digest)
+
+
+def _finish_cache(tmp, path, columns, n_rows, key, digest):
+    meta = {'version': CACHE_VERSION, 'source': os.path.abspath(path),
+            'rows': n_rows, 'sha1': digest, 'columns': columns, **key}
+    with open(os.path.join(tmp, 'meta.json'), 'w') as fh:
+        json.dump(meta, fh)
+    meta['dir'] = _publish(tmp, _cache_dir_for(path))
+    return meta
+
+
+def _publish(tmp, target):
+    """Point the ``target`` symlink at the finished build in ``tmp``.
+
+    The swap is one ``os.replace``, so a reader resolves ``target`` to
+    either the old build or the new one, and reads all its files from
+    that build. The build just replaced is kept for readers still on it;
+    older ones are removed. Returns the new build's directory.
+    """
+    build = f"{target}.{os.path.basename(tmp)[len('.build-'):]}"
+    os.rename(tmp, build)
+    link = f"{build}.link"
+    os.symlink(os.path.basename(build), link)
+    if os.path.isdir(target) and not os.path.islink(target):
+        # a plain directory from before CACHE_VERSION 3
+        shutil.rmtree(target, ignore_errors=True)
+    previous = os.path.realpath(target) if os.path.islink(target) else None
+    os.replace(link, target)
+
+    # another worker may have published meanwhile; keep whatever is live
+    keep = {build, previous, os.path.realpath(target)}
+    parent, prefix = os.path.dirname(target), os.path.basename(target) + '.'
+    for name in os.listdir(parent):
+        old = os.path.join(parent, name)
+        if name.startswith(prefix) and not name.endswith('.link') and old not in keep:
+            shutil.rmtree(old, ignore_errors=True)
+    return build
+
+
+def _read_meta(path):
+    # resolve the symlink once; every file is then read from this build
+    base = os.path.realpath(_cache_dir_for(path))
+    try:
+        with open(os.path.join(base, 'meta.json')) as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != CACHE_VERSION:
+        return None
+    meta['dir'] = base
+    return meta
+
+
+def _is_fresh(meta, path, key):
+    if meta is None:
+        return False
+    if meta['size'] == key['size'] and meta['mtime_ns'] == key['mtime_ns']:
+        return True
+    # Touched but identical file: keep the cache, just refresh its key.
+    if meta['size'] == key['size'] and meta['sha1'] == _file_hash(path):
+        meta.update(key)
+        meta_path = os.path.join(meta['dir'], 'meta.json')
+        tmp = f"{meta_path}.{os.getpid()}"
+        with open(tmp, 'w') as fh:
+            json.dump({k: v for k, v in meta.items() if k != 'dir'}, fh)
+        os.replace(tmp, meta_path)
+        return True
+    return False
+
+
+def _columns_from_cache(path, meta):
+    base = meta['dir']
+    columns = {}
+    for col in meta['columns']:
+        values = np.load(
+            os.path.join(base, col['file']),
+            mmap_mode='r' if DATASET_MMAP else None,
+            allow_pickle=False
+        )
+        columns[col['name']] = {
+            'kind': col['kind'],
+            'values': values,
+            'categories': col['categories'],
+        }
+    return columns
+
+
+def _frame_from_columns(columns):
+    data = {}
+    for name, col in columns.items():
+        if col['kind'] == 'datetime':
+            data[name] = col['values'].view('datetime64[ns]')
+        elif col['kind'] == 'category':
+            # categoricals over the cached codes; code 0 (missing) becomes -1
+            data[name] = pd.Categorical.from_codes(
+                np.asarray(col['values']) - 1, col['categories']
+            )
+        else:
+            data[name] = col['values']
+    return pd.DataFrame(data, columns=list(columns))
+
+
+def _object_nbytes(col):
+    # what pandas' deep memory_usage reports for the column as Python strings
+    values = np.asarray(col['values'])
+    if col['kind'] != 'category':
+        return values.nbytes
+    counts = np.bincount(values, minlength=len(col['categories']) + 1)
+    sizes = [sys.getsizeof(np.nan)] + [sys.getsizeof(c) for c in col['categories']]
+    return 8 * len(values) + int(counts @ np.array(sizes))
+
+
+def memory_report(columns):
+    """Per-column footprint as a text table, next to the same data as object strings."""
+    lines = [f"{'column':<26}{'kind':<10}{'dtype':<8}{'labels':>7}{'bytes':>12}{'as objects':>13}"]
+    total = total_objects = 0
+    for name, col in columns.items():
+        values = col['values']
+        objects = _object_nbytes(col)
+        total += values.nbytes
+        total_objects += objects
+        mapped = ' (mmap)' if isinstance(values, np.memmap) else ''
+        lines.append(
+            f"{name:<26}{col['kind']:<10}{str(values.dtype):<8}{len(col['categories'] or ()):>7}"
+            f"{values.nbytes:>12,}{objects:>13,}{mapped}"
+        )
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    lines.append(
+        f"total {total / 2**20:.1f} MiB, {total_objects / 2**20:.1f} MiB as objects "
+        f"({total_objects / max(total, 1):.0f}x); peak RSS {peak:.0f} MiB"
+    )
+    return "\n".join(lines)
+
+
+def ensure_cache(path=DATA_PATH):
+    """Return the cache metadata for ``path``, rebuilding it if the CSV changed."""
+    key = _file_key(path)
+    meta = _read_meta(path)
+    if _is_fresh(meta, path, key):
+        return meta
+    if DATASET_CHUNK_ROWS:
+        with phase('stream csv into cache'):
+            return _write_cache_chunked(path, key, _file_hash(path), DATASET_CHUNK_ROWS)
+    with phase('parse csv and write cache'):
+        frame = parse_csv(path)
+        return _write_cache(frame, path, key, _file_hash(path))
+
+
+@per_dataset
+@timed('load dataset columns')
+def load_columns(path=DATA_PATH):
+    """Raw cached columns: ``{name: {'kind', 'values', 'categories'}}``.
+
+    Category columns hold integer codes into ``[missing] + categories``
+    (0 is missing); datetime columns hold int64 nanoseconds. With
+    ``DATASET_MMAP`` the arrays are read-only memory maps.
+    """
+    meta = ensure_cache(path)
+    try:
+        columns = _columns_from_cache(path, meta)
+    except FileNotFoundError:
+        # two newer builds were published while this one was read
+        meta = ensure_cache(path)
+        columns = _columns_from_cache(path, meta)
+    source_offsets[os.path.abspath(path)] = meta['size']
+    source_signatures[os.path.abspath(path)] = _source_signature(path, meta['size'])
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("column memory for %s:\n%s", path, memory_report(columns))
+    return columns
+
+
+@per_dataset
+@timed('build dataframe')
+def load_dataset(path=DATA_PATH):
+    """Shared, read-only survey frame; every page gets the same object."""
+    return _frame_from_columns(load_columns(path))
+
+
+@per_dataset
+def data_version(path=DATA_PATH):
+    """Short content hash of the source, used to key derived caches.
+
+    Ingesting appended rows replaces it with a hash chained over the tail.
+    """
+    return ensure_cache(path)['sha1'][:12]
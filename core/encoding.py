@@ -0,0 +1,51 @@
+import numpy as np
+
+ord_mappings = {
+    'self_employed':           {'No':0, 'Yes':1},
+    'family_history':          {'No':0, 'Yes':1},
+    'treatment':               {'No':0, 'Yes':1},
+    'Growing_Stress':          {'No':0, 'Maybe':1, 'Yes':2},
+    'Changes_Habits':          {'No':0, 'Maybe':1, 'Yes':2},
+    'Mental_Health_History':   {'No':0, 'Maybe':1, 'Yes':2},
+    'Mood_Swings':             {'Low':1, 'Medium':2, 'High':3},
+    'Coping_Struggles':        {'No':0, 'Yes':1},
+    'Work_Interest':           {'No':0, 'Maybe':1, 'Yes':2},
+    'Social_Weakness':         {'No':0, 'Maybe':1, 'Yes':2},
+    'mental_health_interview': {'No':0, 'Maybe':1, 'Yes':2},
+    'care_options':            {'No':0, 'Not sure':1, 'Yes':2},
+    'Days_Indoors': {
+        'More than 2 months': 1,
+        '31-60 days':         2,
+        '15-30 days':         3,
+        '1-14 days':          4,
+        'Go out Every day':   5
+    }
+}
+
+
+def numeric_columns(columns):
+    """Columns that are numeric once ordinals are mapped, in source order."""
+    return [
+        name for name, col in columns.items()
+        if col['kind'] == 'numeric'
+        or (col['kind'] == 'category' and name in ord_mappings)
+    ]
+
+
+def encoded_values(columns, name, start=0, stop=None):
+    """float64 values of rows ``start:stop`` of ``name``; NaN where missing or unmapped."""
+    col = columns[name]
+    values = col['values'][start:stop]
+    if col['kind'] != 'category':
+        return np.asarray(values, dtype=np.float64)
+    mapping = ord_mappings[name]
+    lookup = np.array(
+        [np.nan] + [mapping.get(c, np.nan) for c in col['categories']],
+        dtype=np.float64
+    )
+    return lookup.take(values)
+
+
+def encoded_matrix(columns, names, start=0, stop=None):
+    """Rows ``start:stop`` as an ``(n_rows, len(names))`` float64 matrix."""
+    return np.column_stack([encoded_values(columns, n, start, stop) for n in names])
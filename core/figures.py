@@ -0,0 +1,64 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.colors import qualitative
+from plotly.io.json import to_json_plotly
+
+PALETTE = qualitative.Pastel
+ACCENT = '#636EFA'
+
+# A few keys instead of the full plotly_white template, which would
+# otherwise be re-serialized into every figure.
+TEMPLATE = go.layout.Template(layout=dict(
+    font=dict(color='#2a3f5f'),
+    paper_bgcolor='white',
+    plot_bgcolor='white',
+    colorway=qualitative.Plotly,
+    title=dict(x=0.05),
+    hovermode='closest',
+    xaxis=dict(showgrid=True, gridcolor='lightgrey', zeroline=False, automargin=True),
+    yaxis=dict(showgrid=True, gridcolor='lightgrey', zeroline=False, automargin=True),
+    legend=dict(tracegroupgap=0),
+))
+
+
+def typed(values):
+    """Numeric array in the narrowest dtype, so plotly emits a small base64 typed array."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'iu':
+        if arr.size == 0:
+            return arr.astype(np.int32)
+        lo, hi = arr.min(), arr.max()
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if info.min <= lo and hi <= info.max:
+                return arr.astype(dtype)
+        return arr.astype(np.float64)
+    if arr.dtype.kind == 'f':
+        return arr.astype(np.float32)
+    return arr
+
+
+def new_figure(data=None, title=None, **layout):
+    """Figure on the shared compact template."""
+    return go.Figure(data=data, layout=go.Layout(template=TEMPLATE, title=title, **layout))
+
+
+def bar_colors(n, palette=PALETTE):
+    return [palette[i % len(palette)] for i in range(n)]
+
+
+def bar_figure(labels, values, title=None, name='count', **layout):
+    """Single bar trace with per-bar colors instead of one trace per category."""
+    bar = go.Bar(
+        x=labels, y=typed(values),
+        marker_color=bar_colors(len(values)),
+        name=name,
+        hovertemplate='%{x}<br>' + name + '=%{y}<extra></extra>',
+    )
+    return new_figure(bar, title=title, **layout)
+
+
+def payload_bytes(fig):
+    """Size of ``fig`` as Dash will serialize it."""
+    return len(to_json_plotly(fig))
+
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+from core.dataset import DATA_PATH, load_columns, per_dataset
+from core.timing import timed
+
+FILTER_COLS = [
+    'Country', 'Gender', 'treatment',
+    'Occupation', 'self_employed', 'family_history',
+]
+
+
+def weighted_bincount(codes, weights=None, minlength=0):
+    """``np.bincount``, with integer weights summed exactly into int64 counts."""
+    if weights is None:
+        return np.bincount(codes, minlength=minlength)
+    # float64 sums of integers are exact below 2**53
+    return np.bincount(codes, weights, minlength).astype(np.int64)
+
+
+def _pack(codes, labels):
+    """Packed bitset of the rows of each label; codes are shifted by one."""
+    return {label: np.packbits(codes == i + 1) for i, label in enumerate(labels)}
+
+
+class CodeIndex:
+    """Integer codes for every column plus packed bitsets for filter columns.
+
+    Codes are shifted by one so that 0 means missing and ``np.bincount``
+    can run on them directly. A filter is the AND across columns of the OR
+    of the selected values' bitsets.
+
+    With ``weights`` each row stands for that many source rows (see
+    ``core.weighted``); counts are sums of weights and ``n_records`` is
+    the number of source rows.
+    """
+
+    def __init__(self, columns, filter_cols=FILTER_COLS, bitsets=None, totals=None, weights=None):
+        self.columns = columns
+        self.n_rows = len(next(iter(columns.values()))['values'])
+        self.weights = weights
+        self.n_records = self.n_rows if weights is None else int(weights.sum())
+        self._codes = {}
+        self._totals = dict(totals or {})
+        if bitsets is not None:
+            # prebuilt, e.g. by the single-pass scan in core.streaming
+            self.bitsets = bitsets
+            return
+        self.bitsets = {}
+        for c in filter_cols:
+            codes, labels = self.codes(c)
+            self.bitsets[c] = _pack(codes, labels)
+
+    def codes(self, column):
+        """Return ``(codes, labels)`` for ``column``, factorizing on first use."""
+        if column not in self._codes:
+            col = self.columns[column]
+            if col['kind'] == 'category':
+                codes = col['values']
+                labels = list(col['categories'])
+            else:
+                values = col['values']
+                if col['kind'] == 'datetime':
+                    values = values.view('datetime64[ns]')
+                raw, uniques = pd.factorize(values, sort=True)
+                codes = raw + 1
+                labels = list(pd.Index(uniques))
+            self._codes[column] = (codes, labels)
+        return self._codes[column]
+
+    def totals(self, column):
+        """Unfiltered counts per code (index 0 is missing), computed once."""
+        if column not in self._totals:
+            codes, labels = self.codes(column)
+            self._totals[column] = weighted_bincount(codes, self.weights, len(labels) + 1)
+        return self._totals[column]
+
+    def missing_count(self, column):
+        return int(self.totals(column)[0])
+
+    def extended(self, columns):
+        """A new index over ``columns``, whose first rows are this index's rows.
+
+        Totals of category columns are carried over and only the new rows
+        are counted; codes of existing labels never change on append.
+        Bitsets keep their whole bytes and pack only from the byte that
+        holds the first new row.
+        """
+        if self.weights is not None:
+            raise ValueError('a weighted index is rebuilt from extended WeightedRows')
+        index = CodeIndex(columns, bitsets={})
+        kept = self.n_rows // 8
+        for column, bits in self.bitsets.items():
+            codes, labels = index.codes(column)
+            if columns[column]['kind'] != 'category':
+                # factorized codes are renumbered when new values sort in
+                index.bitsets[column] = _pack(codes, labels)
+                continue
+            tail = _pack(codes[kept * 8:], labels)
+            empty = np.zeros(kept, dtype=np.uint8)
+            index.bitsets[column] = {
+                label: np.concatenate([bits.get(label, empty)[:kept], tail[label]])
+                for label in labels
+            }
+        for column, totals in self._totals.items():
+            if columns[column]['kind'] != 'category':
+                continue
+            codes, labels = index.codes(column)
+            merged = np.bincount(codes[self.n_rows:], minlength=len(labels) + 1)
+            merged[:len(totals)] += totals
+            index._totals[column] = merged
+        return index
+
+    def mask(self, selections):
+        """Packed row mask for ``{column: [values]}``; None means every row.
+
+        A selection containing ``'All'``, or None, does not filter. An
+        empty one matches no rows, as ``isin([])`` does.
+        """
+        mask = None
+        for column, values in selections.items():
+            if values is None or 'All' in values:
+                continue
+            bits = self.bitsets[column]
+            col_bits = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            for v in values:
+                if v in bits:
+                    col_bits |= bits[v]
+            mask = col_bits if mask is None else mask & col_bits
+        return mask
+
+    def unpack(self, mask):
+        return np.unpackbits(mask, count=self.n_rows).view(bool)
+
+    def value_counts(self, column, mask=None):
+        """Counts of ``column`` under ``mask``, shaped like ``Series.value_counts``."""
+        codes, labels = self.codes(column)
+        if mask is None:
+            counts = self.totals(column)[1:]
+        else:
+            rows = self.unpack(mask)
+            weights = None if self.weights is None else self.weights[rows]
+            counts = weighted_bincount(codes[rows], weights, len(labels) + 1)[1:]
+        order = np.argsort(-counts, kind='stable')
+        order = order[counts[order] > 0]
+        return pd.Series(
+            counts[order],
+            index=pd.Index([labels[i] for i in order], name=column),
+            name='count',
+        )
+
+
+@per_dataset
+@timed('build code index')
+def get_code_index(path=DATA_PATH):
+    return CodeIndex(load_columns(path))
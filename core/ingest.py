@@ -0,0 +1,162 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from core.crosstab import CrosstabEngine, get_crosstab_engine
+from core.dataset import (
+    DATA_PATH, DATETIME_COLS, data_version, load_columns, load_dataset,
+    notify_data_change, source_offsets, source_signatures,
+    _smallest_int, _source_signature,
+)
+from core.index import get_code_index
+from core.moments import get_moment_cube
+from core.sampling import get_sample
+from core.timeseries import get_daily_counts
+from core.weighted import get_weighted_engine, get_weighted_index, get_weighted_rows
+
+# Seconds between checks of the source file; 0 leaves the watcher off
+INGEST_INTERVAL = float(os.environ.get('INGEST_INTERVAL', 0))
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_stale = set()
+
+
+def read_tail(path, offset, columns):
+    """Parse the complete lines after byte ``offset``.
+
+    Returns ``(frame, raw_bytes)``; a partly written last line is left
+    for the next read.
+    """
+    with open(path, 'rb') as fh:
+        fh.seek(offset)
+        raw = fh.read()
+    raw = raw[:raw.rfind(b'\n') + 1]
+    if not raw.strip():
+        return None, raw
+    # category columns stay text so labels match the ones already coded
+    frame = pd.read_csv(
+        io.BytesIO(raw), header=None, names=list(columns),
+        dtype={n: str for n, c in columns.items() if c['kind'] == 'category'}
+    )
+    for c in DATETIME_COLS:
+        if c in frame:
+            frame[c] = pd.to_datetime(frame[c])
+    return frame, raw
+
+
+def _append_column(col, series):
+    """``col`` with ``series`` appended; new labels go after the existing ones."""
+    if col['kind'] == 'datetime':
+        tail = series.to_numpy(dtype='datetime64[ns]').view('int64')
+        return {**col, 'values': np.concatenate([col['values'], tail])}
+    if col['kind'] == 'numeric':
+        tail = pd.to_numeric(series).to_numpy()
+        return {**col, 'values': np.concatenate([col['values'], tail])}
+
+    categories = list(col['categories'])
+    lookup = {c: i + 1 for i, c in enumerate(categories)}
+    present = series.notna().to_numpy()
+    labels = series[present]
+    for label in labels.unique():
+        if label not in lookup:
+            categories.append(label)
+            lookup[label] = len(categories)
+    dtype = np.result_type(col['values'].dtype, _smallest_int(len(categories) + 1))
+    tail = np.zeros(len(series), dtype=dtype)
+    tail[present] = labels.map(lookup).to_numpy()
+    values = np.concatenate([col['values'].astype(dtype, copy=False), tail])
+    return {**col, 'values': values, 'categories': categories}
+
+
+def ingest(path=DATA_PATH):
+    """Fold rows appended to ``path`` since it was loaded into every aggregate.
+
+    Columns, code index, daily counts, the correlation moment cube and the
+    weighted distinct rows are extended with the new rows only; each is
+    swapped in whole, and the data version last, so a request sees either
+    all old or all new objects. Returns the number of rows added.
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        if path in _stale:
+            return 0
+        columns = load_columns(path)
+        offset = source_offsets[path]
+        size = os.path.getsize(path)
+        if size == offset:
+            return 0
+        if size < offset or _source_signature(path, offset) != source_signatures[path]:
+            _stale.add(path)
+            log.warning('%s was rewritten, not appended to; restart to reload it', path)
+            return 0
+
+        frame, raw = read_tail(path, offset, columns)
+        if frame is None:
+            return 0
+        new_columns = {
+            name: _append_column(col, frame[name]) for name, col in columns.items()
+        }
+
+        old_index = get_code_index(path)
+        index = old_index.extended(new_columns)
+        daily = get_daily_counts(path).extended(
+            new_columns['Timestamp']['values'][old_index.n_rows:]
+        )
+        cube = get_moment_cube(path).extended(new_columns)
+        weighted = get_weighted_rows.peek(path)
+        if weighted is not None:
+            weighted = weighted.extended(new_columns)
+        version = hashlib.sha1(data_version(path).encode('ascii') + raw).hexdigest()[:12]
+
+        load_columns.replace(path, new_columns)
+        get_code_index.replace(path, index)
+        get_crosstab_engine.replace(path, CrosstabEngine(index))
+        get_daily_counts.replace(path, daily)
+        get_moment_cube.replace(path, cube)
+        # a None kept here means the rows were not worth deduplicating
+        if weighted is not None:
+            get_weighted_rows.replace(path, weighted)
+            get_weighted_index.discard(path)
+            get_weighted_engine.discard(path)
+        load_dataset.discard(path)
+        # redrawn with the new rows on next use
+        get_sample.discard(path)
+        data_version.replace(path, version)
+
+        source_offsets[path] = offset + len(raw)
+        source_signatures[path] = _source_signature(path, source_offsets[path])
+
+    notify_data_change()
+    log.info('ingested %d appended rows from %s (version %s)', len(frame), path, version)
+    return len(frame)
+
+
+def _watch(path, interval, stop):
+    while not stop.wait(interval):
+        try:
+            ingest(path)
+        except Exception:
+            log.exception('ingesting appended rows from %s failed', path)
+
+
+def start_watcher(path=DATA_PATH, interval=INGEST_INTERVAL):
+    """Poll ``path`` for appended rows in a daemon thread; returns its stop event.
+
+    Each worker process runs its own watcher. Extended columns live in
+    the worker's own memory rather than the shared memory map.
+    """
+    if interval <= 0:
+        return None
+    stop = threading.Event()
+    threading.Thread(
+        target=_watch, args=(path, interval, stop),
+        name='dataset-watcher', daemon=True
+    ).start()
+    return stop
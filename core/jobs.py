@@ -0,0 +1,298 @@
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import time
+import traceback
+import uuid
+
+from dash.background_callback.managers import BaseBackgroundCallbackManager
+from dash.exceptions import PreventUpdate
+from flask import request
+
+from core import profiling
+from core.dataset import data_version
+from core.memo import DiskStore
+
+JOB_DIR = os.environ.get('JOB_DIR', '.jobs')
+# Job processes allowed to compute at once on this host; the rest queue
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 2))
+# Running jobs one browser session may hold; the oldest beyond it are cancelled
+JOB_SESSION_LIMIT = int(os.environ.get('JOB_SESSION_LIMIT', 2))
+JOB_STORE_MAX_BYTES = int(os.environ.get('JOB_STORE_MAX_BYTES', 256 * 1024 * 1024))
+SESSION_COOKIE = 'dash_session'
+
+logger = logging.getLogger(__name__)
+
+# fork: the job runs the already-imported callback, nothing is pickled
+_fork = multiprocessing.get_context('fork')
+
+# callback name -> hook(output, *args), run in the worker that collects the result
+_result_hooks = {}
+
+
+def _name(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def on_result(func, hook):
+    """Call ``hook(output, *args)`` when a job of ``func`` hands back its result.
+
+    The job's process exits with whatever it cached, so this is how a
+    result reaches the serving worker, e.g. to prime its memo.
+    """
+    _result_hooks[_name(func)] = hook
+
+
+def _pid_alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as fh:
+            # state follows the parenthesised command name
+            return fh.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def _job_pid(job):
+    # the renderer echoes back whatever job id it got, including null
+    try:
+        return int(job)
+    except (TypeError, ValueError):
+        return None
+
+
+class JobManager(BaseBackgroundCallbackManager):
+    """Dash background-callback manager on forked processes and an on-disk store.
+
+    Each job is a process forked from the worker, so a superseded job can
+    be killed outright; it then waits for one of ``JOB_WORKERS`` host-wide
+    slots (``flock`` files) before computing. Results, progress and the
+    job's inputs are pickled into a ``DiskStore``; running jobs are
+    recorded as ``running/<pid>.json`` with their session and callback,
+    so any gunicorn worker can cancel them. The worker that collects a
+    result runs the callback's ``on_result`` hook on it.
+
+    Jobs run without Dash's callback context, which only Dash internals
+    can set, so a job callback gets its inputs but cannot use
+    ``callback_context`` or ``set_props``.
+
+    A new job cancels the running jobs of the same callback in the same
+    session, then the session's oldest jobs beyond ``JOB_SESSION_LIMIT``.
+    """
+
+    def __init__(self, directory=JOB_DIR, workers=JOB_WORKERS,
+                 session_limit=JOB_SESSION_LIMIT, cache_by=None):
+        self.directory = directory
+        self.workers = workers
+        self.session_limit = session_limit
+        self.store = DiskStore(os.path.join(directory, 'store'), JOB_STORE_MAX_BYTES)
+        self.running_dir = os.path.join(directory, 'running')
+        self.slot_dir = os.path.join(directory, 'slots')
+        os.makedirs(self.running_dir, exist_ok=True)
+        os.makedirs(self.slot_dir, exist_ok=True)
+        super().__init__(cache_by)
+
+    # Running-job records
+    def _record_path(self, pid):
+        return os.path.join(self.running_dir, f"{int(pid)}.json")
+
+    def running_jobs(self):
+        """Records of live jobs, oldest first; records of dead ones are removed."""
+        jobs = []
+        for name in os.listdir(self.running_dir):
+            path = os.path.join(self.running_dir, name)
+            try:
+                with open(path) as fh:
+                    job = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            if _pid_alive(job['pid']):
+                jobs.append(job)
+            else:
+                self._forget(job['pid'])
+        return sorted(jobs, key=lambda j: j['started'])
+
+    def _forget(self, pid):
+        try:
+            os.remove(self._record_path(pid))
+        except OSError:
+            pass
+
+    # Slots
+    def _acquire_slot(self):
+        """Block until one of the host's job slots is free; held until exit."""
+        handles = [
+            open(os.path.join(self.slot_dir, f"slot-{i}.lock"), 'w')
+            for i in range(self.workers)
+        ]
+        while True:
+            for fh in handles:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fh
+                except OSError:
+                    continue
+            time.sleep(0.05)
+
+    # BaseBackgroundCallbackManager
+    def terminate_job(self, job):
+        pid = _job_pid(job)
+        if not pid:
+            return
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self._forget(pid)
+        # reap our own children; other workers' are reaped by their parent
+        multiprocessing.active_children()
+
+    def terminate_unhealthy_job(self, job):
+        if _job_pid(job) and not self.job_running(job):
+            self.terminate_job(job)
+            return True
+        return False
+
+    def job_running(self, job):
+        multiprocessing.active_children()
+        pid = _job_pid(job)
+        return bool(pid) and _pid_alive(pid)
+
+    def make_job_fn(self, fn, progress, key=None):
+        job_fn = _make_job_fn(fn, self, progress)
+        job_fn.callback_key = key
+        return job_fn
+
+    def call_job_fn(self, key, job_fn, args, context):
+        if self.cache_by is not None and self.result_ready(key):
+            # already computed under the same inputs and data version
+            return None
+        session = request.cookies.get(SESSION_COOKIE) or request.remote_addr
+        callback = getattr(job_fn, 'callback_key', None)
+
+        mine = [j for j in self.running_jobs() if j['session'] == session]
+        for job in [j for j in mine if j['callback'] == callback]:
+            self.terminate_job(job['pid'])
+        mine = [j for j in mine if j['callback'] != callback]
+        for job in mine[:max(0, len(mine) - self.session_limit + 1)]:
+            self.terminate_job(job['pid'])
+
+        proc = _fork.Process(
+            target=job_fn, args=(key, self._make_progress_key(key), args, context),
+            kwargs={'profile': profiling.job_capture()}, daemon=True
+        )
+        with profiling.paused():
+            proc.start()
+        with open(self._record_path(proc.pid), 'w') as fh:
+            json.dump({'pid': proc.pid, 'session': session, 'callback': callback,
+                       'key': key, 'started': time.time()}, fh)
+        return proc.pid
+
+    def _get(self, key):
+        payload = self.store.get(key)
+        return self.UNDEFINED if payload is None else pickle.loads(payload)
+
+    def _set(self, key, value):
+        self.store.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def get_progress(self, key):
+        progress_key = self._make_progress_key(key)
+        value = self._get(progress_key)
+        if value is self.UNDEFINED:
+            return None
+        self.store.delete(progress_key)
+        return value
+
+    def result_ready(self, key):
+        return self.store.get(key) is not None
+
+    def get_result(self, key, job):
+        result = self._get(key)
+        if result is self.UNDEFINED:
+            return self.UNDEFINED
+        self._run_hook(key, result)
+        if self.cache_by is None:
+            self.store.delete(key)
+            self.store.delete(self._make_args_key(key))
+        self.store.delete(self._make_progress_key(key))
+        self.terminate_job(job)
+        return result
+
+    @staticmethod
+    def _make_args_key(key):
+        return f"{key}-args"
+
+    def _run_hook(self, key, result):
+        done = self._get(self._make_args_key(key))
+        if done is self.UNDEFINED:
+            return
+        name, args = done
+        hook = _result_hooks.get(name)
+        if hook is None:
+            return
+        try:
+            hook(result, *args)
+        except Exception:
+            logger.exception('result hook of %s failed', name)
+
+    def get_updated_props(self, key):
+        # jobs have no callback context to call set_props from
+        return {}
+
+
+def _make_job_fn(fn, manager, progress):
+    # Like dash's DiskcacheManager job, with a slot taken before running
+    def job_fn(result_key, progress_key, user_callback_args, context, profile=None):
+        manager._acquire_slot()
+
+        def _set_progress(progress_value):
+            if not isinstance(progress_value, (list, tuple)):
+                progress_value = [progress_value]
+            manager._set(progress_key, progress_value)
+
+        maybe_progress = [_set_progress] if progress else []
+        try:
+            with profiling.profiled_job(profile):
+                if isinstance(user_callback_args, dict):
+                    output = fn(*maybe_progress, **user_callback_args)
+                elif isinstance(user_callback_args, (list, tuple)):
+                    output = fn(*maybe_progress, *user_callback_args)
+                else:
+                    output = fn(*maybe_progress, user_callback_args)
+        except PreventUpdate:
+            output = {'_dash_no_update': '_dash_no_update'}
+        except Exception as err:
+            output = {'background_callback_error': {
+                'msg': str(err), 'tb': traceback.format_exc(),
+            }}
+        else:
+            if isinstance(user_callback_args, (list, tuple)):
+                # written before the result, so whoever collects it finds both
+                manager._set(manager._make_args_key(result_key), (_name(fn), list(user_callback_args)))
+        manager._set(result_key, output)
+        manager._forget(os.getpid())
+
+    return job_fn
+
+
+def _ensure_session(response):
+    if SESSION_COOKIE not in request.cookies:
+        response.set_cookie(SESSION_COOKIE, uuid.uuid4().hex, httponly=True, samesite='Lax')
+    return response
+
+
+def init_app(server):
+    """Give every browser a session cookie, used to group its jobs."""
+    server.after_request(_ensure_session)
+
+
+# Results are kept per data version, so a repeated query is answered from disk
+manager = JobManager(cache_by=[data_version])
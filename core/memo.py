@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from core.dataset import data_version
+
+MEMO_MAX_ITEMS = int(os.environ.get('MEMO_MAX_ITEMS', 512))
+MEMO_MAX_BYTES = int(os.environ.get('MEMO_MAX_BYTES', 256 * 1024 * 1024))
+# Set to a directory to share results between gunicorn workers on one host.
+MEMO_DISK_DIR = os.environ.get('MEMO_DISK_DIR') or None
+MEMO_DISK_MAX_BYTES = int(os.environ.get('MEMO_DISK_MAX_BYTES', 1024 * 1024 * 1024))
+# Set to a file to append one JSON line per memoized call; core.warmup
+# replays the most frequent inputs from it after the next deploy.
+MEMO_ACCESS_LOG = os.environ.get('MEMO_ACCESS_LOG') or None
+
+
+def normalize(value):
+    """Canonical, hashable form of callback inputs.
+
+    Multi-select lists are sorted and any list containing ``'All'`` collapses
+    to ``'All'``, so equivalent selections share one cache entry.
+    """
+    if isinstance(value, (list, tuple, set)):
+        if 'All' in value:
+            return 'All'
+        items = [normalize(v) for v in value]
+        try:
+            return tuple(sorted(items))
+        except TypeError:
+            return tuple(sorted(items, key=repr))
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in value.items()))
+    return value
+
+
+class DiskStore:
+    """Pickle-per-key directory shared by every process on the host."""
+
+    def __init__(self, directory, max_bytes=MEMO_DISK_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pkl")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as fh:
+                stored_key, payload = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return payload if stored_key == key else None
+
+    def set(self, key, payload):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            pickle.dump((key, payload), fh, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+        self._writes += 1
+        if self._writes % 32 == 0:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pkl'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by entry count and pickled byte size."""
+
+    def __init__(self, max_items=MEMO_MAX_ITEMS, max_bytes=MEMO_MAX_BYTES, disk_dir=MEMO_DISK_DIR):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.disk = DiskStore(disk_dir) if disk_dir else None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    def get(self, key, default=None, record=True):
+        """Cached value for ``key``; ``record=False`` leaves hit/miss counts alone."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += record
+                return self._entries[key][0]
+        if self.disk is not None:
+            payload = self.disk.get(key)
+            if payload is not None:
+                value = pickle.loads(payload)
+                self._store(key, value, len(payload))
+                with self._lock:
+                    self.disk_hits += record
+                return value
+        with self._lock:
+            self.misses += record
+        return default
+
+    def set(self, key, value):
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._store(key, value, len(payload))
+        if self.disk is not None:
+            self.disk.set(key, payload)
+
+    def _store(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_items or self._bytes > self.max_bytes
+            ):
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def discard_version(self, version):
+        """Drop the in-memory results memoized under data ``version``."""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == version]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'items': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+result_cache = LRUCache()
+
+_MISSING = object()
+
+# name -> memoized wrapper, for core.warmup
+memoized = {}
+
+_log_lock = threading.Lock()
+
+
+def log_access(name, args, kwargs):
+    """Append one call to ``MEMO_ACCESS_LOG``, inputs as the callback got them."""
+    line = json.dumps({'name': name, 'args': list(args), 'kwargs': kwargs}, default=str)
+    with _log_lock, open(MEMO_ACCESS_LOG, 'a') as fh:
+        fh.write(line + '\n')
+
+
+def memoize(func):
+    """Cache ``func``'s result in ``result_cache`` under its normalized inputs."""
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    def key(args, kwargs):
+        return (name, data_version(), tuple(normalize(a) for a in args), normalize(kwargs))
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if MEMO_ACCESS_LOG:
+            log_access(name, args, kwargs)
+        k = key(args, kwargs)
+        value = result_cache.get(k, _MISSING)
+        if value is _MISSING:
+            value = func(*args, **kwargs)
+            result_cache.set(k, value)
+        return value
+
+    def peek(*args, **kwargs):
+        """The cached result, or None without computing it."""
+        return result_cache.get(key(args, kwargs), None, record=False)
+
+    def prime(value, *args, **kwargs):
+        """Store ``value`` as the result for these inputs, e.g. one computed elsewhere."""
+        result_cache.set(key(args, kwargs), value)
+
+    wrapper.uncached = func
+    wrapper.peek = peek
+    wrapper.prime = prime
+    memoized[name] = wrapper
+    return wrapper
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+DISPATCH_PATH = '_dash-update-component'
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+BYTES_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def cumulative(self):
+        total, out = 0, []
+        for bound, n in zip(self.buckets + ['+Inf'], self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+
+class CallbackMetrics:
+    """Per-callback counters and histograms for this worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.errors = {}
+        self.latency = {}
+        self.response_bytes = {}
+        self.phases = {}
+
+    def observe(self, callback_id, seconds, size, error, phases):
+        with self._lock:
+            self.calls[callback_id] = self.calls.get(callback_id, 0) + 1
+            if error:
+                self.errors[callback_id] = self.errors.get(callback_id, 0) + 1
+            self.latency.setdefault(callback_id, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.response_bytes.setdefault(callback_id, Histogram(BYTES_BUCKETS)).observe(size)
+            for name, dur in phases:
+                key = (callback_id, name)
+                self.phases[key] = self.phases.get(key, 0.0) + dur
+
+    def render(self):
+        """Prometheus text exposition format."""
+        from core.memo import result_cache
+
+        pid = str(os.getpid())
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(**kw):
+            kw['worker'] = pid
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in kw.items()) + '}'
+
+        with self._lock:
+            metric('dash_callback_calls_total', 'counter', 'Callback requests handled.')
+            for cb, n in sorted(self.calls.items()):
+                lines.append(f"dash_callback_calls_total{labels(callback=cb)} {n}")
+
+            metric('dash_callback_errors_total', 'counter', 'Callback requests that failed.')
+            for cb in sorted(self.calls):
+                lines.append(f"dash_callback_errors_total{labels(callback=cb)} {self.errors.get(cb, 0)}")
+
+            for name, hists, help_text in (
+                ('dash_callback_latency_seconds', self.latency, 'Callback request latency.'),
+                ('dash_callback_response_bytes', self.response_bytes, 'Callback response size.'),
+            ):
+                metric(name, 'histogram', help_text)
+                for cb, hist in sorted(hists.items()):
+                    for bound, total in hist.cumulative():
+                        lines.append(f"{name}_bucket{labels(callback=cb, le=bound)} {total}")
+                    lines.append(f"{name}_sum{labels(callback=cb)} {hist.sum}")
+                    lines.append(f"{name}_count{labels(callback=cb)} {sum(hist.counts)}")
+
+            metric('dash_callback_phase_seconds_total', 'counter',
+                   'Time spent per sub-phase (filter, figure, ...) inside callbacks.')
+            for (cb, phase_name), total in sorted(self.phases.items()):
+                lines.append(
+                    f"dash_callback_phase_seconds_total{labels(callback=cb, phase=phase_name)} {total}"
+                )
+
+        stats = result_cache.stats()
+        metric('dash_result_cache_events_total', 'counter', 'Result cache lookups by outcome.')
+        for outcome in ('hits', 'disk_hits', 'misses', 'evictions'):
+            lines.append(f"dash_result_cache_events_total{labels(outcome=outcome)} {stats[outcome]}")
+        metric('dash_result_cache_bytes', 'gauge', 'Bytes held by the in-memory result cache.')
+        lines.append(f"dash_result_cache_bytes{labels()} {stats['bytes']}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+callback_metrics = CallbackMetrics()
+
+
+@contextmanager
+def span(name):
+    """Time a sub-phase of the current callback for ``Server-Timing``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            g.setdefault('timing_phases', []).append((name, time.perf_counter() - start))
+
+
+def _is_dispatch():
+    return request.path.endswith(DISPATCH_PATH)
+
+
+def _before():
+    if _is_dispatch():
+        g.timing_start = time.perf_counter()
+
+
+def _callback_label(output):
+    # Multi-output ids look like "..a.figure...b.data.."; duplicate outputs
+    # carry an "@hash" suffix. Both reduce to the readable output names.
+    if output.startswith('..') and output.endswith('..'):
+        output = output[2:-2].replace('...', '+')
+    return '+'.join(part.split('@')[0] for part in output.split('+'))
+
+
+def _after(response):
+    start = g.get('timing_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    body = request.get_json(silent=True) or {}
+    callback_id = _callback_label(body.get('output', 'unknown'))
+    phases = g.get('timing_phases', [])
+    size = response.calculate_content_length() or 0
+    callback_metrics.observe(callback_id, elapsed, size, response.status_code >= 500, phases)
+
+    entries = [f"{name};dur={dur * 1000:.1f}" for name, dur in phases]
+    entries.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers['Server-Timing'] = ', '.join(entries)
+    return response
+
+
+def init_app(server, route='/metrics'):
+    """Instrument every Dash callback request on ``server`` and expose ``route``."""
+    server.before_request(_before)
+    server.after_request(_after)
+    server.add_url_rule(
+        route, 'metrics',
+        lambda: Response(callback_metrics.render(),
+                         mimetype='text/plain; version=0.0.4')
+    )
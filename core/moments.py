@@ -0,0 +1,160 @@
+import os
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from core.dataset import DATA_PATH, load_columns, per_dataset
+from core.encoding import encoded_matrix, numeric_columns
+from core.timing import timed
+from core.weighted import get_weighted_rows
+
+# Segment columns of the moment cube; any category columns will do
+CUBE_DIMS = os.environ.get('CUBE_DIMS', 'Country,Gender,Occupation').split(',')
+# Rows encoded per pass while building, to bound the float matrix
+CUBE_CHUNK_ROWS = 1 << 18
+
+
+class Moments:
+    """Pairwise-complete sums for a Pearson correlation matrix.
+
+    For every pair (i, j), over rows where both columns are present:
+    ``n[i, j]`` rows, ``sx[i, j]`` the sum of column i, ``sxx[i, j]`` the
+    sum of its squares and ``sxy[i, j]`` the sum of products. Sums over
+    disjoint blocks of rows simply add, so appended rows never revisit
+    the old ones. Weighted rows count ``weight`` times each.
+    """
+
+    def __init__(self, names, n, sx, sxx, sxy):
+        self.names = list(names)
+        self.n, self.sx, self.sxx, self.sxy = n, sx, sxx, sxy
+
+    @classmethod
+    def from_values(cls, names, values, weights=None):
+        present = ~np.isnan(values)
+        m = present.astype(np.float64)
+        x = np.where(present, values, 0.0)
+        if weights is None:
+            return cls(names, m.T @ m, x.T @ m, (x * x).T @ m, x.T @ x)
+        w = np.asarray(weights, dtype=np.float64)[:, None]
+        wm = m * w
+        return cls(names, m.T @ wm, x.T @ wm, (x * x).T @ wm, x.T @ (x * w))
+
+    def __add__(self, other):
+        return Moments(
+            self.names, self.n + other.n, self.sx + other.sx,
+            self.sxx + other.sxx, self.sxy + other.sxy
+        )
+
+    def stack(self):
+        return np.stack([self.n, self.sx, self.sxx, self.sxy])
+
+    def corr(self):
+        """Same matrix as ``DataFrame.corr()`` on the underlying rows."""
+        n, sx, sxx = self.n, self.sx, self.sxx
+        cov = n * self.sxy - sx * sx.T
+        var_x = n * sxx - sx * sx
+        var_y = var_x.T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = cov / np.sqrt(var_x * var_y)
+        r = np.clip(r, -1, 1)
+        return pd.DataFrame(r, index=self.names, columns=self.names)
+
+
+class MomentCube:
+    """``Moments`` per segment of ``dims``, e.g. Country x Gender x Occupation.
+
+    ``stats[segment]`` stacks the four sum matrices of that segment's rows,
+    with segments laid out like ``np.ravel_multi_index`` over the dims'
+    codes (0 is missing). The moments of any filter on the dims are the
+    sum over the selected segments, so no row is read after the build.
+    """
+
+    def __init__(self, names, dims, labels, stats, n_rows):
+        self.names = list(names)
+        self.dims = list(dims)
+        self.labels = labels
+        self.shape = tuple(len(l) + 1 for l in labels)
+        self.stats = stats
+        self.n_rows = n_rows
+
+    @classmethod
+    def empty(cls, columns, names, dims=CUBE_DIMS):
+        labels = [list(columns[d]['categories']) for d in dims]
+        k = len(names)
+        n_seg = int(np.prod([len(l) + 1 for l in labels]))
+        return cls(names, dims, labels, np.zeros((n_seg, 4, k, k)), 0)
+
+    @classmethod
+    def build(cls, columns, names, dims=CUBE_DIMS, weights=None):
+        cube = cls.empty(columns, names, dims)
+        n_rows = len(columns[dims[0]]['values'])
+        for start in range(0, n_rows, CUBE_CHUNK_ROWS):
+            cube.add_rows(columns, start, min(start + CUBE_CHUNK_ROWS, n_rows), weights)
+        return cube
+
+    def add_rows(self, columns, start, stop, weights=None):
+        """Add rows ``start:stop`` of ``columns`` into their segments.
+
+        The dims must be category columns, whose stored codes are used as is.
+        With ``weights`` (one per row of ``columns``) each row counts that
+        many times, and ``n_rows`` grows by their sum.
+        """
+        seg = np.ravel_multi_index(
+            [columns[d]['values'][start:stop].astype(np.intp) for d in self.dims],
+            self.shape
+        )
+        values = encoded_matrix(columns, self.names, start, stop)
+        order = np.argsort(seg, kind='stable')
+        seg, values = seg[order], values[order]
+        if weights is not None:
+            weights = np.asarray(weights[start:stop])[order]
+        bounds = np.flatnonzero(np.diff(seg)) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(seg)]):
+            w = None if weights is None else weights[lo:hi]
+            self.stats[seg[lo]] += Moments.from_values(self.names, values[lo:hi], w).stack()
+        self.n_rows += stop - start if weights is None else int(weights.sum())
+
+    def extended(self, columns):
+        """A cube over ``columns``, whose first rows are this cube's rows."""
+        labels = [list(columns[d]['categories']) for d in self.dims]
+        shape = tuple(len(l) + 1 for l in labels)
+        k = len(self.names)
+        # new labels only ever go at the end, so old segments keep their place
+        stats = np.zeros(shape + (4, k, k))
+        stats[tuple(slice(0, s) for s in self.shape)] = self.stats.reshape(self.shape + (4, k, k))
+        cube = MomentCube(self.names, self.dims, labels,
+                          stats.reshape(-1, 4, k, k), self.n_rows)
+        n_rows = len(columns[self.dims[0]]['values'])
+        for start in range(self.n_rows, n_rows, CUBE_CHUNK_ROWS):
+            cube.add_rows(columns, start, min(start + CUBE_CHUNK_ROWS, n_rows))
+        return cube
+
+    def moments(self, selections=None):
+        """``Moments`` of the rows matching ``{dim: [values]}``.
+
+        A dim left out, None or containing 'All' is kept whole; an empty
+        selection matches no rows, like ``CodeIndex.mask``.
+        """
+        selections = selections or {}
+        keep = []
+        for dim, labels in zip(self.dims, self.labels):
+            values = selections.get(dim)
+            if values is None or 'All' in values:
+                keep.append(np.ones(len(labels) + 1, dtype=bool))
+            else:
+                wanted = set(values)
+                keep.append(np.array([False] + [l in wanted for l in labels]))
+        selected = reduce(np.multiply.outer, keep).ravel()
+        return Moments(self.names, *self.stats[selected].sum(axis=0))
+
+
+@per_dataset
+@timed('build moment cube')
+def get_moment_cube(path=DATA_PATH):
+    columns = load_columns(path)
+    names = numeric_columns(columns)
+    weighted = get_weighted_rows(path)
+    if weighted is not None and weighted.covers(names + CUBE_DIMS):
+        return MomentCube.build(weighted.columns, names, weights=weighted.weights)
+    return MomentCube.build(columns, names)
@@ -0,0 +1,215 @@
+import cProfile
+import hashlib
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request
+
+from core.memo import normalize
+from core.metrics import _callback_label, _is_dispatch
+
+# Callback ids (as in /metrics, e.g. "dist-graph.figure+dist-pending.data")
+# profiled on every call, comma separated; "*" profiles all of them
+PROFILE_CALLBACKS = {c.strip() for c in os.environ.get('PROFILE_CALLBACKS', '').split(',') if c.strip()}
+# Requests carrying this value in PROFILE_HEADER are profiled too
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN') or None
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '.profiles')
+# Captures kept on disk; the oldest are removed first
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.001))
+
+# One capture at a time per worker; concurrent requests run unprofiled
+_active = threading.Lock()
+
+
+def _wanted(callback_id):
+    if '*' in PROFILE_CALLBACKS or callback_id in PROFILE_CALLBACKS:
+        return True
+    token = request.headers.get(PROFILE_HEADER)
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
+
+
+class StackSampler(threading.Thread):
+    """Count the collapsed Python stacks of one thread every ``interval`` seconds."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def capture_id(callback_id, inputs):
+    """``<time>-<callback>-<inputs hash>``, safe as a file name."""
+    digest = hashlib.sha1(repr((callback_id, inputs)).encode('utf-8')).hexdigest()[:10]
+    slug = re.sub(r'[^A-Za-z0-9_.+-]', '_', callback_id)[:80]
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{digest}"
+
+
+def _prune(directory, keep):
+    metas = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.json')),
+        key=os.path.getmtime
+    )
+    for meta in metas[:max(0, len(metas) - keep)]:
+        base = meta[:-len('.json')]
+        for path in (meta, f"{base}.pstats", f"{base}.collapsed"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _before():
+    if not _is_dispatch() or not (PROFILE_CALLBACKS or PROFILE_TOKEN):
+        return
+    body = request.get_json(silent=True) or {}
+    callback_id = _callback_label(body.get('output', 'unknown'))
+    if not _wanted(callback_id) or not _active.acquire(blocking=False):
+        return
+    values = [i.get('value') for i in body.get('inputs', [])]
+    g.profile = _start({
+        'callback': callback_id,
+        'inputs': [normalize(v) for v in values],
+        'input_ids': [f"{i.get('id')}.{i.get('property')}" for i in body.get('inputs', [])],
+    })
+
+
+def _start(capture):
+    capture.update(
+        start=time.perf_counter(),
+        sampler=StackSampler(threading.get_ident()),
+        profiler=cProfile.Profile(),
+    )
+    capture['sampler'].start()
+    capture['profiler'].enable()
+    return capture
+
+
+def _write(capture, status, job=False):
+    """Stop ``capture`` and write its files; returns the capture id."""
+    capture['profiler'].disable()
+    capture['sampler'].stop()
+    elapsed = time.perf_counter() - capture['start']
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = capture_id(capture['callback'] + ('.job' if job else ''), capture['inputs'])
+    base = os.path.join(PROFILE_DIR, name)
+    capture['profiler'].dump_stats(f"{base}.pstats")
+    # flamegraph.pl / speedscope "collapsed" format: "a;b;c count"
+    with open(f"{base}.collapsed", 'w') as fh:
+        for stack, n in capture['sampler'].stacks.most_common():
+            fh.write(f"{stack} {n}\n")
+    with open(f"{base}.json", 'w') as fh:
+        json.dump({
+            'callback': capture['callback'],
+            'inputs': dict(zip(capture['input_ids'], capture['inputs'])),
+            'seconds': elapsed, 'status': status, 'job': job,
+            'samples': sum(capture['sampler'].stacks.values()),
+            'pid': os.getpid(), 'created': time.time(),
+        }, fh, indent=1, default=str)
+    _prune(PROFILE_DIR, PROFILE_KEEP)
+    return name
+
+
+def _finish(status):
+    capture = g.pop('profile', None)
+    if capture is None:
+        return None
+    try:
+        return _write(capture, status)
+    finally:
+        _active.release()
+
+
+def job_capture():
+    """What to profile in a background job this request starts, or None."""
+    capture = g.get('profile')
+    if capture is None:
+        return None
+    return {k: capture[k] for k in ('callback', 'inputs', 'input_ids')}
+
+
+@contextmanager
+def paused():
+    """Suspend this request's profiler, so a job forked meanwhile does not inherit it."""
+    capture = g.get('profile')
+    if capture is None:
+        yield
+        return
+    capture['profiler'].disable()
+    try:
+        yield
+    finally:
+        capture['profiler'].enable()
+
+
+@contextmanager
+def profiled_job(capture):
+    """Profile the job's work inside the block when ``capture`` is set.
+
+    Runs in the job's process and writes a capture of its own, marked
+    ``"job": true``, next to the one of the request that started it.
+    """
+    if capture is None:
+        yield
+        return
+    capture = _start(dict(capture))
+    status = 'error'
+    try:
+        yield
+        status = 'ok'
+    finally:
+        _write(capture, status, job=True)
+
+
+def _after(response):
+    name = _finish(response.status_code)
+    if name is not None:
+        response.headers['X-Profile'] = name
+    return response
+
+
+def _teardown(exc):
+    # a failed request skips after_request; still release and save
+    _finish(500)
+
+
+def init_app(server):
+    """Profile the callback requests selected by ``PROFILE_CALLBACKS`` or ``PROFILE_TOKEN``.
+
+    Each capture writes ``<id>.pstats`` (cProfile), ``<id>.collapsed``
+    (sampled stacks for flame graphs) and ``<id>.json`` (callback, inputs,
+    timing) to ``PROFILE_DIR``. A result served from the memo or a
+    snapshot shows only the lookup. When a captured request starts a
+    background job (the exact figure behind a sampled preview), the job's
+    process profiles its own work and writes a second capture, whose id
+    ends in ``.job``; select the job callback, e.g. ``dist-graph.figure``.
+    """
+    server.before_request(_before)
+    server.after_request(_after)
+    server.teardown_request(_teardown)
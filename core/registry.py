@@ -0,0 +1,157 @@
+import glob
+import logging
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from flask import g, request
+
+from core import streaming
+from core.dataset import (
+    DATA_PATH, DATASET_CHUNK_ROWS, _active, active_path, data_version, forget_dataset,
+    load_columns,
+)
+from core.index import get_code_index
+from core.memo import result_cache
+from core.weighted import get_weighted_rows
+
+# "name=path,name=path"; the first one is the default
+DATASETS = os.environ.get('DATASETS', '')
+# Every *.csv in this directory is served too, named after the file
+DATASET_DIR = os.environ.get('DATASET_DIR') or None
+# Bytes of column and index arrays kept resident across datasets
+DATASET_MEMORY_BUDGET = int(os.environ.get('DATASET_MEMORY_BUDGET', 2 * 1024 ** 3))
+DATASET_PARAM = 'dataset'
+DATASET_COOKIE = 'dash_dataset'
+
+logger = logging.getLogger(__name__)
+
+
+def _configured():
+    datasets = OrderedDict()
+    for item in filter(None, (part.strip() for part in DATASETS.split(','))):
+        name, _, path = item.partition('=')
+        datasets[name.strip()] = os.path.abspath(path.strip())
+    if DATASET_DIR:
+        for path in sorted(glob.glob(os.path.join(DATASET_DIR, '*.csv'))):
+            datasets.setdefault(os.path.splitext(os.path.basename(path))[0], os.path.abspath(path))
+    if not datasets:
+        datasets[os.path.splitext(os.path.basename(DATA_PATH))[0]] = os.path.abspath(DATA_PATH)
+    return datasets
+
+
+class DatasetRegistry:
+    """Named datasets, loaded on first use and evicted least recently used first.
+
+    After each request the arrays of the resident datasets are summed;
+    while they exceed ``budget`` bytes the least recently used dataset,
+    never the one just served, is dropped from every per-dataset cache and
+    its memoized results from ``result_cache``.
+    """
+
+    def __init__(self, datasets, budget=DATASET_MEMORY_BUDGET):
+        self.datasets = datasets
+        self.default = next(iter(datasets.values()))
+        self.budget = budget
+        self._paths = {path: name for name, path in datasets.items()}
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        """Source file for ``name``; None if it is not registered."""
+        return self.datasets.get(name)
+
+    def name(self, path):
+        return self._paths.get(os.path.abspath(path))
+
+    @staticmethod
+    def resident_bytes(path):
+        """Estimated bytes held for ``path``: loaded columns, filter bitsets and distinct rows."""
+        columns = load_columns.peek(path)
+        if columns is None:
+            return 0
+        total = sum(col['values'].nbytes for col in columns.values())
+        index = get_code_index.peek(path)
+        if index is not None:
+            total += sum(b.nbytes for bits in index.bitsets.values() for b in bits.values())
+        weighted = get_weighted_rows.peek(path)
+        if weighted is not None:
+            total += weighted.nbytes
+        return total
+
+    def touch(self, path):
+        """Mark ``path`` as just used and evict others until within budget."""
+        with self._lock:
+            self._recent[path] = True
+            self._recent.move_to_end(path)
+            sizes = {p: self.resident_bytes(p) for p in self._recent}
+            total = sum(sizes.values())
+            for old in list(self._recent):
+                if total <= self.budget or old == path:
+                    break
+                self.evict(old)
+                total -= sizes[old]
+
+    def evict(self, path):
+        version = data_version.peek(path)
+        forget_dataset(path)
+        if version is not None:
+            result_cache.discard_version(version)
+        self._recent.pop(path, None)
+        logger.info('evicted dataset %s', self.name(path) or path)
+
+    def resident(self):
+        """Names of the datasets used recently, least recent first."""
+        return [self.name(p) or p for p in self._recent]
+
+
+registry = DatasetRegistry(_configured())
+
+
+def _requested():
+    # explicit choice: ?dataset= on a page load, or in the pages router's search
+    name = request.args.get(DATASET_PARAM)
+    if name is None and request.is_json:
+        for item in (request.get_json(silent=True) or {}).get('inputs', []):
+            if isinstance(item, dict) and item.get('property') == 'search' and item.get('value'):
+                name = parse_qs(item['value'].lstrip('?')).get(DATASET_PARAM, [None])[0]
+    return name
+
+
+def _before():
+    requested = _requested()
+    path = registry.path(requested) if requested else None
+    if path is None:
+        path = registry.path(request.cookies.get(DATASET_COOKIE)) or registry.default
+    g.dataset_requested = requested if registry.path(requested or '') else None
+    g.dataset_token = _active.set(path)
+    if DATASET_CHUNK_ROWS and get_code_index.peek(path) is None:
+        # out-of-core mode: one chunked pass, on first use and after an eviction
+        streaming.prime(path)
+
+
+def _after(response):
+    if g.get('dataset_requested'):
+        response.set_cookie(DATASET_COOKIE, g.dataset_requested, httponly=True, samesite='Lax')
+    if 'dataset_token' in g:
+        registry.touch(active_path())
+    return response
+
+
+def _teardown(exc):
+    token = g.pop('dataset_token', None)
+    if token is not None:
+        _active.reset(token)
+
+
+def init_app(server):
+    """Resolve the active dataset for every request.
+
+    ``?dataset=<name>`` on a page URL selects it and is remembered in a
+    cookie for the callbacks that follow; unknown names fall back to the
+    default dataset.
+    """
+    server.before_request(_before)
+    server.after_request(_after)
+    server.teardown_request(_teardown)
@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.binning import MAX_CATEGORIES, MAX_POINTS, crosstab_folding, fold_labels, time_bins
+from core.dataset import DATA_PATH, per_dataset
+from core.index import CodeIndex, get_code_index
+from core.timing import timed
+
+SAMPLE_FRACTION = float(os.environ.get('SAMPLE_FRACTION', 0.02))
+# Below this many rows exact answers are quick enough to skip the preview
+SAMPLE_MIN_ROWS = int(os.environ.get('SAMPLE_MIN_ROWS', 1_000_000))
+SAMPLE_STRATA = ['Country', 'Gender']
+SAMPLE_SEED = 0
+Z95 = 1.96
+
+
+class StratifiedSample:
+    """Simple random sample within each stratum, weighted up to the population.
+
+    Each stratum keeps ``ceil(fraction * size)`` rows (at least two where
+    it has them), so small countries still show up in a preview. Sampled
+    rows get their own ``CodeIndex``, so filters work exactly as on the
+    full data.
+    """
+
+    def __init__(self, index, fraction=SAMPLE_FRACTION, strata=SAMPLE_STRATA, seed=SAMPLE_SEED):
+        self.fraction = fraction
+        rng = np.random.default_rng(seed)
+        codes = [index.codes(c) for c in strata]
+        stratum = np.ravel_multi_index(
+            [c.astype(np.intp) for c, _ in codes], [len(l) + 1 for _, l in codes]
+        )
+        order = np.argsort(stratum, kind='stable')
+        _, starts, sizes = np.unique(stratum[order], return_index=True, return_counts=True)
+        kept = np.minimum(sizes, np.maximum(np.ceil(fraction * sizes).astype(np.int64), 2))
+        rows = np.concatenate([
+            order[a + rng.choice(n, k, replace=False)]
+            for a, n, k in zip(starts, sizes, kept)
+        ])
+        strata_of_rows = np.repeat(np.arange(len(sizes)), kept)
+        by_row = np.argsort(rows)
+        self.rows = rows[by_row]
+        self.stratum = strata_of_rows[by_row]
+        self.population = sizes.astype(np.float64)
+        self.kept = kept.astype(np.float64)
+        self.index = CodeIndex(
+            {name: {**col, 'values': np.asarray(col['values'])[self.rows]}
+             for name, col in index.columns.items()},
+            list(index.bitsets)
+        )
+
+    def estimate(self, groups, n_groups, mask=None):
+        """Estimated population count and 95% CI half-width per group.
+
+        ``groups`` holds a group id in ``[0, n_groups)`` for every sampled
+        row, or -1 for rows that do not count; ``mask`` is a packed mask
+        from ``self.index.mask``. Uses the stratified estimator
+        ``sum(size / kept * hits)`` and its finite-population variance.
+        """
+        keep = groups >= 0
+        if mask is not None:
+            keep &= self.index.unpack(mask)
+        n_strata = len(self.population)
+        hits = np.bincount(
+            self.stratum[keep] * n_groups + groups[keep], minlength=n_strata * n_groups
+        ).reshape(n_strata, n_groups)
+        p = hits / self.kept[:, None]
+        total = (self.population / self.kept) @ hits
+        fpc = 1 - self.kept / self.population
+        var = (self.population ** 2 * fpc / np.maximum(self.kept - 1, 1)) @ (p * (1 - p))
+        return np.rint(total), np.rint(Z95 * np.sqrt(var))
+
+
+def _groups(codes, group_of_label):
+    # code 0 (missing) never counts
+    return np.concatenate([[-1], group_of_label]).take(codes)
+
+
+def _group_of_label(labels, mapping, order):
+    unique = mapping[~mapping.index.duplicated()]
+    return pd.Index(order).get_indexer(unique.reindex(labels).values)
+
+
+def approx_value_counts(sample, column, mask=None, max_values=MAX_CATEGORIES):
+    """Estimated ``value_counts`` folded like ``fold_counts``, as ``(counts, ci)``."""
+    codes, labels = sample.index.codes(column)
+    labels = pd.Index(labels)
+    total, ci = sample.estimate(codes.astype(np.int64) - 1, len(labels), mask)
+
+    max_values = min(max_values, MAX_POINTS)
+    is_time = isinstance(labels, pd.DatetimeIndex)
+    if is_time or len(labels) > max_values:
+        present = total > 0
+        mapping, order = fold_labels(labels[present], total[present], max_values,
+                                     max_time_bins=time_bins())
+        groups = _groups(codes, _group_of_label(labels, mapping, order))
+        labels = pd.Index(order)
+        total, ci = sample.estimate(groups, len(labels), mask)
+
+    keep = np.flatnonzero(total > 0)
+    if not is_time:
+        keep = keep[np.argsort(-total[keep], kind='stable')]
+    index = labels.take(keep).rename(column)
+    return (pd.Series(total[keep], index=index, name='count'),
+            pd.Series(ci[keep], index=index, name='ci'))
+
+
+def approx_crosstab(sample, x, hue, mask=None):
+    """Estimated long ``[x, hue, 'count', 'ci']`` frame, folded like ``fold_crosstab``."""
+    cx, lx = sample.index.codes(x)
+    ch, lh = sample.index.codes(hue)
+    lx, lh = pd.Index(lx), pd.Index(lh)
+    n_hue = len(lh)
+    groups = np.where((cx > 0) & (ch > 0), (cx - 1).astype(np.int64) * n_hue + ch - 1, -1)
+    total, ci = sample.estimate(groups, len(lx) * n_hue, mask)
+    cells = np.flatnonzero(total > 0)
+    grouped = pd.DataFrame({
+        x: lx.take(cells // n_hue), hue: lh.take(cells % n_hue),
+        'count': total[cells], 'ci': ci[cells],
+    })
+
+    folding = crosstab_folding(x, hue, grouped)
+    if folding is None:
+        return grouped
+    x_map, x_order, hue_map, hue_order = folding
+    gx = _groups(cx, _group_of_label(lx, x_map, x_order))
+    gh = _groups(ch, _group_of_label(lh, hue_map, hue_order))
+    n_hue = len(hue_order)
+    groups = np.where((gx >= 0) & (gh >= 0), gx.astype(np.int64) * n_hue + gh, -1)
+    total, ci = sample.estimate(groups, len(x_order) * n_hue, mask)
+    cells = np.flatnonzero(total > 0)
+    return pd.DataFrame({
+        x: pd.Index(x_order, dtype=object).take(cells // n_hue).to_numpy(),
+        hue: pd.Index(hue_order, dtype=object).take(cells % n_hue).to_numpy(),
+        'count': total[cells], 'ci': ci[cells],
+    })
+
+
+def mark_approximate(fig, sample):
+    """Flag ``fig`` as a sampled estimate, in ``layout.meta`` and the title."""
+    fig.update_layout(
+        meta={'approximate': True, 'sample_fraction': sample.fraction,
+              'sample_rows': int(len(sample.rows))},
+        title_text=f"{fig.layout.title.text} (approximate, ±95% CI)"
+    )
+    return fig
+
+
+@per_dataset
+@timed('build stratified sample')
+def get_sample(path=DATA_PATH):
+    """Preview sample of the dataset, or None while exact answers are fast enough."""
+    index = get_code_index(path)
+    if SAMPLE_FRACTION <= 0 or index.n_rows < SAMPLE_MIN_ROWS:
+        return None
+    return StratifiedSample(index)
@@ -0,0 +1,182 @@
+"""Pre-rendered figures and layouts for the views most visitors see.
+
+Functions decorated with ``@snapshot(views)`` are looked up in
+``SNAPSHOT_DIR/<data version>-<code version>/`` first and only computed
+live when no file matches their inputs. The code version hashes the app's
+sources and the dash and plotly releases, so a deploy that changes a
+layout or figure on the same data never serves the old renders. The files
+are plain JSON, so a cold worker serves them without loading the
+dataset. Build them with::
+
+    python -m core.snapshots [--out DIR] [--keep N] [--dataset NAME ...]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from functools import lru_cache, wraps
+from importlib.metadata import version as package_version
+
+from plotly.io.json import to_json_plotly
+
+from core.dataset import active_path, data_version, use_dataset
+from core.memo import normalize
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '.snapshots')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Sources that decide what a view renders
+CODE_SOURCES = ['app.py', 'core/*.py', 'pages/*.py']
+
+# name -> (function, views); filled as pages are imported
+registry = {}
+
+
+def _digest(name, args, kwargs):
+    key = (name, tuple(normalize(a) for a in args), normalize(kwargs))
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """Short hash of ``CODE_SOURCES`` and the dash and plotly versions."""
+    h = hashlib.sha1()
+    for package in ('dash', 'plotly'):
+        h.update(f"{package}=={package_version(package)}\n".encode('utf-8'))
+    for pattern in CODE_SOURCES:
+        for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+            h.update(os.path.relpath(path, ROOT).encode('utf-8'))
+            with open(path, 'rb') as fh:
+                h.update(fh.read())
+    return h.hexdigest()[:12]
+
+
+def _version_dir():
+    return f"{data_version()}-{code_version()}"
+
+
+@lru_cache(maxsize=1024)
+def _read(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def lookup(name, args=(), kwargs=None, directory=SNAPSHOT_DIR):
+    """The snapshot of ``name(*args, **kwargs)`` for the current data and code, or None."""
+    path = os.path.join(directory, _version_dir(), f"{_digest(name, args, kwargs or {})}.json")
+    if not os.path.exists(path):
+        return None
+    return _read(path)
+
+
+def snapshot(views=None):
+    """Serve the decorated function from snapshots when one matches.
+
+    ``views()`` returns the argument tuples the builder pre-renders; it
+    is only called at build time. The wrapper's ``peek`` also checks
+    snapshots before the memo.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            found = lookup(name, args, kwargs)
+            return func(*args, **kwargs) if found is None else found
+
+        def peek(*args, **kwargs):
+            found = lookup(name, args, kwargs)
+            if found is None and hasattr(func, 'peek'):
+                return func.peek(*args, **kwargs)
+            return found
+
+        wrapper.live = func
+        wrapper.peek = peek
+        registry[name] = (func, views or (lambda: [()]))
+        return wrapper
+    return decorator
+
+
+def build(out=SNAPSHOT_DIR, keep=1):
+    """Render every registered view of the active dataset under ``out``.
+
+    The files go to ``<data version>-<code version>/``; older builds of
+    the same dataset beyond the newest ``keep`` are removed.
+    """
+    version = data_version()
+    target = os.path.join(out, _version_dir())
+    tmp = f"{target}.build-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    manifest = {'version': version, 'code': code_version(), 'dataset': active_path(),
+                'created': time.time(), 'views': []}
+    for name, (func, views) in registry.items():
+        for args in views():
+            start = time.perf_counter()
+            payload = to_json_plotly(func(*args))
+            digest = _digest(name, args, {})
+            with open(os.path.join(tmp, f"{digest}.json"), 'w') as fh:
+                fh.write(payload)
+            manifest['views'].append({
+                'name': name, 'args': json.loads(to_json_plotly(list(args))),
+                'file': f"{digest}.json", 'bytes': len(payload),
+                'seconds': round(time.perf_counter() - start, 4),
+            })
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as fh:
+        json.dump(manifest, fh, indent=1)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(tmp, target)
+
+    manifests = {}
+    for d in os.listdir(out):
+        try:
+            with open(os.path.join(out, d, 'manifest.json')) as fh:
+                manifests[d] = json.load(fh)
+        except (OSError, ValueError):
+            continue
+    versions = sorted(
+        (d for d, m in manifests.items() if m.get('dataset', manifest['dataset']) == manifest['dataset']),
+        key=lambda d: manifests[d]['created'], reverse=True
+    )
+    for old in versions[keep:]:
+        shutil.rmtree(os.path.join(out, old), ignore_errors=True)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default=SNAPSHOT_DIR)
+    parser.add_argument('--keep', type=int, default=1,
+                        help='builds to keep per dataset, newest first')
+    parser.add_argument('--dataset', action='append',
+                        help='registered dataset name; repeat for several (default: all)')
+    args = parser.parse_args(argv)
+
+    import app  # noqa: F401  (registers the pages and their views)
+    # under ``python -m`` this file is __main__; the pages registered
+    # with the imported module
+    from core import snapshots
+    from core.registry import registry as datasets
+
+    for name in args.dataset or list(datasets.datasets):
+        path = datasets.path(name)
+        if path is None:
+            parser.error(f"unknown dataset {name!r}")
+        with use_dataset(path):
+            manifest = snapshots.build(args.out, args.keep)
+        total = sum(v['bytes'] for v in manifest['views'])
+        print(f"{name}: {len(manifest['views'])} views, {total / 1024:.0f} KiB "
+              f"-> {os.path.join(args.out, manifest['version'] + '-' + manifest['code'])}")
+
+
+if __name__ == '__main__':
+    main()
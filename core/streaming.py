@@ -0,0 +1,89 @@
+import itertools
+
+import numpy as np
+
+from core.crosstab import CrosstabEngine, get_crosstab_engine
+from core.dataset import DATA_PATH, DATASET_CHUNK_ROWS, load_columns
+from core.encoding import numeric_columns
+from core.index import FILTER_COLS, CodeIndex, get_code_index
+from core.moments import MomentCube, get_moment_cube
+from core.timeseries import DailyCounts, add_days, get_daily_counts
+from core.timing import timed
+
+
+@timed('single-pass aggregates')
+def scan(path=DATA_PATH, chunk_rows=DATASET_CHUNK_ROWS):
+    """Build the shared aggregates in one chunked pass over the columns.
+
+    Reads ``chunk_rows`` rows of each memory-mapped column at a time, so
+    the heap holds one chunk plus the aggregates: filter bitsets, per-column
+    totals (value and missing counts), daily counts, crosstabs of every
+    pair of filter columns and the correlation moment cube. Other pairs
+    are counted on request, also a chunk at a time, by ``CrosstabEngine``.
+    Returns ``(index, daily, engine, cube)``.
+
+    Still full-length: the filter bitsets, which are the index itself,
+    at one bit per row for every label of every filter column
+    (``n_rows / 8`` bytes each, filled in place a chunk at a time); the
+    codes of a non-category column (Timestamp), factorized when first
+    counted; crosstabs too large for dense counts; and, with
+    ``DATASET_MMAP=0``, the columns themselves.
+    """
+    columns = load_columns(path)
+    n_rows = len(next(iter(columns.values()))['values'])
+    # bitsets are packed per chunk, so chunks must end on a byte boundary
+    chunk_rows = max(8, (chunk_rows + 7) // 8 * 8)
+
+    categories = [c for c, col in columns.items() if col['kind'] == 'category']
+    sizes = {c: len(columns[c]['categories']) + 1 for c in categories}
+    filters = [c for c in FILTER_COLS if c in sizes]
+    pairs = list(itertools.combinations(filters, 2))
+
+    totals = {c: np.zeros(sizes[c], dtype=np.int64) for c in categories}
+    grids = {(x, h): np.zeros(sizes[x] * sizes[h], dtype=np.int64) for x, h in pairs}
+    n_bytes = (n_rows + 7) // 8
+    bitsets = {
+        c: {label: np.zeros(n_bytes, dtype=np.uint8) for label in columns[c]['categories']}
+        for c in filters
+    }
+    first_day, day_counts = None, None
+    cube = MomentCube.empty(columns, numeric_columns(columns))
+
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        codes = {c: np.asarray(columns[c]['values'][start:stop]) for c in categories}
+        for c in categories:
+            totals[c] += np.bincount(codes[c], minlength=sizes[c])
+        for x, h in pairs:
+            grids[(x, h)] += np.bincount(
+                codes[x].astype(np.int64) * sizes[h] + codes[h],
+                minlength=sizes[x] * sizes[h]
+            )
+        for c in filters:
+            for i, bits in enumerate(bitsets[c].values()):
+                bits[start // 8:(stop + 7) // 8] = np.packbits(codes[c] == i + 1)
+        if 'Timestamp' in columns:
+            first_day, day_counts = add_days(
+                first_day, day_counts, columns['Timestamp']['values'][start:stop]
+            )
+        cube.add_rows(columns, start, stop)
+
+    index = CodeIndex(columns, filters, bitsets=bitsets, totals=totals)
+    engine = CrosstabEngine(index)
+    for x, h in pairs:
+        engine.seed(x, h, grids[(x, h)].reshape(sizes[x], sizes[h]))
+    daily = DailyCounts(first_day, day_counts) if day_counts is not None else None
+    return index, daily, engine, cube
+
+
+def prime(path=DATA_PATH, chunk_rows=DATASET_CHUNK_ROWS):
+    """Run ``scan`` and install its results behind the usual getters.
+
+    ``core.registry`` calls it for each dataset on first use.
+    """
+    index, daily, engine, cube = scan(path, chunk_rows)
+    get_code_index.replace(path, index)
+    get_crosstab_engine.replace(path, engine)
+    get_moment_cube.replace(path, cube)
+    if daily is not None:
+        get_daily_counts.replace(path, daily)
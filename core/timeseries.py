@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from core.dataset import DATA_PATH, load_columns, per_dataset
+from core.timing import timed
+
+NS_PER_DAY = 86_400 * 10**9
+# NaT as stored in the int64 column
+NAT = np.iinfo(np.int64).min
+
+
+def add_days(first_day, counts, timestamps_ns):
+    """Add ``timestamps_ns`` to dense per-day ``counts`` starting at ``first_day``.
+
+    Returns the widened ``(first_day, counts)``; pass ``counts=None`` to start.
+    Missing timestamps (NaT) are not counted.
+    """
+    values = np.asarray(timestamps_ns, dtype=np.int64)
+    days = values[values != NAT] // NS_PER_DAY
+    if not len(days):
+        return first_day, counts
+    if counts is None or not len(counts):
+        first_day = int(days.min())
+        return first_day, np.bincount(days - first_day)
+    first = min(first_day, int(days.min()))
+    last = max(first_day + len(counts) - 1, int(days.max()))
+    merged = np.bincount(days - first, minlength=last - first + 1)
+    offset = first_day - first
+    merged[offset:offset + len(counts)] += counts
+    return first, merged
+
+
+class DailyCounts:
+    """Dense per-day record counts with a prefix sum and W/M rollups.
+
+    Any date range at any frequency is answered by differencing the prefix
+    sum at bin edges, so callbacks never touch individual rows.
+    """
+
+    def __init__(self, first_day, counts):
+        self.first_day = int(first_day)
+        self.counts = counts
+        self.prefix = np.concatenate([[0], np.cumsum(counts)])
+        self.dates = pd.date_range(
+            pd.Timestamp(self.first_day * NS_PER_DAY), periods=len(counts), freq='D'
+        )
+        day_idx = np.arange(len(counts))
+        self.rollups = {'D': (day_idx, self.dates, day_idx)}
+        for freq, period in (('W', 'W-SUN'), ('M', 'M')):
+            # label each bin by its last day, as pd.Grouper does
+            ends = self.dates.to_period(period).end_time.normalize()
+            bin_of_day, labels = pd.factorize(ends)
+            starts = np.flatnonzero(np.diff(bin_of_day, prepend=-1))
+            self.rollups[freq] = (bin_of_day, pd.DatetimeIndex(labels), starts)
+
+    @classmethod
+    def from_timestamps(cls, timestamps_ns):
+        first_day, counts = add_days(None, None, timestamps_ns)
+        if counts is None:
+            # no timestamp at all: an empty range
+            return cls(0, np.zeros(0, dtype=np.int64))
+        return cls(first_day, counts)
+
+    def extended(self, timestamps_ns):
+        """Counts with ``timestamps_ns`` added; only the new rows are binned."""
+        if not len(timestamps_ns):
+            return self
+        return DailyCounts(*add_days(self.first_day, self.counts, timestamps_ns))
+
+    @property
+    def first_date(self):
+        return self.dates[0].date() if len(self.dates) else None
+
+    @property
+    def last_date(self):
+        return self.dates[-1].date() if len(self.dates) else None
+
+    @property
+    def n_dated(self):
+        """Records that have a timestamp."""
+        return int(self.prefix[-1])
+
+    @property
+    def active_days(self):
+        return int(np.count_nonzero(self.counts))
+
+    def _day(self, value, default):
+        if value is None:
+            return default
+        ts = pd.Timestamp(value).normalize()
+        return int(ts.value // NS_PER_DAY) - self.first_day
+
+    def day_range(self, start=None, end=None):
+        """Inclusive day indices covering ``[start, end]``, trimmed to days with data."""
+        a = max(self._day(start, 0), 0)
+        b = min(self._day(end, len(self.counts) - 1), len(self.counts) - 1)
+        if a > b or self.prefix[b + 1] == self.prefix[a]:
+            return None
+        # first/last day in range that actually has records
+        a = int(np.searchsorted(self.prefix, self.prefix[a], side='right')) - 1
+        b = int(np.searchsorted(self.prefix, self.prefix[b + 1], side='left')) - 1
+        return a, b
+
+    def series(self, start=None, end=None, freq='D', cumulative=False):
+        """Counts per ``freq`` bin ('D', 'W' or 'M') between ``start`` and ``end``."""
+        rng = self.day_range(start, end)
+        if rng is None:
+            return pd.Series([], index=pd.DatetimeIndex([], name='Timestamp'),
+                             name='count', dtype='int64')
+        a, b = rng
+        bin_of_day, labels, starts = self.rollups[freq]
+        i0, i1 = bin_of_day[a], bin_of_day[b]
+        edges = np.concatenate([[a], starts[i0 + 1:i1 + 1], [b + 1]])
+        if cumulative:
+            values = self.prefix[edges[1:]] - self.prefix[a]
+        else:
+            values = np.diff(self.prefix[edges])
+        return pd.Series(
+            values, index=labels[i0:i1 + 1].rename('Timestamp'), name='count'
+        )
+
+
+@per_dataset
+@timed('build daily counts')
+def get_daily_counts(path=DATA_PATH):
+    return DailyCounts.from_timestamps(load_columns(path)['Timestamp']['values'])
@@ -0,0 +1,58 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# [name, depth, seconds] in start order, so nested phases follow their parent
+startup_phases = []
+# Phases are recorded until the startup report is logged; later ones
+# (reloads after ingest or eviction) are only logged at debug level
+_recording = [True]
+# Nesting depth of the current thread or request
+_depth = contextvars.ContextVar('phase_depth', default=0)
+
+
+@contextmanager
+def phase(name):
+    """Time a block and record it in ``startup_phases`` during startup."""
+    depth = _depth.get()
+    entry = [name, depth, None]
+    if _recording[0]:
+        startup_phases.append(entry)
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth.reset(token)
+        entry[2] = time.perf_counter() - start
+        logger.debug("%s took %.1f ms", name, entry[2] * 1000)
+
+
+def timed(name):
+    """Decorator form of ``phase``."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def startup_report():
+    """Recorded phases as an indented text table."""
+    lines = []
+    for name, depth, elapsed in startup_phases:
+        took = '  running' if elapsed is None else f"{elapsed * 1000:9.1f} ms"
+        lines.append(f"{'  ' * depth}{name:<{40 - 2 * depth}} {took}")
+    return "\n".join(lines)
+
+
+def log_startup_report():
+    """Log the recorded phases and stop recording new ones."""
+    _recording[0] = False
+    logger.info("startup phases:\n%s", startup_report())
@@ -0,0 +1,135 @@
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter
+
+from core.memo import MEMO_ACCESS_LOG, memoized, normalize
+from core.snapshots import lookup, registry as snapshot_views
+from core.timing import phase
+
+# Seconds a worker may spend warming caches before it serves; 0 skips it
+WARMUP_SECONDS = float(os.environ.get('WARMUP_SECONDS', 0))
+WARMUP_PROCESSES = int(os.environ.get('WARMUP_PROCESSES', os.cpu_count() or 2))
+# Most frequent distinct calls taken from MEMO_ACCESS_LOG
+WARMUP_LOG_TOP = int(os.environ.get('WARMUP_LOG_TOP', 200))
+
+logger = logging.getLogger(__name__)
+
+_fork = multiprocessing.get_context('fork')
+
+# name -> views; broader input sets than the snapshot defaults
+_enumerations = {}
+
+
+def register(func, views):
+    """Warm ``func`` for every argument tuple ``views()`` returns.
+
+    Ranked after the snapshot defaults and the access log.
+    """
+    _enumerations[f"{func.__module__}.{func.__qualname__}"] = views
+
+
+def _key(name, args):
+    return name, tuple(normalize(a) for a in args)
+
+
+def _resolve(name):
+    # the module attribute carries every cache layer (dataset_cache, memo, snapshot)
+    module, _, attr = name.rpartition('.')
+    return getattr(importlib.import_module(module), attr)
+
+
+def logged_calls(path=MEMO_ACCESS_LOG, top=WARMUP_LOG_TOP):
+    """The ``top`` most frequent ``(name, args)`` in an access log, most frequent first."""
+    if not path or not os.path.exists(path):
+        return []
+    counts, first = Counter(), {}
+    with open(path) as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line still being written
+            if entry.get('kwargs') or entry.get('name') not in memoized:
+                continue
+            key = _key(entry['name'], entry['args'])
+            counts[key] += 1
+            first.setdefault(key, (entry['name'], tuple(entry['args'])))
+    return [first[key] for key, _ in counts.most_common(top)]
+
+
+def plan(log_path=MEMO_ACCESS_LOG):
+    """Distinct ``(name, args)`` to warm, in priority order.
+
+    Snapshot defaults first, then the access log by frequency, then the
+    registered enumerations.
+    """
+    tasks = [(name, tuple(args)) for name, (_, views) in snapshot_views.items() for args in views()]
+    tasks += logged_calls(log_path)
+    tasks += [(name, tuple(args)) for name, views in _enumerations.items() for args in views()]
+
+    seen, ordered = set(), []
+    for name, args in tasks:
+        key = _key(name, args)
+        if key not in seen:
+            seen.add(key)
+            ordered.append((name, args))
+    return ordered
+
+
+def _compute(task):
+    name, args = task
+    try:
+        return name, args, memoized[name].uncached(*args)
+    except Exception:
+        logger.exception('warm-up of %s%r failed', name, args)
+        return name, args, None
+
+
+def run(budget=WARMUP_SECONDS, processes=WARMUP_PROCESSES, log_path=MEMO_ACCESS_LOG):
+    """Fill the caches in priority order until done or ``budget`` seconds pass.
+
+    Functions that are not memoized (page layouts) run here first, which
+    also builds the shared aggregates. A forked pool then computes the
+    memoized callbacks, and their results are primed into this process's
+    ``result_cache``. Inputs already cached or snapshotted are skipped.
+    Returns the number of results warmed.
+    """
+    if budget <= 0:
+        return 0
+    deadline = time.perf_counter() + budget
+    with phase('warm-up'):
+        tasks = plan(log_path)
+        local = [(n, a) for n, a in tasks if n not in memoized]
+        remote = [
+            (n, a) for n, a in tasks
+            if n in memoized and memoized[n].peek(*a) is None and lookup(n, a) is None
+        ]
+        total = len(local) + len(remote)
+        done = 0
+
+        for name, args in local:
+            if time.perf_counter() >= deadline:
+                break
+            _resolve(name)(*args)
+            done += 1
+
+        if remote and time.perf_counter() < deadline:
+            step = max(1, len(remote) // 10)
+            with _fork.Pool(min(processes, len(remote))) as pool:
+                for i, (name, args, value) in enumerate(pool.imap_unordered(_compute, remote), 1):
+                    if value is not None:
+                        memoized[name].prime(value, *args)
+                        done += 1
+                    if i % step == 0 or i == len(remote):
+                        logger.info('warm-up: %d/%d results, %.1fs left',
+                                    done, total, max(deadline - time.perf_counter(), 0))
+                    if time.perf_counter() >= deadline:
+                        break
+                # leaving the block terminates whatever is still running
+
+    logger.info('warm-up: %d of %d results warmed', done, total)
+    return done
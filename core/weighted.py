@@ -0,0 +1,153 @@
+"""Distinct rows of the category columns, each weighted by its count.
+
+Survey answers repeat: many respondents give the same combination of
+answers, so the category columns collapse to far fewer distinct rows.
+Counts, crosstabs and correlation sums computed on those rows with a
+weight per row equal the row-level results exactly, while reading only
+the distinct rows. Columns that are not categories (Timestamp) are left
+out and keep being answered row by row.
+"""
+import logging
+import math
+import os
+
+import numpy as np
+
+from core.crosstab import CrosstabEngine, get_crosstab_engine
+from core.dataset import DATA_PATH, DATASET_CHUNK_ROWS, load_columns, per_dataset
+from core.index import FILTER_COLS, CodeIndex, get_code_index, weighted_bincount
+from core.timing import timed
+
+# Used when at most this share of the rows is distinct; 0 turns it off
+WEIGHTED_MAX_RATIO = float(os.environ.get('WEIGHTED_MAX_RATIO', 0.5))
+# Source rows deduplicated per pass, to bound the working matrix
+WEIGHTED_CHUNK_ROWS = 1 << 18
+
+logger = logging.getLogger(__name__)
+
+
+class WeightedRows:
+    """Distinct rows of ``names`` with ``weights[i]`` source rows behind row ``i``.
+
+    ``columns`` holds the distinct rows in the layout of ``load_columns``
+    (same codes and categories), so it can back a ``CodeIndex``.
+    ``n_rows`` is the number of source rows covered.
+    """
+
+    def __init__(self, columns, weights, n_rows):
+        self.columns = columns
+        self.weights = weights
+        self.n_rows = n_rows
+
+    @classmethod
+    def empty(cls, columns):
+        names = [n for n, col in columns.items() if col['kind'] == 'category']
+        return cls(
+            {n: {**columns[n], 'values': np.zeros(0, dtype=columns[n]['values'].dtype)} for n in names},
+            np.zeros(0, dtype=np.int64), 0
+        )
+
+    @classmethod
+    def build(cls, columns, max_distinct=None):
+        """Rows over all of ``columns``, or None once more than ``max_distinct`` are distinct."""
+        rows = cls.empty(columns)
+        n_rows = len(next(iter(columns.values()))['values'])
+        for start in range(0, n_rows, WEIGHTED_CHUNK_ROWS):
+            rows = rows.add_rows(columns, start, min(start + WEIGHTED_CHUNK_ROWS, n_rows))
+            # the distinct rows only grow, so stop before paying for the rest
+            if max_distinct is not None and len(rows.weights) > max_distinct:
+                return None
+        return rows
+
+    def covers(self, names):
+        return all(n in self.columns for n in names)
+
+    def add_rows(self, columns, start, stop):
+        """A new ``WeightedRows`` that also covers rows ``start:stop`` of ``columns``."""
+        names = list(self.columns)
+        parts = [
+            np.concatenate([self.columns[n]['values'], np.asarray(columns[n]['values'][start:stop])])
+            for n in names
+        ]
+        shape = [len(columns[n]['categories']) + 1 for n in names]
+        if math.prod(shape) < 2 ** 63:
+            # one int64 key per row sorts far faster than rows of codes
+            keys, inverse = np.unique(
+                np.ravel_multi_index([p.astype(np.intp) for p in parts], shape), return_inverse=True
+            )
+            distinct = np.unravel_index(keys, shape)
+            n_distinct = len(keys)
+        else:
+            rows, inverse = np.unique(np.column_stack(parts), axis=0, return_inverse=True)
+            distinct = rows.T
+            n_distinct = rows.shape[0]
+        weights = np.concatenate([self.weights, np.ones(stop - start, dtype=np.int64)])
+        return WeightedRows(
+            {n: {**columns[n], 'values': distinct[i].astype(part.dtype)}
+             for i, (n, part) in enumerate(zip(names, parts))},
+            weighted_bincount(inverse.reshape(-1), weights, n_distinct),
+            self.n_rows + stop - start
+        )
+
+    def extended(self, columns):
+        """Rows over ``columns``, whose first rows are the ones already covered."""
+        n_rows = len(next(iter(columns.values()))['values'])
+        return self.add_rows(columns, self.n_rows, n_rows)
+
+    @property
+    def nbytes(self):
+        return self.weights.nbytes + sum(c['values'].nbytes for c in self.columns.values())
+
+
+@per_dataset
+@timed('deduplicate rows')
+def get_weighted_rows(path=DATA_PATH):
+    """Weighted distinct rows, or None when they would not save enough rows.
+
+    The None is cached like the rows, and ingest keeps it, so mostly
+    distinct data is only deduplicated once, and only as far as it takes
+    to see that. Chunked datasets (``DATASET_CHUNK_ROWS``) skip it: they
+    are chunked because the full columns do not fit in memory at once.
+    """
+    if WEIGHTED_MAX_RATIO <= 0 or DATASET_CHUNK_ROWS:
+        return None
+    columns = load_columns(path)
+    if not any(c['kind'] == 'category' for c in columns.values()):
+        return None
+    n_rows = len(next(iter(columns.values()))['values'])
+    rows = WeightedRows.build(columns, max_distinct=WEIGHTED_MAX_RATIO * n_rows)
+    if rows is None:
+        logger.info('over %.0f%% of rows distinct in %s; counting row by row', WEIGHTED_MAX_RATIO * 100, path)
+        return None
+    logger.info('%d distinct of %d rows (%.1f%%) in %s', len(rows.weights), n_rows, len(rows.weights) / max(n_rows, 1) * 100, path)
+    return rows
+
+
+@per_dataset
+def get_weighted_index(path=DATA_PATH):
+    rows = get_weighted_rows(path)
+    if rows is None:
+        return None
+    return CodeIndex(rows.columns, [c for c in FILTER_COLS if c in rows.columns], weights=rows.weights)
+
+
+@per_dataset
+def get_weighted_engine(path=DATA_PATH):
+    index = get_weighted_index(path)
+    return None if index is None else CrosstabEngine(index)
+
+
+def index_for(*columns):
+    """The code index to count ``columns`` on: the weighted one when it has them all."""
+    index = get_weighted_index()
+    if index is not None and all(c in index.columns for c in columns):
+        return index
+    return get_code_index()
+
+
+def engine_for(x, hue):
+    """The crosstab engine for ``x`` by ``hue``, weighted when both are deduplicated."""
+    engine = get_weighted_engine()
+    if engine is not None and x in engine.index.columns and hue in engine.index.columns:
+        return engine
+    return get_crosstab_engine()
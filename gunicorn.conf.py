@@ -0,0 +1,8 @@
+# Picked up automatically by `gunicorn app:server` run from this directory.
+from core.dataset import ensure_cache
+
+
+def on_starting(server):
+    # Build (or validate) the column store once in the master, before any
+    # worker forks; workers then only memory-map the finished files.
+    ensure_cache()
@@ -1,12 +1,16 @@
 import dash
 from dash import html, dcc, Input, Output
-import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
 
-dash.register_page(__name__, path='/features', name='Features')
+from core.dataset import dataset_cache, load_columns, load_dataset, on_data_change
+from core.figures import ACCENT, TEMPLATE, new_figure, typed
+from core.memo import memoize
+from core.snapshots import snapshot
+from core.timeseries import get_daily_counts
+from core.weighted import index_for
 
-df = pd.read_csv('Mental Health Dataset.csv')
+dash.register_page(__name__, path='/features', name='Features')
 
 feature_desc = {
     "Timestamp":               "📅 A record of the date and time when an observation or data point was recorded regarding someone's mental health.",
@@ -28,14 +32,19 @@ feature_desc = {
 }
 all_features = list(feature_desc.keys())
 
-def make_feature_card(col, selected=False):
-    series = df[col]
-    non_null = series.dropna()
+@dataset_cache
+def describe_feature(col):
+    """Summary lines and sparkline figure for one column, computed once."""
+    kind = load_columns()[col]['kind']
+    code_index = index_for(col)
 
-    missing_count = series.isna().sum()
-    missing_pct   = missing_count / len(series) * 100
+    if kind == 'numeric':
+        import plotly.express as px
 
-    if pd.api.types.is_numeric_dtype(non_null):
+        series = load_dataset()[col]
+        non_null = series.dropna()
+        missing_count = series.isna().sum()
+        missing_pct   = missing_count / len(series) * 100
         vmin, q1, med, q3, vmax = (
             non_null.min(),
             non_null.quantile(0.25),
@@ -58,22 +67,39 @@ def make_feature_card(col, selected=False):
         dist_fig = px.histogram(
             non_null, nbins=20, title=None,
             marginal="box",
-            labels={"value": col, "count": "Count"}
+            labels={"value": col, "count": "Count"},
+            template=TEMPLATE
         )
+    elif kind == 'datetime':
+        # One bar per timestamp is unreadable; show records per day instead
+        daily = get_daily_counts()
+        per_day = daily.series(freq='D')
+        missing_count = code_index.n_records - int(per_day.sum())
+        missing_pct   = missing_count / code_index.n_records * 100
+        stats = [
+            f"📅 First: {per_day.index.min().date()}",
+            f"📅 Last: {per_day.index.max().date()}",
+            f"🔢 Active days: {daily.active_days}",
+            f"❓ Missing: {missing_count} ({missing_pct:.1f}%)"
+        ]
+        dist_fig = new_figure(go.Scatter(
+            x=per_day.index.strftime('%Y-%m-%d'), y=typed(per_day.values), mode='lines',
+            line_color=ACCENT, hovertemplate='%{x}<br>Count=%{y}<extra></extra>'
+        ))
     else:
-        nunique = non_null.nunique()
-        mode    = non_null.mode().iloc[0] if not non_null.mode().empty else "—"
+        counts = code_index.value_counts(col)
+        missing_count = code_index.n_records - int(counts.sum())
+        missing_pct   = missing_count / code_index.n_records * 100
+        mode = counts.index[0] if not counts.empty else "—"
         stats = [
-            f"🔢 Unique: {nunique}",
+            f"🔢 Unique: {len(counts)}",
             f"📊 Mode: {mode}",
             f"❓ Missing: {missing_count} ({missing_pct:.1f}%)"
         ]
-        counts = non_null.value_counts().reset_index()
-        counts.columns = [col, 'count']
-        dist_fig = px.bar(
-            counts, x=col, y='count', title=None,
-            labels={col: col, 'count': 'Count'}
-        )
+        dist_fig = new_figure(go.Bar(
+            x=counts.index, y=typed(counts.values),
+            marker_color=ACCENT, hovertemplate='%{x}<br>Count=%{y}<extra></extra>'
+        ))
 
     dist_fig.update_layout(
         margin=dict(l=0, r=0, t=0, b=0),
@@ -82,6 +108,11 @@ def make_feature_card(col, selected=False):
     )
     dist_fig.update_xaxes(title_text='', showgrid=False)
     dist_fig.update_yaxes(title_text='Count', showgrid=False)
+    return stats, dist_fig
+
+
+def make_feature_card(col, selected=False):
+    stats, dist_fig = describe_feature(col)
 
     header = dbc.CardHeader(
         html.H5(f"{'✨ ' if selected else ''}{col}", className='mb-0')
@@ -102,6 +133,12 @@ def make_feature_card(col, selected=False):
         return dbc.Col(card, xs=12, sm=6, md=4, lg=3, className='mb-4')
 
 
+# Each variant of a card is built once; callbacks only reorder them
+feature_card = dataset_cache(make_feature_card)
+on_data_change(describe_feature.cache_clear)
+on_data_change(feature_card.cache_clear)
+
+
 layout = html.Div(style={
         'minHeight': '100vh',
         'padding': '20px 0'
@@ -133,10 +170,12 @@ layout = html.Div(style={
     Output('other-feature-cards', 'children'),
     Input('feature-dropdown', 'value')
 )
+@snapshot(lambda: [(f,) for f in all_features])
+@memoize
 def show_feature_cards(selected):
-    sel = make_feature_card(selected, selected=True)
+    sel = feature_card(selected, True)
     others = [
-        make_feature_card(col, selected=False)
+        feature_card(col, False)
         for col in all_features if col != selected
     ]
     return dbc.Row(sel), others
@@ -1,361 +1,410 @@
 import dash
-from dash import html, dcc, Input, Output, callback
+from dash import html, dcc, Input, Output, callback, clientside_callback
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
 
+from core.dataset import dataset_cache, load_columns, on_data_change
+from core.figures import ACCENT, new_figure, typed
+from core.index import get_code_index
+from core.memo import memoize
+from core.metrics import span
+from core.moments import get_moment_cube
+from core.snapshots import snapshot
+from core.timeseries import get_daily_counts
+from core.timing import timed
+from core.weighted import index_for
+
 dash.register_page(__name__, path='/', name='Home')
 
-df = pd.read_csv('Mental Health Dataset.csv')
-df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-df['Date']      = df['Timestamp'].dt.date
-
-df_enc = df.copy()
-ord_mappings = {
-    'self_employed':           {'No':0, 'Yes':1},
-    'family_history':          {'No':0, 'Yes':1},
-    'treatment':               {'No':0, 'Yes':1},
-    'Growing_Stress':          {'No':0, 'Maybe':1, 'Yes':2},
-    'Changes_Habits':          {'No':0, 'Maybe':1, 'Yes':2},
-    'Mental_Health_History':   {'No':0, 'Maybe':1, 'Yes':2},
-    'Mood_Swings':             {'Low':1, 'Medium':2, 'High':3},
-    'Coping_Struggles':        {'No':0, 'Yes':1},
-    'Work_Interest':           {'No':0, 'Maybe':1, 'Yes':2},
-    'Social_Weakness':         {'No':0, 'Maybe':1, 'Yes':2},
-    'mental_health_interview': {'No':0, 'Maybe':1, 'Yes':2},
-    'care_options':            {'No':0, 'Not sure':1, 'Yes':2},
-    'Days_Indoors': {
-        'More than 2 months': 1,
-        '31-60 days':         2,
-        '15-30 days':         3,
-        '1-14 days':          4,
-        'Go out Every day':   5
+# Everything below is built on first use, not at import, so workers
+# come up before the dataset has been touched.
+
+@dataset_cache
+@timed('home: overview KPIs')
+def overview_stats():
+    index = index_for('treatment', 'Occupation')
+    daily = get_daily_counts()
+    total_records = index.n_records
+    treat = index.value_counts('treatment')
+    occ = index.value_counts('Occupation')
+    return {
+        'total_records': total_records,
+        'first_ts':      daily.first_date,
+        'last_ts':       daily.last_date,
+        # per day with records, over the records that have a date
+        'avg_per_day':   int(daily.n_dated / max(daily.active_days, 1)),
+        'treat_rate':    treat.get('Yes', 0) / treat.sum() * 100 if treat.sum() else 0,
+        'top_occ':       occ.index[0] if not occ.empty else '—',
     }
-}
-for c, mp in ord_mappings.items():
-    if c in df_enc:
-        df_enc[c] = df_enc[c].map(mp)
-
-numeric_cols = [
-    c for c in df_enc.columns
-    if pd.api.types.is_numeric_dtype(df_enc[c])
-]
-
-total_records = len(df)
-start_date    = df['Date'].min()
-end_date      = df['Date'].max()
-avg_per_day   = int(df.groupby('Date').size().mean())
-treat_rate    = df['treatment'].value_counts(normalize=True).get('Yes', 0) * 100
-top_occ       = (
-    df['Occupation'].mode().iat[0]
-    if not df['Occupation'].mode().empty else '—'
-)
 
-# Missing‐data bar
-missing_df = (
-    df.drop(columns=['Date'])
-      .isnull()
-      .sum()
-      .reset_index(name='missing_count')
-      .rename(columns={'index':'feature'})
-      .sort_values('missing_count', ascending=True)
-)
-fig_missing = px.bar(
-    missing_df,
-    x='missing_count', y='feature', orientation='h',
-    labels={'missing_count':'Missing count','feature':''},
-    template='plotly_white'
-)
-fig_missing.update_layout(
-    margin=dict(l=80, t=20, b=20, r=20),
-    height=300
-)
-fig_missing.update_xaxes(showgrid=True, gridcolor='lightgrey')
-fig_missing.update_yaxes(showgrid=True, gridcolor='lightgrey')
-
-# Global map 
-map_df = (
-    df['Country']
-      .value_counts()
-      .rename_axis('country')
-      .reset_index(name='count')
-)
-fig_world = px.choropleth(
-    map_df,
-    locations='country',
-    locationmode='country names',
-    color='count',
-    hover_name='country',
-    color_continuous_scale='Viridis',
-    labels={'count':'Responses'},
-    title="All Responses by Country",
-    template='plotly_white'
-)
-fig_world.update_layout(
-    geo=dict(showframe=False, showcoastlines=True),
-    margin=dict(l=0, t=40, b=20, r=0),
-    height=300
-)
 
-# Gender pie & treatment bar
-fig_gender = px.pie(
-    df, names='Gender', hole=0.4, title='Gender Breakdown',
-    template='plotly_white'
-)
-fig_gender.update_traces(textinfo='percent+label')
-fig_gender.update_layout(
-    margin=dict(l=0, t=30, b=0, r=0),
-    height=300,
-    legend=dict(orientation='h', yanchor='bottom', y=-0.1)
-)
+@dataset_cache
+@timed('home: overview figures')
+def overview_figures():
+    index = index_for('Country', 'Gender', 'treatment')
+
+    # Missing‐data bar
+    missing_counts = pd.Series(
+        {c: index_for(c).missing_count(c) for c in load_columns()}
+    ).sort_values(ascending=True, kind='stable')
+    fig_missing = new_figure(
+        go.Bar(
+            x=typed(missing_counts.values), y=missing_counts.index,
+            orientation='h', marker_color=ACCENT,
+            hovertemplate='Missing count=%{x}<br>%{y}<extra></extra>'
+        ),
+        xaxis_title='Missing count',
+        margin=dict(l=80, t=20, b=20, r=20),
+        height=300
+    )
+
+    # Global map 
+    country_counts = index.value_counts('Country')
+    fig_world = new_figure(
+        go.Choropleth(
+            locations=country_counts.index,
+            locationmode='country names',
+            z=typed(country_counts.values),
+            coloraxis='coloraxis',
+            hovertemplate='<b>%{location}</b><br>Responses=%{z}<extra></extra>'
+        ),
+        title="All Responses by Country",
+        coloraxis=dict(colorscale='Viridis', colorbar_title_text='Responses'),
+        geo=dict(showframe=False, showcoastlines=True),
+        margin=dict(l=0, t=40, b=20, r=0),
+        height=300
+    )
+
+    # Gender pie & treatment bar
+    gender_counts = index.value_counts('Gender')
+    fig_gender = new_figure(
+        go.Pie(
+            labels=gender_counts.index, values=typed(gender_counts.values),
+            hole=0.4, textinfo='percent+label'
+        ),
+        title='Gender Breakdown',
+        margin=dict(l=0, t=30, b=0, r=0),
+        height=300,
+        legend=dict(orientation='h', yanchor='bottom', y=-0.1)
+    )
+
+    treat_counts = index.value_counts('treatment')
+    fig_treat = new_figure(
+        go.Bar(
+            x=treat_counts.index, y=typed(treat_counts.values),
+            text=typed(treat_counts.values), marker_color=ACCENT,
+            hovertemplate='treatment=%{x}<br>count=%{y}<extra></extra>'
+        ),
+        title='Treatment Status',
+        yaxis_title='Count',
+        margin=dict(l=40, t=30, b=0, r=20),
+        height=300
+    )
+
+    return fig_missing, fig_world, fig_gender, fig_treat
 
-treat_df = (
-    df['treatment']
-      .value_counts()
-      .rename_axis('treatment')
-      .reset_index(name='count')
-)
-fig_treat = px.bar(
-    treat_df, x='treatment', y='count', text='count', title='Treatment Status',
-    template='plotly_white'
-)
-fig_treat.update_layout(
-    margin=dict(l=40, t=30, b=0, r=20),
-    height=300
-)
-fig_treat.update_xaxes(title='')
-fig_treat.update_yaxes(title='Count')
 
 # Correlation heatmap 
-corr = df_enc[numeric_cols].corr().abs()
-fig_corr = px.imshow(
-    corr,
-    text_auto=True,
-    aspect='auto',
-    color_continuous_scale='Blues',
-    title='Feature Correlations (|r| ≥ 0)',
-    template='plotly_white'
-)
-fig_corr.update_layout(
-    margin=dict(l=40, t=40, b=20, r=20),
-    height=500,
-    width=None 
-)
-fig_corr.update_xaxes(
-    showgrid=True, gridcolor='lightgrey', tickangle=45
-)
-fig_corr.update_yaxes(showgrid=True, gridcolor='lightgrey')
+def corr_matrix(countries=('All',), genders=('All',), occupations=('All',)):
+    # Summed from the per-segment moment cube, so no rows are scanned
+    return get_moment_cube().moments({
+        'Country':    countries,
+        'Gender':     genders,
+        'Occupation': occupations,
+    }).corr().abs()
+
+
+@dataset_cache
+@timed('home: segment options')
+def segment_options():
+    index = get_code_index()
+    return {
+        column: [{'label':'All','value':'All'}] + [
+            {'label':str(v), 'value':v} for v in index.codes(column)[1]
+        ]
+        for column in ('Country', 'Gender', 'Occupation')
+    }
 
 
-# Layout
-layout = dbc.Container(fluid=True, className='py-4', children=[
-
-    html.H2("Statistics & EDA", className='text-center mb-4'),
-
-    dbc.Card(className='mb-4 shadow-sm', children=dbc.CardBody([
-        html.H4("Overview 🗒️", className='card-title'),
-        dbc.Row([
-            dbc.Col(
-                dbc.Card(dbc.CardBody([
-                    html.H6("📋 Total Records"),
-                    html.H4(f"{total_records:,}")
-                ]), className='border shadow-none'),
-                md=2
-            ),
-            dbc.Col(
-                dbc.Card(dbc.CardBody([
-                    html.H6("📅 Date Range"),
-                    html.P(f"{start_date} → {end_date}")
-                ]), className='border shadow-none'),
-                md=3
-            ),
-            dbc.Col(
-                dbc.Card(dbc.CardBody([
-                    html.H6("🔢 Avg / Day"),
-                    html.H4(f"{avg_per_day:,}")
-                ]), className='border shadow-none'),
-                md=2
-            ),
-            dbc.Col(
-                dbc.Card(dbc.CardBody([
-                    html.H6("💊 Treatment Rate"),
-                    html.H4(f"{treat_rate:.1f}%")
-                ]), className='border shadow-none'),
-                md=2
-            ),
-            dbc.Col(
-                dbc.Card(dbc.CardBody([
-                    html.H6("💼 Top Occupation"),
-                    html.H4(top_occ)
-                ]), className='border shadow-none'),
-                md=3
-            ),
-        ], className='mb-4 justify-content-center'),
-
-        dbc.Row([
-            dbc.Col(dcc.Graph(figure=fig_gender, config={'displayModeBar':False}), md=6),
-            dbc.Col(dcc.Graph(figure=fig_treat,  config={'displayModeBar':False}), md=6),
-        ], className='mb-4'),
-
-        dbc.Row([
-            dbc.Col(dcc.Graph(figure=fig_missing, config={'displayModeBar':False}), md=6),
-            dbc.Col(dcc.Graph(figure=fig_world,   config={'displayModeBar':False}), md=6),
-        ]),
-    ])),
-
-    # Trend Card 
-    dbc.Card(className='mb-4 shadow-sm', children=dbc.CardBody([
-
-        html.H4("Trend Over Time 📈", className='card-title'),
-
-        dbc.Row([
-            dbc.Col(
-                html.Div([
-                    dbc.Label("Date Range", className="form-label"),
-                    dcc.DatePickerRange(
-                        id='home-date-picker',
-                        min_date_allowed=df['Timestamp'].min(),
-                        max_date_allowed=df['Timestamp'].max(),
-                        start_date=df['Timestamp'].min(),
-                        end_date=df['Timestamp'].max(),
-                        display_format='MM/DD/YYYY',
-                        className='w-100'
-                    ),
-                ], className="mb-3"),
-                md=6
+@memoize
+def update_home_corr(t, countries=('All',), genders=('All',), occupations=('All',)):
+    # Server-side render of the heatmap; the slider itself is handled
+    # client-side from `home-corr-store`.
+    with span('filter'):
+        corr = corr_matrix(countries, genders, occupations)
+        masked = corr.mask(corr < t)
+
+    with span('figure'):
+        return new_figure(
+            go.Heatmap(
+                z=typed(masked.values), x=list(corr.columns), y=list(corr.index),
+                coloraxis='coloraxis', texttemplate='%{z:.2f}', hoverongaps=False,
+                hovertemplate='x=%{x}<br>y=%{y}<br>|r|=%{z:.3f}<extra></extra>'
             ),
+            title=f"Feature Correlations (|r| ≥ {t:.2f})",
+            coloraxis=dict(colorscale='Blues'),
+            xaxis=dict(tickangle=45),
+            yaxis=dict(autorange='reversed'),
+            margin=dict(l=40, t=40, b=20, r=20),
+            height=500
+        )
+
 
-            dbc.Col(
-                html.Div([
-                    dbc.Label("Aggregate By", className="form-label"),
-                    dcc.RadioItems(
-                        id='home-trend-agg',
-                        options=[
-                            {'label':'Daily','value':'D'},
-                            {'label':'Weekly','value':'W'},
-                            {'label':'Monthly','value':'M'}
-                        ],
-                        value='M',
-                        inline=True,
-                        labelClassName='me-3'
-                    ),
-                    html.Div(
-                        dbc.Checklist(
-                            id='home-trend-cum',
-                            options=[{'label':' Show cumulative','value':'cum'}],
-                            value=[],
-                            switch=True
+def layout(**kwargs):
+    return build_layout()
+
+
+# Layout
+@dataset_cache
+@snapshot()
+@timed('home: layout')
+def build_layout():
+    stats = overview_stats()
+    total_records = stats['total_records']
+    first_ts, last_ts = stats['first_ts'], stats['last_ts']
+    start_date, end_date = first_ts, last_ts
+    avg_per_day = stats['avg_per_day']
+    treat_rate = stats['treat_rate']
+    top_occ = stats['top_occ']
+    fig_missing, fig_world, fig_gender, fig_treat = overview_figures()
+    corr_store = update_home_corr_store(['All'], ['All'], ['All'])
+    segments = segment_options()
+
+    return dbc.Container(fluid=True, className='py-4', children=[
+
+        html.H2("Statistics & EDA", className='text-center mb-4'),
+
+        dbc.Card(className='mb-4 shadow-sm', children=dbc.CardBody([
+            html.H4("Overview 🗒️", className='card-title'),
+            dbc.Row([
+                dbc.Col(
+                    dbc.Card(dbc.CardBody([
+                        html.H6("📋 Total Records"),
+                        html.H4(f"{total_records:,}")
+                    ]), className='border shadow-none'),
+                    md=2
+                ),
+                dbc.Col(
+                    dbc.Card(dbc.CardBody([
+                        html.H6("📅 Date Range"),
+                        html.P(f"{start_date} → {end_date}")
+                    ]), className='border shadow-none'),
+                    md=3
+                ),
+                dbc.Col(
+                    dbc.Card(dbc.CardBody([
+                        html.H6("🔢 Avg / Day"),
+                        html.H4(f"{avg_per_day:,}")
+                    ]), className='border shadow-none'),
+                    md=2
+                ),
+                dbc.Col(
+                    dbc.Card(dbc.CardBody([
+                        html.H6("💊 Treatment Rate"),
+                        html.H4(f"{treat_rate:.1f}%")
+                    ]), className='border shadow-none'),
+                    md=2
+                ),
+                dbc.Col(
+                    dbc.Card(dbc.CardBody([
+                        html.H6("💼 Top Occupation"),
+                        html.H4(top_occ)
+                    ]), className='border shadow-none'),
+                    md=3
+                ),
+            ], className='mb-4 justify-content-center'),
+
+            dbc.Row([
+                dbc.Col(dcc.Graph(figure=fig_gender, config={'displayModeBar':False}), md=6),
+                dbc.Col(dcc.Graph(figure=fig_treat,  config={'displayModeBar':False}), md=6),
+            ], className='mb-4'),
+
+            dbc.Row([
+                dbc.Col(dcc.Graph(figure=fig_missing, config={'displayModeBar':False}), md=6),
+                dbc.Col(dcc.Graph(figure=fig_world,   config={'displayModeBar':False}), md=6),
+            ]),
+        ])),
+
+        # Trend Card 
+        dbc.Card(className='mb-4 shadow-sm', children=dbc.CardBody([
+
+            html.H4("Trend Over Time 📈", className='card-title'),
+
+            dbc.Row([
+                dbc.Col(
+                    html.Div([
+                        dbc.Label("Date Range", className="form-label"),
+                        dcc.DatePickerRange(
+                            id='home-date-picker',
+                            min_date_allowed=first_ts,
+                            max_date_allowed=last_ts,
+                            start_date=first_ts,
+                            end_date=last_ts,
+                            display_format='MM/DD/YYYY',
+                            className='w-100'
                         ),
-                        className='mt-2'
-                    )
-                ], className="h-100 d-flex flex-column justify-content-center"),
-                md=6
+                    ], className="mb-3"),
+                    md=6
+                ),
+
+                dbc.Col(
+                    html.Div([
+                        dbc.Label("Aggregate By", className="form-label"),
+                        dcc.RadioItems(
+                            id='home-trend-agg',
+                            options=[
+                                {'label':'Daily','value':'D'},
+                                {'label':'Weekly','value':'W'},
+                                {'label':'Monthly','value':'M'}
+                            ],
+                            value='M',
+                            inline=True,
+                            labelClassName='me-3'
+                        ),
+                        html.Div(
+                            dbc.Checklist(
+                                id='home-trend-cum',
+                                options=[{'label':' Show cumulative','value':'cum'}],
+                                value=[],
+                                switch=True
+                            ),
+                            className='mt-2'
+                        )
+                    ], className="h-100 d-flex flex-column justify-content-center"),
+                    md=6
+                ),
+            ], className='mb-3'),
+
+            dcc.Store(id='home-trend-store'),
+            dcc.Graph(
+                id='home-trend-chart',
+                config={'displayModeBar': False},
+                style={'height':'420px'}
             ),
-        ], className='mb-3'),
 
-        dcc.Graph(
-            id='home-trend-chart',
-            config={'displayModeBar': False},
-            style={'height':'420px'}
-        ),
+        ])),
+
+
+        # Correlations Card
+        dbc.Card(className='mb-4 shadow-sm', children=dbc.CardBody([
+            html.H4("Correlations 🔗", className='card-title'),
+            dbc.Row([
+                dbc.Col(html.Div([html.Label("Country"), dcc.Dropdown(id='home-corr-country',
+                    options=segments['Country'], value=['All'], multi=True, clearable=False)]), md=4),
+                dbc.Col(html.Div([html.Label("Gender"), dcc.Dropdown(id='home-corr-gender',
+                    options=segments['Gender'], value=['All'], multi=True, clearable=False)]), md=4),
+                dbc.Col(html.Div([html.Label("Occupation"), dcc.Dropdown(id='home-corr-occupation',
+                    options=segments['Occupation'], value=['All'], multi=True, clearable=False)]), md=4),
+            ], className='gy-3 mb-3'),
+            html.P("Filter by |r| threshold:", className='mb-2'),
+            dcc.Slider(
+                id='home-corr-thresh',
+                min=0, max=1, step=0.05, value=0,
+                marks={i/10:f"{i*10}%" for i in range(11)},
+                className='mb-3'
+            ),
+            dcc.Store(id='home-corr-store', data=corr_store),
+            dcc.Graph(
+                id='home-corr-heatmap',
+                config={'displayModeBar':False},
+                style={'height':'500px'}
+            )
+        ])),
 
-    ])),
+    ])
 
 
-    # Correlations Card
-    dbc.Card(className='mb-4 shadow-sm', children=dbc.CardBody([
-        html.H4("Correlations 🔗", className='card-title'),
-        html.P("Filter by |r| threshold:", className='mb-2'),
-        dcc.Slider(
-            id='home-corr-thresh',
-            min=0, max=1, step=0.05, value=0,
-            marks={i/10:f"{i*10}%" for i in range(11)},
-            className='mb-3'
-        ),
-        dcc.Graph(
-            id='home-corr-heatmap',
-            figure=fig_corr,
-            config={'displayModeBar':False},
-            style={'height':'500px'}
-        )
-    ])),
+# Appended rows (core.ingest) rebuild all of the above on the next visit
+for cached in (overview_stats, overview_figures, segment_options, build_layout):
+    on_data_change(cached.cache_clear)
 
-])
+
+# Segment filters re-sum the cube; the threshold stays client-side
+@callback(
+    Output('home-corr-store','data'),
+    Input('home-corr-country','value'),
+    Input('home-corr-gender','value'),
+    Input('home-corr-occupation','value'),
+    prevent_initial_call=True,
+)
+@snapshot(lambda: [(['All'], ['All'], ['All'])])
+@memoize
+def update_home_corr_store(countries, genders, occupations):
+    return {
+        'figure': update_home_corr(0, countries, genders, occupations),
+        'z': corr_matrix(countries, genders, occupations).values.tolist(),
+    }
 
 
 # Trend callback 
 @callback(
-    Output('home-trend-chart','figure'),
+    Output('home-trend-store','data'),
     Input('home-date-picker','start_date'),
     Input('home-date-picker','end_date'),
     Input('home-trend-agg','value'),
-    Input('home-trend-cum','value'),
 )
-def update_home_trend(s, e, freq, cum):
-    mask = (df['Timestamp'] >= s) & (df['Timestamp'] <= e)
-    ts = (
-        df.loc[mask]
-          .groupby(pd.Grouper(key='Timestamp', freq=freq))
-          .size()
-          .reset_index(name='count')
-    )
-
-    if 'cum' in cum:
-        ts['count'] = ts['count'].cumsum()
-        title = "Cumulative Records Over Time"
-    else:
-        title = "Records per Period Over Time"
-
-    fig = px.line(
-        ts, x='Timestamp', y='count',
-        title=title,
-        markers=True,
-        template="plotly_white"
-    )
-    fig.update_traces(line=dict(color='#636EFA', width=3))
-
-    area_trace = px.area(ts, x='Timestamp', y='count', template="plotly_white").data[0]
-    fig.add_trace(area_trace)
+@snapshot(lambda: [
+    (str(overview_stats()['first_ts']), str(overview_stats()['last_ts']), freq)
+    for freq in ('D', 'W', 'M')
+])
+@memoize
+def update_home_trend(s, e, freq):
+    with span('filter'):
+        ts = get_daily_counts().series(s, e, freq=freq)
+
+    # y stays a plain list: the clientside cumulative toggle sums it in place
+    with span('figure'):
+        fig = new_figure(
+            go.Scatter(
+                x=ts.index.strftime('%Y-%m-%d'), y=ts.values.tolist(),
+                mode='lines+markers',
+                fill='tozeroy',
+                line=dict(color=ACCENT, width=3),
+                name='count'
+            ),
+            title=dict(text="Records per Period Over Time", font_size=20),
+            margin=dict(t=60, b=40, l=40, r=40),
+            hovermode='x unified',
+            xaxis=dict(tickangle=-45),
+            yaxis_title='Count'
+        )
+    return fig
 
-    fig.update_layout(
-        title_font_size=20,
-        margin=dict(t=60, b=40, l=40, r=40),
-        hovermode='x unified'
-    )
-    fig.update_xaxes(
-        showgrid=True, gridcolor='lightgrey',
-        tickangle=-45, title=''
-    )
-    fig.update_yaxes(
-        showgrid=True, gridcolor='lightgrey',
-        title='Count'
-    )
 
-    return fig
+# Cumulative toggle runs in the browser on the stored per-period figure
+clientside_callback(
+    """
+    function(fig, cum) {
+        if (!fig) { return window.dash_clientside.no_update; }
+        if (!cum || cum.indexOf('cum') < 0) { return fig; }
+        const out = JSON.parse(JSON.stringify(fig));
+        let run = 0;
+        out.data[0].y = out.data[0].y.map(v => (run += v));
+        out.layout.title.text = 'Cumulative Records Over Time';
+        return out;
+    }
+    """,
+    Output('home-trend-chart','figure'),
+    Input('home-trend-store','data'),
+    Input('home-trend-cum','value'),
+)
 
 
-# Correlation callback
-@callback(
+# Correlation threshold is applied in the browser on the stored matrix
+clientside_callback(
+    """
+    function(t, store) {
+        if (!store) { return window.dash_clientside.no_update; }
+        const fig = JSON.parse(JSON.stringify(store.figure));
+        fig.data[0].z = store.z.map(
+            row => row.map(v => (v === null || v < t) ? null : v)
+        );
+        fig.layout.title.text = `Feature Correlations (|r| ≥ ${t.toFixed(2)})`;
+        return fig;
+    }
+    """,
     Output('home-corr-heatmap','figure'),
-    Input('home-corr-thresh','value')
+    Input('home-corr-thresh','value'),
+    Input('home-corr-store','data'),
 )
-def update_home_corr(t):
-    corr_mat = df_enc[numeric_cols].corr().abs()
-    masked   = corr_mat.mask(corr_mat < t)
-
-    fig = px.imshow(
-        masked,
-        text_auto=True,
-        aspect='auto',
-        color_continuous_scale='Blues',
-        title=f"Feature Correlations (|r| ≥ {t:.2f})",
-        template='plotly_white'
-    )
-    fig.update_layout(
-        margin=dict(l=40, t=40, b=20, r=20),
-        height=500
-    )
-    fig.update_xaxes(showgrid=True, gridcolor='lightgrey', tickangle=45)
-    fig.update_yaxes(showgrid=True, gridcolor='lightgrey')
-
-    return fig
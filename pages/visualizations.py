@@ -1,127 +1,186 @@
 import dash
-from dash import html, dcc, Input, Output, callback
+from dash import html, dcc, Input, Output, callback, no_update
 import dash_bootstrap_components as dbc
-import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
+
+from core import jobs, warmup
+from core.binning import fold_counts, fold_crosstab
+from core.dataset import dataset_cache, load_columns, on_data_change
+from core.figures import PALETTE, bar_figure, new_figure, typed
+from core.index import get_code_index
+from core.memo import memoize
+from core.metrics import span
+from core.sampling import approx_crosstab, approx_value_counts, get_sample, mark_approximate
+from core.snapshots import snapshot
+from core.timing import timed
+from core.weighted import engine_for, index_for
 
 dash.register_page(__name__, path='/visualizations', name='Visualizations')
 
-df = pd.read_csv('Mental Health Dataset.csv')
 
+def plot_counts(column, value_counts):
+    return counts_figure(column, fold_counts(column, value_counts))
 
-def plot_distribution(column, data_frame):
-    counts = data_frame[column].value_counts().reset_index()
-    counts.columns = [column, 'count']
-    fig = px.bar(
-        counts, x=column, y='count',
-        color=column,
+def counts_figure(column, counts, errors=None):
+    rotation = 45 if len(counts) > 8 else 0
+    fig = bar_figure(
+        counts.index, counts.values,
         title=f"Distribution of {column}",
-        hover_data={column: True, 'count': True},
-        color_discrete_sequence=px.colors.qualitative.Pastel,
-        template='plotly_white'
-    )
-    rotation = 45 if counts.shape[0] > 8 else 0
-    fig.update_layout(
-        xaxis_tickangle=rotation,
+        xaxis=dict(title=column, tickangle=rotation),
         yaxis_title="Count",
         margin=dict(t=60, b=50, l=40, r=20),
-        plot_bgcolor='white',
         showlegend=False
     )
-    fig.update_xaxes(showgrid=True, gridcolor='lightgrey')
-    fig.update_yaxes(showgrid=True, gridcolor='lightgrey')
+    if errors is not None:
+        fig.update_traces(error_y=dict(type='data', array=typed(errors.values)))
     return fig
 
-def plot_grouped_bar(x, hue, data_frame):
-    grouped = data_frame.groupby([x, hue]).size().reset_index(name='count')
-    fig = px.bar(
-        grouped, x=x, y='count',
-        color=hue, barmode='group',
-        title=f"Grouped Bar: {x} by {hue}",
-        hover_data={x: True, hue: True, 'count': True},
-        color_discrete_sequence=px.colors.qualitative.Pastel,
-        template='plotly_white'
-    )
+def plot_crosstab(x, hue, grouped):
+    return crosstab_figure(x, hue, fold_crosstab(x, hue, grouped))
+
+def crosstab_figure(x, hue, grouped):
+    # Grouping needs one trace per hue value; the arrays are still typed.
+    # Sampled estimates carry a 'ci' column, drawn as error bars.
+    traces = [
+        go.Bar(
+            x=part[x], y=typed(part['count'].values),
+            name=str(value), legendgroup=str(value),
+            marker_color=PALETTE[i % len(PALETTE)],
+            error_y=dict(type='data', array=typed(part['ci'].values)) if 'ci' in part else None,
+            hovertemplate=f"{x}=%{{x}}<br>{hue}={value}<br>count=%{{y}}<extra></extra>"
+        )
+        for i, (value, part) in enumerate(grouped.groupby(hue, sort=False, observed=True))
+    ]
     rotation = 45 if grouped[x].nunique() > 8 else 0
-    fig.update_layout(
-        xaxis_tickangle=rotation,
+    return new_figure(
+        traces,
+        title=f"Grouped Bar: {x} by {hue}",
+        barmode='group',
+        legend_title_text=hue,
+        xaxis=dict(title=x, tickangle=rotation),
         yaxis_title="Count",
         margin=dict(t=60, b=50, l=40, r=20)
     )
-    fig.update_xaxes(showgrid=True, gridcolor='lightgrey')
-    fig.update_yaxes(showgrid=True, gridcolor='lightgrey')
-    return fig
 
-# Dropdown options
-def make_opts(series):
-    vals = sorted(series.dropna().unique())
-    return [{'label':str(v), 'value':v} for v in vals]
+# Dropdown options (built on first page visit)
+def make_opts(column):
+    _, labels = get_code_index().codes(column)
+    return [{'label':'All','value':'All'}] + [{'label':str(v), 'value':v} for v in labels]
 
-country_opts    = [{'label':'All','value':'All'}] + make_opts(df['Country'])
-gender_opts     = [{'label':'All','value':'All'}] + make_opts(df['Gender'])
-treatment_opts  = [{'label':'All','value':'All'}] + make_opts(df['treatment'])
-occupation_opts = [{'label':'All','value':'All'}] + make_opts(df['Occupation'])
-selfemp_opts    = [{'label':'All','value':'All'}] + make_opts(df['self_employed'])
-family_opts     = [{'label':'All','value':'All'}] + make_opts(df['family_history'])
-column_opts     = [{'label':col, 'value':col} for col in df.columns]
+@dataset_cache
+@timed('visualizations: dropdown options')
+def dropdown_options():
+    return {
+        'country':    make_opts('Country'),
+        'gender':     make_opts('Gender'),
+        'treatment':  make_opts('treatment'),
+        'occupation': make_opts('Occupation'),
+        'selfemp':    make_opts('self_employed'),
+        'family':     make_opts('family_history'),
+        'column':     [{'label':col, 'value':col} for col in load_columns()],
+    }
 
 
 # Tabs content
 
 def distribution_tab():
+    opts = dropdown_options()
     return dbc.CardBody([
         dbc.Row([
             dbc.Col(html.Div([html.Label("Country"), dcc.Dropdown(id='filter-country',
-                options=country_opts, value=['All'], multi=True, clearable=False)]), width=4),
+                options=opts['country'], value=['All'], multi=True, clearable=False)]), width=4),
             dbc.Col(html.Div([html.Label("Gender"), dcc.Dropdown(id='filter-gender',
-                options=gender_opts, value=['All'], multi=True, clearable=False)]), width=4),
+                options=opts['gender'], value=['All'], multi=True, clearable=False)]), width=4),
             dbc.Col(html.Div([html.Label("Treatment"), dcc.Dropdown(id='filter-treatment',
-                options=treatment_opts, value=['All'], multi=True, clearable=False)]), width=4),
+                options=opts['treatment'], value=['All'], multi=True, clearable=False)]), width=4),
         ], className="gy-3 mb-3"),
         dbc.Row([
             dbc.Col(html.Div([html.Label("Occupation"), dcc.Dropdown(id='filter-occupation',
-                options=occupation_opts, value=['All'], multi=True, clearable=False)]), width=4),
+                options=opts['occupation'], value=['All'], multi=True, clearable=False)]), width=4),
             dbc.Col(html.Div([html.Label("Self-Employed"), dcc.Dropdown(id='filter-self-employed',
-                options=selfemp_opts, value=['All'], multi=True, clearable=False)]), width=4),
+                options=opts['selfemp'], value=['All'], multi=True, clearable=False)]), width=4),
             dbc.Col(html.Div([html.Label("Family History"), dcc.Dropdown(id='filter-family-history',
-                options=family_opts, value=['All'], multi=True, clearable=False)]), width=4),
+                options=opts['family'], value=['All'], multi=True, clearable=False)]), width=4),
         ], className="gy-3 mb-3"),
         html.Div([html.Label("Select Column"), dcc.Dropdown(
-            id='dist-column-dropdown', options=column_opts,
+            id='dist-column-dropdown', options=opts['column'],
             value='Days_Indoors', clearable=False
         )], className="mb-4"),
+        dcc.Store(id='dist-pending'),
         dcc.Graph(id='dist-graph', config={'displayModeBar':False})
     ])
 
 def grouped_bar_tab():
+    opts = dropdown_options()
     return dbc.CardBody([
         dbc.Row([
             dbc.Col(html.Div([html.Label("X-Axis"), dcc.Dropdown(
-                id='group-x', options=column_opts, value='Country', clearable=False
+                id='group-x', options=opts['column'], value='Country', clearable=False
             )]), width=6),
             dbc.Col(html.Div([html.Label("Hue"), dcc.Dropdown(
-                id='group-hue', options=column_opts, value='Gender', clearable=False
+                id='group-hue', options=opts['column'], value='Gender', clearable=False
             )]), width=6),
-        ], className="gy-3 mb-4"),
+        ], className="gy-3 mb-2"),
+        html.Small("Filters from the Distribution tab apply here too.",
+                   className="text-muted d-block mb-4"),
+        dcc.Store(id='group-pending'),
         dcc.Graph(id='grouped-bar-chart', config={'displayModeBar':False})
     ])
 
 
 # Layout with Tabs
-layout = dbc.Container(fluid=True, className='py-4', children=[
-    html.H2("Interactive Visualizations", className='text-center mb-4'),
+def layout(**kwargs):
+    return build_layout()
 
-    dbc.Tabs([
-        dbc.Tab(distribution_tab(), label="Distribution", tab_id="tab-dist"),
-        dbc.Tab(grouped_bar_tab(),   label="Grouped Bar",   tab_id="tab-group"),
-    ], id="vis-tabs", active_tab="tab-dist")
-])
+@dataset_cache
+@snapshot()
+@timed('visualizations: layout')
+def build_layout():
+    return dbc.Container(fluid=True, className='py-4', children=[
+        html.H2("Interactive Visualizations", className='text-center mb-4'),
+
+        dbc.Tabs([
+            dbc.Tab(distribution_tab(), label="Distribution", tab_id="tab-dist"),
+            dbc.Tab(grouped_bar_tab(),   label="Grouped Bar",   tab_id="tab-group"),
+        ], id="vis-tabs", active_tab="tab-dist")
+    ])
+
+
+# New labels from appended rows show up in the dropdowns on the next visit
+on_data_change(dropdown_options.cache_clear)
+on_data_change(build_layout.cache_clear)
 
 
 # Callbacks
 
+def filter_mask(index, countries, genders, treatments, occupations, selfemps, fam_hist):
+    return index.mask({
+        'Country':        countries,
+        'Gender':         genders,
+        'treatment':      treatments,
+        'Occupation':     occupations,
+        'self_employed':  selfemps,
+        'family_history': fam_hist,
+    })
+
+
+# Filtered views on a large dataset answer first from the stratified
+# sample (core.sampling); the pending store then starts the exact figure
+# as a background job (core.jobs), so a newer filter change cancels the
+# one still computing instead of queueing. Cached or unfiltered results,
+# and datasets below SAMPLE_MIN_ROWS, are exact in one round trip: their
+# counts take milliseconds, far less than a job's fork and polling.
+# A finished job primes this worker's memo with its figure.
+
+def preview_sample(filters):
+    if all(values is None or 'All' in values for values in filters):
+        return None
+    return get_sample()
+
+
 @callback(
     Output('dist-graph','figure'),
+    Output('dist-pending','data'),
     Input('filter-country','value'),
     Input('filter-gender','value'),
     Input('filter-treatment','value'),
@@ -130,27 +189,114 @@ layout = dbc.Container(fluid=True, className='py-4', children=[
     Input('filter-family-history','value'),
     Input('dist-column-dropdown','value'),
 )
+def preview_distribution(*args):
+    exact = update_distribution.peek(*args)
+    if exact is None and preview_sample(args[:6]) is not None:
+        return approx_distribution(*args), list(args)
+    return exact if exact is not None else update_distribution(*args), no_update
+
+
+@callback(
+    Output('dist-graph','figure', allow_duplicate=True),
+    Input('dist-pending','data'),
+    prevent_initial_call=True,
+    background=True,
+    interval=250,
+    running=[(Output('dist-graph','style'), {'opacity': 0.5}, {'opacity': 1})],
+)
+def finish_distribution(args):
+    return update_distribution(*args)
+
+
+jobs.on_result(finish_distribution, lambda fig, args: update_distribution.prime(fig, *args))
+
+
+@memoize
+def approx_distribution(countries, genders, treatments, occupations, selfemps, fam_hist, column):
+    with span('filter'):
+        sample = get_sample()
+        mask = filter_mask(sample.index, countries, genders, treatments, occupations, selfemps, fam_hist)
+        counts, errors = approx_value_counts(sample, column, mask)
+    with span('figure'):
+        return mark_approximate(counts_figure(column, counts, errors), sample)
+
+
+# Unfiltered distributions of every column are pre-rendered (core.snapshots)
+@snapshot(lambda: [(['All'],) * 6 + (column,) for column in load_columns()])
+@memoize
 def update_distribution(countries, genders, treatments, occupations, selfemps, fam_hist, column):
-    dff = df.copy()
-    if 'All' not in countries:
-        dff = dff[dff['Country'].isin(countries)]
-    if 'All' not in genders:
-        dff = dff[dff['Gender'].isin(genders)]
-    if 'All' not in treatments:
-        dff = dff[dff['treatment'].isin(treatments)]
-    if 'All' not in occupations:
-        dff = dff[dff['Occupation'].isin(occupations)]
-    if 'All' not in selfemps:
-        dff = dff[dff['self_employed'].isin(selfemps)]
-    if 'All' not in fam_hist:
-        dff = dff[dff['family_history'].isin(fam_hist)]
-    return plot_distribution(column, dff)
+    with span('filter'):
+        index = index_for(column)
+        mask = filter_mask(index, countries, genders, treatments, occupations, selfemps, fam_hist)
+        counts = index.value_counts(column, mask)
+    with span('figure'):
+        return plot_counts(column, counts)
 
 
 @callback(
     Output('grouped-bar-chart','figure'),
+    Output('group-pending','data'),
     Input('group-x','value'),
-    Input('group-hue','value')
+    Input('group-hue','value'),
+    Input('filter-country','value'),
+    Input('filter-gender','value'),
+    Input('filter-treatment','value'),
+    Input('filter-occupation','value'),
+    Input('filter-self-employed','value'),
+    Input('filter-family-history','value'),
 )
-def update_grouped_bar(x, hue):
-    return plot_grouped_bar(x, hue, df)
+def preview_grouped_bar(*args):
+    exact = update_grouped_bar.peek(*args)
+    if exact is None and args[0] != args[1] and preview_sample(args[2:]) is not None:
+        return approx_grouped_bar(*args), list(args)
+    return exact if exact is not None else update_grouped_bar(*args), no_update
+
+
+@callback(
+    Output('grouped-bar-chart','figure', allow_duplicate=True),
+    Input('group-pending','data'),
+    prevent_initial_call=True,
+    background=True,
+    interval=250,
+    running=[(Output('grouped-bar-chart','style'), {'opacity': 0.5}, {'opacity': 1})],
+)
+def finish_grouped_bar(args):
+    return update_grouped_bar(*args)
+
+
+jobs.on_result(finish_grouped_bar, lambda fig, args: update_grouped_bar.prime(fig, *args))
+
+
+@memoize
+def approx_grouped_bar(x, hue, countries, genders, treatments, occupations, selfemps, fam_hist):
+    with span('filter'):
+        sample = get_sample()
+        mask = filter_mask(sample.index, countries, genders, treatments, occupations, selfemps, fam_hist)
+        grouped = approx_crosstab(sample, x, hue, mask)
+    with span('figure'):
+        fig = crosstab_figure(x, hue, grouped)
+        return mark_approximate(fig, sample)
+
+
+@snapshot(lambda: [('Country', 'Gender') + (['All'],) * 6])
+@memoize
+def update_grouped_bar(x, hue, countries=('All',), genders=('All',), treatments=('All',),
+                       occupations=('All',), selfemps=('All',), fam_hist=('All',)):
+    with span('filter'):
+        # one engine and its index per call, in case new rows land meanwhile
+        engine = engine_for(x, hue)
+        mask = filter_mask(engine.index, countries, genders, treatments, occupations, selfemps, fam_hist)
+        if x == hue:
+            counts = engine.index.value_counts(x, mask)
+        else:
+            grouped = engine.counts(x, hue, mask)
+    with span('figure'):
+        if x == hue:
+            return plot_counts(x, counts)
+        return plot_crosstab(x, hue, grouped)
+
+
+# Every unfiltered pair is computed at startup when WARMUP_SECONDS is set
+warmup.register(update_grouped_bar, lambda: [
+    (x, hue) + (['All'],) * 6 for x in load_columns() for hue in load_columns() if x != hue
+])
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# read by core.dataset at import; keep test builds out of the working tree
+os.environ.setdefault('DATASET_CACHE_DIR', tempfile.mkdtemp(prefix='dataset-cache-'))
+
+from bench.synthetic import FALLBACK_SCHEMA  # noqa: E402
+
+
+def survey_frame(n, seed=0, patterns=None, missing=0.02):
+    """``n`` survey rows with a few missing answers.
+
+    With ``patterns`` the answers repeat: every row copies one of that
+    many distinct answer rows (timestamps stay distinct).
+    """
+    rng = np.random.default_rng(seed)
+    m = patterns or n
+    answers = {
+        col: rng.choice(np.array(values, dtype=object), m)
+        for col, values in FALLBACK_SCHEMA.items()
+    }
+    for col in ('self_employed', 'Occupation', 'Mood_Swings'):
+        answers[col][rng.random(m) < missing] = None
+    pick = rng.integers(0, m, n) if patterns else np.arange(n)
+    minutes = np.sort(rng.integers(0, 60 * 24 * 90, n))
+    data = {'Timestamp': pd.Timestamp('2014-08-27') + pd.to_timedelta(minutes, unit='m')}
+    data.update({col: values[pick] for col, values in answers.items()})
+    return pd.DataFrame(data)
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """Write a frame as a survey CSV and return its path."""
+    count = iter(range(1000))
+
+    def write(frame, name=None):
+        path = str(tmp_path / (name or f"survey-{next(count)}.csv"))
+        frame.to_csv(path, index=False, date_format='%m/%d/%Y %H:%M')
+        return path
+
+    return write
+
+
+@pytest.fixture
+def survey_csv(write_csv):
+    return write_csv(survey_frame(500))
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from core import binning
+from core.binning import OTHER, fold_counts, fold_crosstab
+from core.dataset import load_dataset
+
+
+def timestamp_counts(path):
+    return load_dataset(path)['Timestamp'].value_counts().sort_index()
+
+
+def test_datetime_axis_uses_time_bins(survey_csv, monkeypatch):
+    counts = timestamp_counts(survey_csv)
+    # the fixture spans 90 days: daily bins fit the default 120
+    daily = fold_counts('Timestamp', counts)
+    assert len(daily) > binning.MAX_CATEGORIES
+    assert daily.sum() == counts.sum()
+    assert daily.to_dict() == counts.groupby(counts.index.normalize()).sum().to_dict()
+
+    monkeypatch.setattr(binning, 'MAX_TIME_BINS', 10)
+    monthly = fold_counts('Timestamp', counts)
+    assert len(monthly) <= 10
+    assert monthly.sum() == counts.sum()
+
+
+def test_folded_bin_never_merges_with_a_real_label():
+    counts = pd.Series([50, 40, 30, 20, 10], index=['a', OTHER, 'b', 'c', 'd'], name='count')
+    folded = fold_counts('col', counts, max_values=3)
+    assert folded.to_dict() == {'a': 50, OTHER: 40, f"{OTHER} (3 more)": 60}
+
+
+def test_fold_crosstab_keeps_totals(survey_csv):
+    frame = load_dataset(survey_csv)
+    grouped = frame.groupby(['Country', 'Gender'], observed=True).size().reset_index(name='count')
+    folded = fold_crosstab('Country', 'Gender', grouped, max_x=4, max_hue=12)
+    assert folded['Country'].nunique() == 4
+    assert folded['count'].sum() == grouped['count'].sum()
+    by_gender = folded.groupby('Gender')['count'].sum()
+    assert by_gender.to_dict() == frame['Gender'].value_counts().to_dict()
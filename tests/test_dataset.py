@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+
+from core import dataset
+from core.dataset import load_columns, load_dataset
+from conftest import survey_frame
+
+
+def assert_same_rows(frame, expected):
+    assert list(frame.columns) == list(expected.columns)
+    for c in expected.columns:
+        got = frame[c].astype(object).where(frame[c].notna(), None)
+        want = expected[c].astype(object).where(expected[c].notna(), None)
+        assert got.tolist() == want.tolist(), c
+
+
+def test_columns_round_trip(survey_csv):
+    assert_same_rows(load_dataset(survey_csv), dataset.parse_csv(survey_csv))
+
+
+def test_chunked_build_reads_columns_like_the_whole_file(write_csv, monkeypatch):
+    frame = survey_frame(100, seed=8)
+    # numbers in the first chunks, text only further down
+    frame['Age'] = [str(20 + i % 30) for i in range(70)] + ['unknown'] * 30
+    frame['Score'] = np.where(np.arange(100) % 7 == 0, np.nan, np.arange(100) * 0.5)
+    path = write_csv(frame)
+    monkeypatch.setattr(dataset, 'DATASET_CHUNK_ROWS', 16)
+    columns = load_columns(path)
+    assert columns['Age']['kind'] == 'category'
+    assert columns['Score']['kind'] == 'numeric'
+    assert_same_rows(load_dataset(path), dataset.parse_csv(path))
+
+
+def test_cache_is_published_through_a_symlink(write_csv):
+    path = write_csv(survey_frame(50, seed=1))
+    target = dataset._cache_dir_for(path)
+    builds = []
+    for seed in (1, 2, 3):
+        survey_frame(50, seed=seed).to_csv(path, index=False)
+        os.utime(path, ns=(seed, seed))
+        builds.append(dataset.ensure_cache(path)['dir'])
+
+    assert os.path.islink(target)
+    assert os.path.realpath(target) == builds[-1]
+    # the build just replaced stays for readers still on it; older ones go
+    assert os.path.isdir(builds[-2])
+    assert not os.path.exists(builds[0])
+
+    meta = dataset._read_meta(path)
+    assert meta['dir'] == builds[-1]
+    columns = dataset._columns_from_cache(path, meta)
+    assert len(columns['Gender']['values']) == 50
+
+
+def test_reader_keeps_its_build_across_a_swap(write_csv):
+    path = write_csv(survey_frame(40, seed=4))
+    meta = dataset.ensure_cache(path)
+    survey_frame(60, seed=5).to_csv(path, index=False)
+    dataset.ensure_cache(path)
+    # files still come from the build the reader resolved first
+    columns = dataset._columns_from_cache(path, meta)
+    assert len(columns['Country']['values']) == 40
+    load_columns.discard(path)
+    assert len(load_columns(path)['Country']['values']) == 60
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from core import crosstab
+from core.dataset import load_columns, load_dataset
+from core.index import FILTER_COLS, CodeIndex
+
+SELECTIONS = [
+    {},
+    {'Country': ['India', 'Canada'], 'Gender': ['Male']},
+    {'treatment': ['Yes'], 'Occupation': ['Student', 'Others'], 'self_employed': ['No']},
+    {'family_history': ['All'], 'Country': ['Germany']},
+    {'Gender': []},
+    {'Country': ['Atlantis']},
+]
+
+
+def baseline(frame, selection):
+    # the original page: chained isin() filters, skipped for 'All'
+    for column, values in selection.items():
+        if 'All' not in values:
+            frame = frame[frame[column].isin(values)]
+    return frame
+
+
+def as_dict(counts):
+    return {k: int(v) for k, v in counts.items() if v}
+
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+def test_value_counts_match_pandas(survey_csv, selection):
+    index = CodeIndex(load_columns(survey_csv))
+    frame = baseline(load_dataset(survey_csv), selection)
+    mask = index.mask(selection)
+    for column in load_columns(survey_csv):
+        got = index.value_counts(column, mask)
+        assert as_dict(got) == as_dict(frame[column].value_counts()), column
+        assert list(got.values) == sorted(got.values, reverse=True)
+
+
+def test_empty_selection_matches_nothing(survey_csv):
+    index = CodeIndex(load_columns(survey_csv))
+    assert index.value_counts('Gender', index.mask({'Country': []})).empty
+    assert index.mask({'Country': None}) is None
+    assert index.mask({'Country': ['All', 'India']}) is None
+
+
+def test_missing_counts(survey_csv):
+    index = CodeIndex(load_columns(survey_csv))
+    frame = load_dataset(survey_csv)
+    for column in FILTER_COLS:
+        assert index.missing_count(column) == int(frame[column].isna().sum())
+    assert index.n_records == index.n_rows == len(frame)
+    assert np.array_equal(index.unpack(index.mask({'Gender': ['Male']})),
+                          (frame['Gender'] == 'Male').to_numpy())
+
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+def test_crosstab_matches_pandas(survey_csv, monkeypatch, selection):
+    monkeypatch.setattr(crosstab, 'CROSSTAB_CHUNK_ROWS', 64)
+    index = CodeIndex(load_columns(survey_csv))
+    engine = crosstab.CrosstabEngine(index)
+    frame = baseline(load_dataset(survey_csv), selection)
+    for x, hue in [('Country', 'Gender'), ('Occupation', 'Mood_Swings')]:
+        got = engine.counts(x, hue, index.mask(selection)).set_index([x, hue])['count']
+        assert as_dict(got) == as_dict(frame.groupby([x, hue], observed=True).size())
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import survey_frame
+from core.dataset import load_columns, parse_csv
+from core.encoding import ord_mappings
+from core.index import FILTER_COLS, CodeIndex, get_code_index
+from core.ingest import ingest
+from core.moments import get_moment_cube
+from core.timeseries import get_daily_counts
+from core.weighted import WeightedRows, get_weighted_rows
+from test_index import SELECTIONS, as_dict, baseline
+
+
+def append(path, frame):
+    frame.to_csv(path, mode='a', header=False, index=False, date_format='%m/%d/%Y %H:%M')
+
+
+@pytest.fixture
+def appended(write_csv):
+    """A loaded survey of 501 rows, then 502 appended rows with new labels."""
+    frame = survey_frame(1003, seed=5)
+    frame.loc[700:710, 'Country'] = 'Atlantis'
+    frame.loc[900:, 'Occupation'] = 'Astronaut'
+    path = write_csv(frame.iloc[:501])
+    # built before the append, so ingest extends them
+    get_code_index(path), get_daily_counts(path), get_moment_cube(path)
+    append(path, frame.iloc[501:])
+    assert ingest(path) == 502
+    return path
+
+
+def test_bitsets_match_a_fresh_index(appended):
+    index = get_code_index(appended)
+    fresh = CodeIndex(load_columns(appended))
+    assert index.n_rows == 1003
+    for column in FILTER_COLS:
+        assert index.bitsets[column].keys() == fresh.bitsets[column].keys()
+        for label, bits in fresh.bitsets[column].items():
+            assert np.array_equal(index.bitsets[column][label], bits), (column, label)
+
+
+@pytest.mark.parametrize('selection', SELECTIONS + [{'Country': ['Atlantis'], 'Occupation': ['Astronaut', 'Student']}])
+def test_ingested_counts_match_pandas(appended, selection):
+    index = get_code_index(appended)
+    frame = baseline(parse_csv(appended), selection)
+    mask = index.mask(selection)
+    for column in FILTER_COLS + ['Days_Indoors']:
+        assert as_dict(index.value_counts(column, mask)) == as_dict(frame[column].value_counts()), column
+
+
+def test_ingested_aggregates_match_pandas(appended):
+    frame = parse_csv(appended)
+    daily = get_daily_counts(appended).series()
+    expected = frame.groupby(pd.Grouper(key='Timestamp', freq='D')).size()
+    assert daily.tolist() == expected.tolist()
+
+    cube = get_moment_cube(appended)
+    encoded = pd.DataFrame({
+        n: frame[n].astype(object).map(ord_mappings[n]).astype(float) for n in cube.names
+    })
+    assert cube.n_rows == len(frame)
+    np.testing.assert_allclose(cube.moments().corr().values, encoded.corr().values,
+                               atol=1e-9, equal_nan=True)
+
+
+def test_rewrite_before_the_first_poll_is_not_ingested(write_csv):
+    frame = survey_frame(300, seed=6)
+    path = write_csv(frame)
+    n_rows = len(load_columns(path)['Country']['values'])
+    # rewritten in place, then grown, before the watcher ever looked
+    edited = frame.copy()
+    edited.loc[299, 'Country'] = 'Atlantis' if frame.loc[299, 'Country'] != 'Atlantis' else 'India'
+    write_csv(pd.concat([edited, survey_frame(20, seed=7)]), name=path.rsplit('/', 1)[1])
+    assert ingest(path) == 0
+    assert len(load_columns(path)['Country']['values']) == n_rows
+
+
+def test_ingest_keeps_the_decision_not_to_deduplicate(write_csv, monkeypatch):
+    frame = survey_frame(600, seed=8)
+    path = write_csv(frame.iloc[:400])
+    get_code_index(path), get_daily_counts(path), get_moment_cube(path)
+    # every row distinct, so the rows are not worth deduplicating
+    assert get_weighted_rows(path) is None
+    append(path, frame.iloc[400:])
+    assert ingest(path) == 200
+    monkeypatch.setattr(WeightedRows, 'build', pytest.fail)
+    assert get_weighted_rows(path) is None
@@ -0,0 +1,55 @@
+import json
+
+from core import jobs, profiling
+from core.jobs import JobManager
+
+
+def count_rows(args):
+    return {'rows': sum(args)}
+
+
+def failing(args):
+    raise ValueError('no rows')
+
+
+def run_job(manager, fn, args):
+    job_fn = manager.make_job_fn(fn, progress=False)
+    key = f"key-{fn.__name__}"
+    # what a forked job process does, run here
+    job_fn(key, manager._make_progress_key(key), [args], {})
+    return manager.get_result(key, None)
+
+
+def test_result_hook_gets_the_output_and_inputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, '_result_hooks', {})
+    seen = []
+    jobs.on_result(count_rows, lambda output, args: seen.append((output, args)))
+    manager = JobManager(directory=str(tmp_path), workers=1)
+    assert run_job(manager, count_rows, [1, 2, 3]) == {'rows': 6}
+    assert seen == [({'rows': 6}, [1, 2, 3])]
+    # collected once; nothing left behind without cache_by
+    assert manager.get_result('key-count_rows', None) is manager.UNDEFINED
+
+
+def test_failed_jobs_skip_the_hook(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, '_result_hooks', {})
+    seen = []
+    jobs.on_result(failing, lambda output, args: seen.append(output))
+    manager = JobManager(directory=str(tmp_path), workers=1)
+    result = run_job(manager, failing, [1])
+    assert result['background_callback_error']['msg'] == 'no rows'
+    assert seen == []
+
+
+def test_requested_capture_profiles_the_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+    manager = JobManager(directory=str(tmp_path / 'jobs'), workers=1)
+    job_fn = manager.make_job_fn(count_rows, progress=False)
+    capture = {'callback': 'rows.children', 'inputs': [[1, 2]], 'input_ids': ['rows.value']}
+    job_fn('key', manager._make_progress_key('key'), [[1, 2]], {}, profile=capture)
+    assert manager.get_result('key', None) == {'rows': 3}
+    name = profiling.capture_id('rows.children.job', [[1, 2]])
+    with open(tmp_path / 'profiles' / f"{name}.json") as fh:
+        meta = json.load(fh)
+    assert meta['job'] and meta['status'] == 'ok'
+    assert (tmp_path / 'profiles' / f"{name}.pstats").exists()
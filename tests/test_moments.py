@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.dataset import load_columns, load_dataset
+from core.encoding import numeric_columns, ord_mappings
+from core.moments import MomentCube
+from test_index import baseline
+
+SELECTIONS = [
+    {},
+    {'Country': ['India', 'Canada']},
+    {'Gender': ['Female'], 'Occupation': ['Student', 'Others']},
+    {'Country': ['All'], 'Gender': ['Male']},
+]
+
+
+def encoded(frame, names):
+    # the original heatmap: ordinal answers mapped to numbers, then corr()
+    return pd.DataFrame({n: frame[n].astype(object).map(ord_mappings[n]).astype(float) for n in names})
+
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+def test_cube_correlation_matches_pandas(survey_csv, selection):
+    columns = load_columns(survey_csv)
+    names = numeric_columns(columns)
+    cube = MomentCube.build(columns, names)
+    expected = encoded(baseline(load_dataset(survey_csv), selection), names).corr()
+    got = cube.moments(selection).corr()
+    assert list(got.columns) == list(expected.columns)
+    np.testing.assert_allclose(got.values, expected.values, atol=1e-9, equal_nan=True)
+
+
+def test_empty_selection_has_no_rows(survey_csv):
+    columns = load_columns(survey_csv)
+    cube = MomentCube.build(columns, numeric_columns(columns))
+    assert not cube.moments({'Gender': []}).n.any()
+    assert cube.moments().n.max() == cube.n_rows == len(load_dataset(survey_csv))
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from conftest import survey_frame
+from core.dataset import load_columns, load_dataset
+from core.index import CodeIndex
+from core.sampling import StratifiedSample, approx_crosstab, approx_value_counts
+from test_index import SELECTIONS, as_dict, baseline
+
+
+@pytest.fixture
+def large_csv(write_csv):
+    return write_csv(survey_frame(5000, seed=9))
+
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+def test_full_sample_is_exact(survey_csv, selection):
+    index = CodeIndex(load_columns(survey_csv))
+    sample = StratifiedSample(index, fraction=1.0)
+    frame = baseline(load_dataset(survey_csv), selection)
+    mask = sample.index.mask(selection)
+    counts, ci = approx_value_counts(sample, 'Occupation', mask)
+    assert as_dict(counts) == as_dict(frame['Occupation'].value_counts())
+    assert not ci.any()
+    grouped = approx_crosstab(sample, 'Gender', 'treatment', mask).set_index(['Gender', 'treatment'])
+    assert as_dict(grouped['count']) == as_dict(frame.groupby(['Gender', 'treatment'], observed=True).size())
+
+
+def test_strata_totals_are_exact(large_csv):
+    sample = StratifiedSample(CodeIndex(load_columns(large_csv)), fraction=0.05)
+    counts, _ = approx_value_counts(sample, 'Country')
+    assert as_dict(counts) == as_dict(load_dataset(large_csv)['Country'].value_counts())
+    assert len(sample.rows) < 5000 * 0.1
+
+
+@pytest.mark.parametrize('column', ['Mood_Swings', 'Days_Indoors', 'Occupation'])
+def test_estimates_fall_within_their_intervals(large_csv, column):
+    sample = StratifiedSample(CodeIndex(load_columns(large_csv)), fraction=0.05)
+    selection = {'Gender': ['Female']}
+    counts, ci = approx_value_counts(sample, column, sample.index.mask(selection))
+    exact = baseline(load_dataset(large_csv), selection)[column].value_counts()
+    error = np.abs(counts - exact.reindex(counts.index).fillna(0))
+    # 95% intervals; allow a few of the smaller groups to miss
+    assert (error <= ci).mean() >= 0.6
+    assert (error <= 2 * ci + 1).all()
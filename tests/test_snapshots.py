@@ -0,0 +1,20 @@
+from core import snapshots
+from core.dataset import use_dataset
+
+
+def test_snapshots_follow_the_code_version(survey_csv, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, 'registry', {})
+
+    @snapshots.snapshot(lambda: [('Gender',)])
+    def view(column):
+        return {'column': column}
+
+    name = f"{view.__module__}.{view.__qualname__}"
+    out = str(tmp_path / 'snapshots')
+    with use_dataset(survey_csv):
+        manifest = snapshots.build(out)
+        assert manifest['code'] == snapshots.code_version()
+        assert snapshots.lookup(name, ('Gender',), directory=out) == {'column': 'Gender'}
+        # a deploy with other layout or figure code on the same data
+        monkeypatch.setattr(snapshots, 'code_version', lambda: 'other-code')
+        assert snapshots.lookup(name, ('Gender',), directory=out) is None
@@ -0,0 +1,22 @@
+import numpy as np
+
+from conftest import survey_frame
+from core import streaming
+from core.dataset import load_columns, load_dataset
+from core.index import FILTER_COLS, CodeIndex
+from test_index import as_dict
+
+
+def test_scan_matches_whole_column_builds(write_csv):
+    path = write_csv(survey_frame(1001, seed=11))
+    index, daily, engine, cube = streaming.scan(path, chunk_rows=61)
+    fresh = CodeIndex(load_columns(path))
+    frame = load_dataset(path)
+    for column in FILTER_COLS:
+        for label, bits in fresh.bitsets[column].items():
+            assert np.array_equal(index.bitsets[column][label], bits), (column, label)
+        assert as_dict(index.value_counts(column)) == as_dict(frame[column].value_counts())
+    got = engine.counts('Country', 'Gender').set_index(['Country', 'Gender'])['count']
+    assert as_dict(got) == as_dict(frame.groupby(['Country', 'Gender'], observed=True).size())
+    assert daily.n_dated == len(frame)
+    assert cube.n_rows == len(frame)
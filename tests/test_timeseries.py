@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.dataset import load_columns, load_dataset
+from core.timeseries import NAT, DailyCounts
+from conftest import survey_frame
+
+
+def baseline(frame, freq):
+    # the original trend: a groupby on pd.Grouper over the rows
+    return frame.groupby(pd.Grouper(key='Timestamp', freq=freq)).size()
+
+
+@pytest.fixture
+def frame_with_nat(write_csv):
+    frame = survey_frame(400, seed=3)
+    frame.loc[[0, 57, 399], 'Timestamp'] = pd.NaT
+    return write_csv(frame)
+
+
+@pytest.mark.parametrize('freq', ['D', 'W', 'M'])
+def test_series_matches_grouper(frame_with_nat, freq):
+    frame = load_dataset(frame_with_nat)
+    daily = DailyCounts.from_timestamps(load_columns(frame_with_nat)['Timestamp']['values'])
+    expected = baseline(frame, {'M': 'ME'}.get(freq, freq))
+    got = daily.series(freq=freq)
+    assert got.tolist() == expected.tolist()
+    assert list(got.index) == list(expected.index)
+
+
+def test_missing_timestamps_are_not_counted(frame_with_nat):
+    values = load_columns(frame_with_nat)['Timestamp']['values']
+    assert (np.asarray(values) == NAT).sum() == 3
+    daily = DailyCounts.from_timestamps(values)
+    assert daily.n_dated == 397
+    assert daily.first_date == load_dataset(frame_with_nat)['Timestamp'].min().date()
+
+
+def test_extended_skips_missing_timestamps():
+    ts = pd.to_datetime(['2014-08-27 10:00', '2014-08-29 09:00']).values.view('int64')
+    daily = DailyCounts.from_timestamps(ts)
+    more = daily.extended(np.array([NAT, ts[1] + 86_400 * 10**9], dtype=np.int64))
+    assert more.series(freq='D').tolist() == [1, 0, 1, 1]
+
+
+def test_no_timestamps():
+    daily = DailyCounts.from_timestamps(np.array([NAT, NAT], dtype=np.int64))
+    assert daily.n_dated == 0 and daily.first_date is None
+    assert daily.series().empty
+    assert daily.extended(np.array([0], dtype=np.int64)).n_dated == 1
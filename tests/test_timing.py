@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from core import timing
+from core.timing import phase
+
+
+@pytest.fixture
+def recording(monkeypatch):
+    monkeypatch.setattr(timing, 'startup_phases', [])
+    monkeypatch.setattr(timing, '_recording', [True])
+    return timing
+
+
+def test_nested_depths_per_thread(recording):
+    entered = threading.Barrier(2)
+
+    def work(name):
+        with phase(name):
+            entered.wait()
+            with phase(f"{name}/inner"):
+                entered.wait()
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in ('a', 'b')]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    depths = {name: depth for name, depth, _ in recording.startup_phases}
+    assert depths == {'a': 0, 'b': 0, 'a/inner': 1, 'b/inner': 1}
+    assert all(elapsed is not None for _, _, elapsed in recording.startup_phases)
+
+
+def test_recording_stops_after_the_report(recording):
+    with phase('startup'):
+        pass
+    recording.log_startup_report()
+    for _ in range(3):
+        with phase('reload'):
+            pass
+    assert [name for name, _, _ in recording.startup_phases] == ['startup']
@@ -0,0 +1,32 @@
+import importlib
+import os
+
+import dash
+import pytest
+
+from conftest import ROOT
+from core import warmup
+from core.dataset import use_dataset
+from core.memo import memoized, result_cache
+
+
+@pytest.fixture(scope='module')
+def visualizations():
+    # pages register themselves, so they import only under a use_pages app
+    dash.Dash(__name__, use_pages=True, pages_folder=os.path.join(ROOT, 'pages'))
+    yield importlib.import_module('pages.visualizations')
+    result_cache.clear()
+
+
+def test_warmed_pairs_are_peeked_with_the_callback_inputs(visualizations, survey_csv):
+    func = visualizations.update_grouped_bar
+    name = f"{func.__module__}.{func.__qualname__}"
+    with use_dataset(survey_csv):
+        planned = [args for n, args in warmup.plan(log_path=None) if n == name]
+        assert ('Gender', 'Country') + (['All'],) * 6 in planned
+        for args in planned:
+            memoized[name].prime(('warm',) + args[:2], *args)
+        # the grouped-bar tab sends both dropdowns and six ['All'] filters
+        callback_args = ('Gender', 'Country') + (['All'],) * 6
+        assert func.peek(*callback_args) == ('warm', 'Gender', 'Country')
+        assert visualizations.preview_grouped_bar(*callback_args)[0] == ('warm', 'Gender', 'Country')
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import survey_frame
+from core import weighted
+from core.crosstab import CrosstabEngine
+from core.dataset import load_columns, load_dataset
+from core.encoding import numeric_columns, ord_mappings
+from core.index import FILTER_COLS, CodeIndex
+from core.moments import MomentCube
+from core.weighted import WeightedRows
+from test_index import SELECTIONS, as_dict, baseline
+
+DATASETS = {
+    'repeated': dict(n=2000, patterns=40),
+    # fewer distinct rows than category columns
+    'tiny': dict(n=40, patterns=3),
+}
+
+
+@pytest.fixture(params=list(DATASETS), ids=list(DATASETS))
+def repeated_csv(request, write_csv, monkeypatch):
+    # small passes, so rows merge across several add_rows calls
+    monkeypatch.setattr(weighted, 'WEIGHTED_CHUNK_ROWS', 7)
+    return write_csv(survey_frame(**DATASETS[request.param]))
+
+
+def weighted_index(path):
+    rows = WeightedRows.build(load_columns(path))
+    return rows, CodeIndex(rows.columns, [c for c in FILTER_COLS if c in rows.columns], weights=rows.weights)
+
+
+def test_rows_are_distinct_and_cover_the_source(repeated_csv):
+    rows, _ = weighted_index(repeated_csv)
+    frame = load_dataset(repeated_csv)
+    answers = frame[list(rows.columns)].astype(object).fillna('<missing>')
+    assert rows.n_rows == int(rows.weights.sum()) == len(frame)
+    assert len(rows.weights) == len(answers.drop_duplicates())
+
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+def test_weighted_counts_match_pandas(repeated_csv, selection):
+    rows, index = weighted_index(repeated_csv)
+    frame = baseline(load_dataset(repeated_csv), selection)
+    mask = index.mask(selection)
+    for column in rows.columns:
+        assert as_dict(index.value_counts(column, mask)) == as_dict(frame[column].value_counts()), column
+
+
+@pytest.mark.parametrize('x, hue', [('Gender', 'Country'), ('Occupation', 'treatment'), ('Mood_Swings', 'Days_Indoors')])
+def test_weighted_crosstab_matches_pandas(repeated_csv, x, hue):
+    _, index = weighted_index(repeated_csv)
+    frame = load_dataset(repeated_csv)
+    got = CrosstabEngine(index).counts(x, hue).set_index([x, hue])['count']
+    want = frame.groupby([x, hue], observed=True).size()
+    assert as_dict(got) == as_dict(want)
+
+
+def test_weighted_correlation_matches_pandas(repeated_csv):
+    rows, _ = weighted_index(repeated_csv)
+    frame = load_dataset(repeated_csv)
+    names = numeric_columns(rows.columns)
+    cube = MomentCube.build(rows.columns, names, weights=rows.weights)
+    encoded = pd.DataFrame({
+        n: frame[n].astype(object).map(ord_mappings[n]).astype(float) for n in names
+    })
+    assert cube.n_rows == len(frame)
+    got = cube.moments().corr()
+    np.testing.assert_allclose(got.values, encoded.corr().values, atol=1e-9, equal_nan=True)
+
+
+def test_mostly_distinct_rows_stop_early(write_csv, monkeypatch):
+    monkeypatch.setattr(weighted, 'WEIGHTED_CHUNK_ROWS', 100)
+    columns = load_columns(write_csv(survey_frame(2000)))
+    passes = []
+    add_rows = WeightedRows.add_rows
+
+    def counted(self, *args):
+        passes.append(args)
+        return add_rows(self, *args)
+
+    monkeypatch.setattr(WeightedRows, 'add_rows', counted)
+    assert WeightedRows.build(columns, max_distinct=0.5 * 2000) is None
+    # over half distinct well before the last of the 20 passes
+    assert len(passes) < 15
+
+
+def test_chunked_datasets_are_not_deduplicated(repeated_csv, monkeypatch):
+    monkeypatch.setattr(weighted, 'DATASET_CHUNK_ROWS', 100)
+    monkeypatch.setattr(WeightedRows, 'build', pytest.fail)
+    assert weighted.get_weighted_rows(repeated_csv) is None